@@ -1,12 +1,12 @@
 from collections.abc import Generator
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 
-from app.db.session import SessionLocal
+from app.db.session import ReadSessionLocal, SessionLocal
 
 
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
+def _session(factory: sessionmaker) -> Generator[Session, None, None]:
+    db = factory()
     try:
         yield db
     except Exception:
@@ -14,3 +14,12 @@ def get_db() -> Generator[Session, None, None]:
         raise
     finally:
         db.close()
+
+
+def get_db() -> Generator[Session, None, None]:
+    yield from _session(SessionLocal)
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """Session on the read-only pool, for routes that never write."""
+    yield from _session(ReadSessionLocal)
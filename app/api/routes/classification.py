@@ -1,42 +1,74 @@
 from fastapi import APIRouter, Depends, HTTPException
-import re
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db
-from app.schemas.classification import ClassificationResponse, ClassifyRequest
-from app.services.classification_service import ClassificationService
-from app.services.service_factory import build_embedding_client
-from app.core.errors import OllamaBadResponseError, OllamaUnavailableError
+from app.schemas.classification import (
+    BatchClassifyItemResponse,
+    BatchClassifyRequest,
+    BatchClassifyResponse,
+    ClassificationResponse,
+    ClassifyRequest,
+    LabelScore,
+)
+from app.services.classification_service import BatchItem, ClassificationService
+from app.services.embedding_service import AsyncEmbeddingClient, EmbeddingClient, embedding_model_name
+from app.services.service_factory import build_async_embedding_client, build_embedding_client
+from app.core.config import settings
+from app.core.errors import NoLabelFitError, OllamaBadResponseError, OllamaUnavailableError
 from app.core.label_utils import parse_no_label_fit
 
 router = APIRouter(tags=["classification"])
 
 
+def _label_scores(top_labels: list[tuple[str, float]] | None) -> list[LabelScore] | None:
+    if top_labels is None:
+        return None
+    return [LabelScore(label=label, score=score) for label, score in top_labels]
 
 
+# The classify routes are async: the Ollama round-trip is awaited without holding a worker
+# thread, and only the short DB part runs in the threadpool.
+
 
 @router.post("/classify", response_model=ClassificationResponse)
-def classify(payload: ClassifyRequest, db: Session = Depends(get_db)) -> ClassificationResponse:
+async def classify(
+    payload: ClassifyRequest,
+    db: Session = Depends(get_db),
+    embedding_client: EmbeddingClient = Depends(build_embedding_client),
+    async_embedding_client: AsyncEmbeddingClient = Depends(build_async_embedding_client),
+) -> ClassificationResponse:
     service = ClassificationService(
         db=db,
-        embedding_client=build_embedding_client(),
+        embedding_client=embedding_client,
     )
+    vector_model = embedding_model_name(async_embedding_client)
     try:
-        result = service.classify(text=payload.text, label=payload.label, label_id=payload.label_id)
+        vector = await async_embedding_client.get_embedding(payload.text)
+        result = await run_in_threadpool(
+            service.classify_vector,
+            payload.text,
+            vector,
+            label=payload.label,
+            label_id=payload.label_id,
+            mode=payload.mode,
+            top_k=payload.top_k,
+            multi_label=payload.multi_label,
+            vector_model=vector_model,
+        )
+    except NoLabelFitError as e:
+        detail = {
+            "message": "No existing label fit this text",
+            "best_match_label": e.best_match_label,
+            "best_match_score": e.best_match_score,
+        }
+        if e.top_labels is not None:
+            detail["top_labels"] = [{"label": label, "score": score} for label, score in e.top_labels]
+        raise HTTPException(status_code=422, detail=detail) from e
     except ValueError as e:
         msg = str(e)
         if msg == "label_not_found":
             raise HTTPException(status_code=404, detail="Label not found") from e
-        if msg.startswith("no_label_fit:"):
-            best_match_label, best_match_score = parse_no_label_fit(msg)
-            raise HTTPException(
-                status_code=422,
-                detail={
-                    "message": "No existing label fit this text",
-                    "best_match_label": best_match_label,
-                    "best_match_score": best_match_score,
-                },
-            ) from e
         raise HTTPException(status_code=400, detail=msg) from e
     except OllamaUnavailableError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
@@ -50,4 +82,84 @@ def classify(payload: ClassifyRequest, db: Session = Depends(get_db)) -> Classif
         reason=result.reason,
         best_match_label=result.best_match_label,
         best_match_score=result.best_match_score,
+        assigned_labels=result.assigned_labels,
+        top_labels=_label_scores(result.top_labels),
+    )
+
+
+@router.post("/classify/batch", response_model=BatchClassifyResponse)
+async def classify_batch(
+    payload: BatchClassifyRequest,
+    db: Session = Depends(get_db),
+    embedding_client: EmbeddingClient = Depends(build_embedding_client),
+    async_embedding_client: AsyncEmbeddingClient = Depends(build_async_embedding_client),
+) -> BatchClassifyResponse:
+    if len(payload.items) > settings.classify_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(payload.items)} items (max {settings.classify_batch_max_items})",
+        )
+
+    service = ClassificationService(
+        db=db,
+        embedding_client=embedding_client,
     )
+    items = [
+        BatchItem(
+            text=item.text,
+            label=item.label,
+            label_id=item.label_id,
+            mode=item.mode,
+            top_k=item.top_k,
+            multi_label=item.multi_label,
+        )
+        for item in payload.items
+    ]
+    vector_model = embedding_model_name(async_embedding_client)
+    try:
+        vectors = await async_embedding_client.get_embeddings([item.text for item in items])
+        outcomes = await run_in_threadpool(service.classify_batch_vectors, items, vectors, vector_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except OllamaUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except OllamaBadResponseError as e:
+        raise HTTPException(status_code=502, detail=str(e)) from e
+
+    response = BatchClassifyResponse(submitted_count=len(payload.items), classified_count=0, failed_count=0)
+    for outcome in outcomes:
+        text = payload.items[outcome.index].text
+        if outcome.result is not None:
+            response.classified.append(
+                BatchClassifyItemResponse(
+                    index=outcome.index,
+                    text=text,
+                    assigned_label=outcome.result.assigned_label,
+                    similarity_score=outcome.result.similarity_score,
+                    reason=outcome.result.reason,
+                    best_match_label=outcome.result.best_match_label,
+                    best_match_score=outcome.result.best_match_score,
+                    assigned_labels=outcome.result.assigned_labels,
+                    top_labels=_label_scores(outcome.result.top_labels),
+                )
+            )
+        elif outcome.error == "label_not_found":
+            response.failed.append(
+                BatchClassifyItemResponse(index=outcome.index, text=text, reason="label_not_found", error="Label not found")
+            )
+        else:
+            best_match_label, best_match_score = parse_no_label_fit(outcome.error or "")
+            response.failed.append(
+                BatchClassifyItemResponse(
+                    index=outcome.index,
+                    text=text,
+                    reason="no_label_fit",
+                    best_match_label=best_match_label,
+                    best_match_score=best_match_score,
+                    top_labels=_label_scores(outcome.top_labels),
+                    error="No existing label fit this text",
+                )
+            )
+    response.classified_count = len(response.classified)
+    response.failed_count = len(response.failed)
+    return response
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, get_read_db
+from app.core.embedding_model import active_embedding_model
+from app.repositories.embedding_migration_repository import EmbeddingMigrationRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.schemas.classification import EmbeddingMigrationRequest, EmbeddingMigrationResponse, EmbeddingModelResponse
+from app.services.embedding_migration_service import (
+    cancel_embedding_migration,
+    launch_migration_worker,
+    start_embedding_migration,
+)
+
+router = APIRouter(tags=["embeddings"])
+
+
+@router.get("/embeddings/model", response_model=EmbeddingModelResponse)
+def get_embedding_model(db: Session = Depends(get_read_db)) -> EmbeddingModelResponse:
+    jobs = EmbeddingMigrationRepository(db)
+    active = jobs.get_active()
+    return EmbeddingModelResponse(
+        # Reported, not followed: a read-only route never switches this process's model.
+        active_model=jobs.current_model() or active_embedding_model(),
+        entries_by_model={model or "untagged": count for model, count in TextEntryRepository(db).count_by_model().items()},
+        migration=EmbeddingMigrationResponse.model_validate(active) if active is not None else None,
+    )
+
+
+@router.post("/embeddings/migrations", response_model=EmbeddingMigrationResponse, status_code=202)
+def start_migration(payload: EmbeddingMigrationRequest, db: Session = Depends(get_db)) -> EmbeddingMigrationResponse:
+    try:
+        job = start_embedding_migration(
+            db,
+            target_model=payload.target_model,
+            chunk_size=payload.chunk_size,
+            max_texts_per_second=payload.max_texts_per_second,
+        )
+    except ValueError as e:
+        msg = str(e)
+        if msg == "migration_running":
+            raise HTTPException(status_code=409, detail="An embedding model migration is already running") from e
+        if msg == "model_already_active":
+            raise HTTPException(status_code=409, detail="That embedding model is already active") from e
+        raise HTTPException(status_code=400, detail=msg) from e
+    launch_migration_worker(db.get_bind(), job.id)
+    return EmbeddingMigrationResponse.model_validate(job)
+
+
+@router.get("/embeddings/migrations/{job_id}", response_model=EmbeddingMigrationResponse)
+def get_migration(job_id: int, db: Session = Depends(get_read_db)) -> EmbeddingMigrationResponse:
+    job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return EmbeddingMigrationResponse.model_validate(job)
+
+
+@router.post("/embeddings/migrations/{job_id}/cancel", response_model=EmbeddingMigrationResponse)
+def cancel_migration(job_id: int, db: Session = Depends(get_db)) -> EmbeddingMigrationResponse:
+    try:
+        job = cancel_embedding_migration(db, job_id)
+    except ValueError as e:
+        if str(e) == "job_not_found":
+            raise HTTPException(status_code=404, detail="Job not found") from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return EmbeddingMigrationResponse.model_validate(job)
@@ -1,25 +1,155 @@
+import io
 import re
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException
+from anyio import from_thread
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
 from app.core.errors import OllamaBadResponseError, OllamaUnavailableError
-from app.core.label_utils import parse_no_label_fit,best_label_match,normalize_label_name
+from app.core.label_utils import parse_no_label_fit,normalize_label_name
 from app.core.config import settings
+from app.core.metrics import NO_LABEL_FIT
 from app.repositories.label_repository import LabelRepository
 from app.repositories.text_entry_repository import TextEntryRepository
-from app.schemas.classification import DeleteEntryResponse, ReclassifiedItemRequest,ReclassifiedItemResponse,ReclassifyResponse
-from app.services.embedding_service import EmbeddingClient,cosine_similarity
+from app.repositories.reclassify_job_repository import ReclassifyJobRepository
+from app.schemas.classification import (
+    DeleteEntryResponse,
+    ImportResponse,
+    ReclassifiedItemRequest,
+    ReclassifiedItemResponse,
+    ReclassifyAllRequest,
+    ReclassifyJobResponse,
+    ReclassifyResponse,
+)
+from app.services.embedding_migration_service import dual_write
+from app.services.embedding_service import EmbeddingClient,cosine_similarity, embedding_model_name
 from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.entry_index import get_entry_index
 from app.services.service_factory import build_embedding_client
 from app.services.classification_service import ClassificationService
+from app.services.export_service import iter_export_ndjson
+from app.services.import_service import EntryImporter, iter_import_rows
+from app.services.reclassify_job_service import cancel_reclassify_job, launch_reclassify_worker, start_reclassify_job
 
 
 
 router = APIRouter(tags=["entries"])
 
 
+class _RequestBodyReader(io.RawIOBase):
+    """Blocking file view of a request body for code running in the threadpool: each read waits
+    on the event loop for the next chunk, so the body is never held or spooled as a whole."""
+
+    def __init__(self, request: Request):
+        self._chunks = request.stream()
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = from_thread.run(self._next_chunk)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    async def _next_chunk(self) -> bytes | None:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+
+@router.post("/entries/import", response_model=ImportResponse)
+async def import_entries(
+    request: Request,
+    format: Literal["ndjson", "csv"] | None = Query(default=None, description="Defaults to csv for text/csv bodies, else ndjson."),
+    batch_size: int | None = Query(default=None, ge=1, le=10000),
+    db: Session = Depends(get_db),
+    embedding_client: EmbeddingClient = Depends(build_embedding_client),
+) -> ImportResponse:
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    # Rows are parsed as the body arrives and committed a batch at a time by the importer.
+    lines = io.TextIOWrapper(io.BufferedReader(_RequestBodyReader(request)), encoding="utf-8-sig", newline="")
+    importer = EntryImporter(db, embedding_client, batch_size=batch_size)
+    try:
+        result = await run_in_threadpool(importer.run, iter_import_rows(lines, fmt))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except OllamaUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except OllamaBadResponseError as e:
+        raise HTTPException(status_code=502, detail=str(e)) from e
+    return ImportResponse.model_validate(result)
+
+
+@router.get("/entries/export")
+def export_entries(
+    label: str | None = Query(default=None, description="Only export entries of this label."),
+    after_id: int = Query(default=0, ge=0, description="Resume after this entry id."),
+    db: Session = Depends(get_read_db),
+) -> StreamingResponse:
+    label_id = None
+    if label is not None:
+        existing = LabelRepository(db).get_by_name(normalize_label_name(label))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Label not found")
+        label_id = existing.id
+    # The stream opens its own session: the request's session is closed once the response starts.
+    return StreamingResponse(
+        iter_export_ndjson(db.get_bind(), label_id=label_id, after_id=after_id),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/entries/reclassify-all", response_model=ReclassifyJobResponse, status_code=202)
+def start_reclassify_all(
+    payload: ReclassifyAllRequest | None = None,
+    db: Session = Depends(get_db),
+    embedding_client: EmbeddingClient = Depends(build_embedding_client),
+) -> ReclassifyJobResponse:
+    payload = payload or ReclassifyAllRequest()
+    try:
+        job = start_reclassify_job(
+            db, include_forced=payload.include_forced, chunk_size=payload.chunk_size, mode=payload.mode
+        )
+    except ValueError as e:
+        if str(e) == "reclassify_job_running":
+            raise HTTPException(status_code=409, detail="A reclassify job is already running") from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    launch_reclassify_worker(db.get_bind(), embedding_client, job.id)
+    return ReclassifyJobResponse.model_validate(job)
+
+
+@router.get("/entries/reclassify-all/{job_id}", response_model=ReclassifyJobResponse)
+def get_reclassify_all(job_id: int, db: Session = Depends(get_read_db)) -> ReclassifyJobResponse:
+    job = ReclassifyJobRepository(db).get_by_id(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ReclassifyJobResponse.model_validate(job)
+
+
+@router.post("/entries/reclassify-all/{job_id}/cancel", response_model=ReclassifyJobResponse)
+def cancel_reclassify_all(job_id: int, db: Session = Depends(get_db)) -> ReclassifyJobResponse:
+    try:
+        job = cancel_reclassify_job(db, job_id)
+    except ValueError as e:
+        if str(e) == "job_not_found":
+            raise HTTPException(status_code=404, detail="Job not found") from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return ReclassifyJobResponse.model_validate(job)
+
+
 @router.post("/entries/reclassify/{entry_id}", response_model=ReclassifiedItemResponse)
 def reclasify_entry(
     entry_id: int,
@@ -36,6 +166,7 @@ def reclasify_entry(
         raise HTTPException(status_code=404, detail="Entry not found")
     
     affected_label_id = entry.label_id
+    previous_vector = entry.embedding
     entry.label_id = None
     db.flush()
 
@@ -43,7 +174,7 @@ def reclasify_entry(
         label = label_repo.get_by_id(affected_label_id)
         if label is not None:
             try:
-                label_embeddings.recompute_for_label(label)
+                label_embeddings.remove_entry(label, previous_vector)
             except OllamaUnavailableError as e:
                 raise HTTPException(status_code=503, detail=str(e)) from e
             except OllamaBadResponseError as e:
@@ -52,6 +183,8 @@ def reclasify_entry(
     reason = "no reason"
     try:
         vector = embedding_client.get_embedding(entry.text)
+        entry.set_embedding(vector, embedding_model_name(embedding_client))
+        dual_write(db, [entry])
 
         forced_label = None
         if payload.label_id is not None:
@@ -72,29 +205,38 @@ def reclasify_entry(
             reason = "forced_label_assigned"
 
         else:
-            known_labels = label_repo.list_labels()
-            best_label, best_score = best_label_match(vector, known_labels)
-            best_match_label = best_label.name if best_label else None
-            best_match_score = round(best_score, 4) if best_label else None
+            db.flush()
+            # Scored like the reclassify job: the other copies of a multi-label text keep their
+            # labels, and this one moves to a fitting label none of them holds.
+            copies = [(entry.id, affected_label_id)] + [
+                (copy.id, copy.label_id)
+                for copy in entry_repo.list_copies(entry, settings.multi_label_max_labels - 1)
+                if copy.id != entry.id and copy.confidence != "forced"
+            ]
+            best, matches = ClassificationService(db, embedding_client).rescore_copies([vector], [copies], payload.mode)[0]
+            best_label_id, best_match_label, best_score, _ = best
+            best_match_score = round(best_score, 4) if best_label_id is not None else None
 
-            if best_label and best_score < settings.similarity_threshold:
+            if matches[0] is None:
+                NO_LABEL_FIT.inc("reclassify")
                 raise ValueError(
                 f"no_label_fit: best_match_label={best_match_label!r} best_match_score={best_match_score!r}"
                 )
-            entry.label_id = best_label.id
-            reason = "matched_existing_label "
+            entry.label_id, _, entry.similarity_score, reason = matches[0]
         
         new_label = label_repo.get_by_id(entry.label_id)
         if not new_label:
             raise ValueError("label_not_found")
 
+        db.flush()
         try:
-            label_embeddings.recompute_for_label(new_label)
+            label_embeddings.add_entry(new_label, vector)
         except OllamaUnavailableError as e:
             raise HTTPException(status_code=503, detail=str(e)) from e
         except OllamaBadResponseError as e:
             raise HTTPException(status_code=502, detail=str(e)) from e
         db.commit()
+        get_entry_index(db).upsert(entry_id, vector)
     except ValueError as e:
         msg = str(e)
         if msg == "label_not_found":
@@ -141,6 +283,7 @@ def delete_entry(
         raise HTTPException(status_code=404, detail="Entry not found")
 
     affected_label_id = entry.label_id
+    previous_vector = entry.embedding
     entry_repo.delete(entry)
     db.flush()
 
@@ -148,12 +291,13 @@ def delete_entry(
         label = label_repo.get_by_id(affected_label_id)
         if label is not None:
             try:
-                label_embeddings.recompute_for_label(label)
+                label_embeddings.remove_entry(label, previous_vector)
             except OllamaUnavailableError as e:
                 raise HTTPException(status_code=503, detail=str(e)) from e
             except OllamaBadResponseError as e:
                 raise HTTPException(status_code=502, detail=str(e)) from e
 
     db.commit()
+    get_entry_index(db).discard([entry_id])
 
     return DeleteEntryResponse(deleted=True, entry_id=entry_id)
@@ -1,27 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.deps import get_db, get_read_db
+from app.repositories.centroid_delta_repository import CentroidDeltaRepository
 from app.repositories.label_repository import LabelRepository
 from app.repositories.text_entry_repository import TextEntryRepository
-from app.schemas.classification import CreateLabelRequest, CreateLabelResponse, DeleteLabelResponse, LabelDetailOut, LabelOut
+from app.schemas.classification import (
+    CreateLabelRequest,
+    CreateLabelResponse,
+    DeleteLabelResponse,
+    LabelDetailOut,
+    LabelOut,
+    UpdateLabelRequest,
+    UpdateLabelResponse,
+)
 from app.core.errors import OllamaBadResponseError, OllamaUnavailableError
 from app.core.label_utils import normalize_label_name
 from app.services.embedding_service import EmbeddingClient
 from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.label_index import get_label_index
 from app.services.service_factory import build_embedding_client
 
 router = APIRouter(tags=["labels"])
 
 
 @router.get("/labels", response_model=list[LabelOut])
-def list_labels(db: Session = Depends(get_db)) -> list[LabelOut]:
+def list_labels(db: Session = Depends(get_read_db)) -> list[LabelOut]:
     labels = LabelRepository(db).list_labels()
     return [LabelOut.model_validate(l) for l in labels]
 
 
 @router.get("/labels/{name}", response_model=LabelDetailOut)
-def get_label(name: str, db: Session = Depends(get_db)) -> LabelDetailOut:
+def get_label(name: str, db: Session = Depends(get_read_db)) -> LabelDetailOut:
     label_repo = LabelRepository(db)
     text_repo = TextEntryRepository(db)
 
@@ -59,11 +69,40 @@ def create_label(payload: CreateLabelRequest, db: Session, embedding_client: Emb
         raise HTTPException(status_code=502, detail=str(e)) from e
 
     label = repo.create(name=normalized, definition=payload.definition, centroid=centroid)
-    LabelEmbeddingService(db, embedding_client).recompute_for_label(label)
+    LabelEmbeddingService(db, embedding_client).initialize(label, centroid)
     db.commit()
     return CreateLabelResponse(created=True, name=normalized)
 
 
+@router.patch("/labels/{name}", response_model=UpdateLabelResponse)
+def update_label_endpoint(
+    name: str,
+    payload: UpdateLabelRequest,
+    db: Session = Depends(get_db),
+    embedding_client: EmbeddingClient = Depends(build_embedding_client),
+) -> UpdateLabelResponse:
+    return update_label(name=name, payload=payload, db=db, embedding_client=embedding_client)
+
+
+def update_label(name: str, payload: UpdateLabelRequest, db: Session, embedding_client: EmbeddingClient) -> UpdateLabelResponse:
+    normalized = normalize_label_name(name)
+    label = LabelRepository(db).get_by_name(normalized)
+    if not label:
+        raise HTTPException(status_code=404, detail="Label not found")
+    if payload.definition == label.definition:
+        return UpdateLabelResponse(updated=False, name=normalized, reason="definition_unchanged")
+
+    # Re-embeds the definition once; entries keep their running sum, so this is O(dim) after that.
+    try:
+        LabelEmbeddingService(db, embedding_client).update_definition(label, payload.definition)
+    except OllamaUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except OllamaBadResponseError as e:
+        raise HTTPException(status_code=502, detail=str(e)) from e
+    db.commit()
+    return UpdateLabelResponse(updated=True, name=normalized, reason="definition_updated")
+
+
 @router.delete("/labels/{name}", response_model=DeleteLabelResponse)
 def delete_label(
     name: str,
@@ -84,7 +123,11 @@ def delete_label(
 
     # Avoid leaving orphaned label_id values on existing entries.
     TextEntryRepository(db).detach_label(label.id)
+    # Label ids can be reused; pending centroid deltas must not reach a later label.
+    CentroidDeltaRepository(db).discard_for_labels([label.id])
 
+    label_id = label.id
     repo.delete(label)
     db.commit()
+    get_label_index(db).invalidate(label_id)
     return DeleteLabelResponse(deleted=True, name=normalized, reason="deleted")
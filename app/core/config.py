@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -5,12 +7,98 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
 	app_name: str = "AI-Assisted Text Classification API"
 	database_url: str = "sqlite:///./classifier.db"
+	# Binary precision for stored embeddings/centroids (running sums are always float64).
+	vector_storage_dtype: Literal["float32", "float16"] = "float32"
+	# Connection pools: one for writes and a separate read-only one for the GET routes.
+	db_pool_size: int = Field(default=5, ge=1)
+	db_read_pool_size: int = Field(default=5, ge=1)
+	db_read_pool_enabled: bool = True
+	db_max_overflow: int = Field(default=10, ge=0)
+	db_pool_timeout_seconds: float = Field(default=30.0, gt=0.0)
+	# SQLite pragmas run on every new connection (sqlite_tuning_enabled=false keeps SQLite's
+	# defaults). sqlite_journal_mode=None leaves the database file's journal mode unchanged.
+	sqlite_tuning_enabled: bool = True
+	sqlite_journal_mode: Literal["wal", "delete", "truncate", "persist"] | None = "wal"
+	sqlite_synchronous: Literal["off", "normal", "full", "extra"] = "normal"
+	sqlite_busy_timeout_ms: int = Field(default=5000, ge=0)
+	sqlite_cache_size_kib: int = Field(default=65536, ge=0)
+	sqlite_mmap_size_bytes: int = Field(default=268435456, ge=0)
+	sqlite_temp_store: Literal["default", "file", "memory"] = "memory"
 
 	similarity_threshold: float = Field(default=0.5, ge=0.0, le=1.0)
+	# Default matching mode: "centroid" compares against one centroid per label, "knn" lets the
+	# knn_k most similar stored entries vote (weighted by similarity). Overridable per request.
+	classification_mode: Literal["centroid", "knn"] = "centroid"
+	knn_k: int = Field(default=10, ge=1, le=1000)
+	# multi_label requests store the text under every label above the threshold, up to this many.
+	multi_label_max_labels: int = Field(default=10, ge=1, le=1000)
+	classify_batch_max_items: int = Field(default=1000, ge=1)
+	# Shared, memory-mapped entry embedding store (<db stem>.embeddings unless a path is given).
+	entry_store_enabled: bool = False
+	entry_store_path: str | None = None
+	# Rows embedded, inserted and committed together by the bulk import.
+	import_batch_size: int = Field(default=500, ge=1, le=10000)
+	# Entries read per keyset page (one short read transaction) by the export.
+	export_chunk_size: int = Field(default=1000, ge=1, le=100000)
+	# How often the /stats counters are recounted from text_entries to repair drift (0 disables).
+	stats_reconcile_interval_seconds: float = Field(default=3600.0, ge=0.0)
+	# Entries per committed chunk of a reclassify-all job.
+	reclassify_chunk_size: int = Field(default=500, ge=1, le=10000)
+	# Label centroids: "immediate" updates them in the request's transaction, "deferred" only
+	# records a delta there and a background worker applies them per label every
+	# centroid_flush_interval_ms (sooner once centroid_flush_max_changes are pending).
+	centroid_update_mode: Literal["immediate", "deferred"] = "immediate"
+	centroid_flush_interval_ms: float = Field(default=500.0, gt=0.0)
+	centroid_flush_max_changes: int = Field(default=1000, ge=1)
+	# A centroid rebuild re-embeds at most this many of a label's entries inline (no embedding, or
+	# one from another model); a label with more is rebuilt without them and logged instead, since
+	# moving stored entries to a new model is the job of an embedding model migration.
+	recompute_reembed_limit: int = Field(default=100, ge=0)
+
+	# Label matching: exact scan, or an approximate index (ivf / hnsw) once there are at least
+	# vector_index_min_size labels. Approximate indexes are saved next to the SQLite file, or in
+	# vector_index_dir if set. hnsw needs the optional hnswlib package.
+	vector_index: Literal["exact", "ivf", "hnsw", "compressed"] = "exact"
+	vector_index_min_size: int = Field(default=1000, ge=1)
+	vector_index_dir: str | None = None
+	ivf_nlist: int = Field(default=0, ge=0)  # 0 = sqrt(number of labels)
+	ivf_nprobe: int = Field(default=8, ge=1)
+	hnsw_m: int = Field(default=16, ge=2)
+	hnsw_ef_construction: int = Field(default=200, ge=1)
+	hnsw_ef_search: int = Field(default=64, ge=1)
+	# compressed: vectors are projected to vector_compression_dim dimensions (0 = no projection;
+	# pca is learned from the vectors, random is a fixed orthogonal basis) and stored as int8.
+	# The vector_compression_candidates best by the compressed scores are re-scored exactly.
+	vector_compression_dim: int = Field(default=0, ge=0)
+	vector_compression_projection: Literal["pca", "random"] = "pca"
+	vector_compression_candidates: int = Field(default=64, ge=1)
+	# PostgreSQL: vectors are pgvector columns and matching runs in SQL. pgvector_index picks the
+	# ANN index built for pgvector_index_dim dimensions (0 = those of the stored vectors); the
+	# hnsw_* / ivf_* settings above configure it (ivf_nprobe -> ivfflat.probes).
+	pgvector_index: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+	pgvector_index_dim: int = Field(default=0, ge=0)
+
+	# GET /metrics (Prometheus text format) and per-route request latency / size histograms.
+	metrics_enabled: bool = True
 
 	ollama_host: str = Field(default="http://localhost:11434")
+	# The active embedding model. After an embedding model migration completes, processes follow
+	# its target model (recorded in embedding_migration_jobs) instead.
 	ollama_embedding_model: str = Field(default="qwen3-embedding:8b-fp16")
 	ollama_timeout_seconds: float = Field(default=20.0, ge=1.0, le=300.0)
+	ollama_embed_batch_size: int = Field(default=64, ge=1, le=4096)
+	ollama_pool_size: int = Field(default=8, ge=1, le=256)
+	# Coalesce concurrent single-text embeds from the async routes (0 ms disables).
+	embed_coalesce_window_ms: float = Field(default=0.0, ge=0.0, le=1000.0)
+	embed_coalesce_max_batch: int = Field(default=32, ge=1, le=4096)
+	# Embedding model migrations: entries re-embedded per committed chunk, and a throttle on how
+	# fast the migration calls the embedding model (0 = unthrottled).
+	embedding_migration_chunk_size: int = Field(default=200, ge=1, le=10000)
+	embedding_migration_max_texts_per_second: float = Field(default=0.0, ge=0.0)
+
+	# Embedding cache: in-memory LRU size (0 disables) and optional persistent SQLite file.
+	embedding_cache_size: int = Field(default=10000, ge=0)
+	embedding_cache_path: str | None = None
 
 	model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
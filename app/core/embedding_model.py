@@ -0,0 +1,19 @@
+"""The embedding model this process embeds with.
+
+It is ``OLLAMA_EMBEDDING_MODEL`` until a completed embedding model migration switches it (see
+``app/services/embedding_migration_service.py``). It lives here rather than in ``settings`` so a
+switch never rewrites configuration; clients and caches built without a pinned model read it.
+"""
+from app.core.config import settings
+
+_model: str | None = None
+
+
+def active_embedding_model() -> str:
+    return _model or settings.ollama_embedding_model
+
+
+def set_active_embedding_model(model: str | None) -> None:
+    """Switch to ``model`` (None: back to ``OLLAMA_EMBEDDING_MODEL``)."""
+    global _model
+    _model = model
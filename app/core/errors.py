@@ -4,3 +4,18 @@ class OllamaUnavailableError(RuntimeError):
 
 class OllamaBadResponseError(RuntimeError):
     """Raised when Ollama responds but the content is unusable/invalid."""
+
+
+class NoLabelFitError(ValueError):
+    """``no_label_fit:...`` with the best (and, if requested, top-k) candidates attached."""
+
+    def __init__(
+        self,
+        best_match_label: str | None,
+        best_match_score: float | None,
+        top_labels: list[tuple[str, float]] | None = None,
+    ):
+        super().__init__(f"no_label_fit: best_match_label={best_match_label!r} best_match_score={best_match_score!r}")
+        self.best_match_label = best_match_label
+        self.best_match_score = best_match_score
+        self.top_labels = top_labels
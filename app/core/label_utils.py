@@ -1,6 +1,7 @@
+import hashlib
 import re
-from app.services.embedding_service import cosine_similarity
 from app.models.label import Label
+from app.services.label_index import LabelIndex
 
 
 def normalize_label_name(name: str) -> str:
@@ -12,6 +13,10 @@ def normalize_label_name(name: str) -> str:
         raise ValueError("Label name must not be empty")
     return cleaned[:120]
 
+def definition_hash(definition: str) -> str:
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+
 def parse_no_label_fit(msg: str) -> tuple[str | None, float | None]:
     match = re.search(r"best_match_label=(?P<label>.+?)\s+best_match_score=(?P<score>.+)$", msg)
     if not match:
@@ -38,13 +43,9 @@ def parse_no_label_fit(msg: str) -> tuple[str | None, float | None]:
     return label, score
 
 def best_label_match(vector: list[float], labels: list[Label]) -> tuple[Label | None, float]:
-    best_label = None
-    best_score = -1.0
-    for label in labels:
-        score = cosine_similarity(vector, label.centroid)
-        if score > best_score:
-            best_label = label
-            best_score = score
-    if best_score < 0:
+    # Hot paths should use the shared index from get_label_index(); this builds a throwaway one.
+    label_id, _, best_score = LabelIndex.from_labels(labels).best_match(vector)
+    if label_id is None:
         return None, 0.0
+    best_label = next(label for label in labels if label.id == label_id)
     return best_label, best_score
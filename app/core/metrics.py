@@ -0,0 +1,185 @@
+"""In-process metrics rendered in the Prometheus text format by ``GET /metrics``.
+
+Counters and histograms are plain dicts of floats keyed by label values, updated under a lock:
+an observation is one ``bisect`` and a few additions, with no formatting or logging on the hot
+path. Everything is per process; with several workers, scrape each one (or sum them).
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Sequence
+
+# Seconds; wide enough for sub-millisecond matches and multi-second Ollama calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: [count per bucket (last one is +Inf)..., sum].
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labelvalues)
+            if row is None:
+                row = self._values[labelvalues] = [0.0] * (len(self.buckets) + 2)
+            row[slot] += 1
+            row[-1] += value
+
+    def time(self, *labelvalues: str) -> "_Timer":
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, labelvalues)
+
+    def timed(self, *labelvalues: str):
+        """Decorator observing the elapsed wall time of each call."""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labelvalues)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, *labelvalues: str) -> int:
+        row = self._values.get(labelvalues)
+        return 0 if row is None else int(sum(row[:-1]))
+
+    def total(self, *labelvalues: str) -> float:
+        """Sum of the observed values."""
+        row = self._values.get(labelvalues)
+        return 0.0 if row is None else row[-1]
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, list(row)) for key, row in self._values.items())
+        lines = []
+        bounds = (*self.buckets, float("inf"))
+        for key, row in values:
+            cumulative = 0.0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_number(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_number(cumulative)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+def render() -> str:
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "classifier_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+HTTP_REQUEST_BYTES = Histogram(
+    "classifier_http_request_size_bytes", "HTTP request body size by route.", ("method", "route"), SIZE_BUCKETS
+)
+OLLAMA_REQUEST_SECONDS = Histogram(
+    "classifier_ollama_request_duration_seconds", "Ollama embedding request latency.", ("endpoint", "model")
+)
+OLLAMA_ERRORS = Counter("classifier_ollama_errors_total", "Failed Ollama embedding calls by error type.", ("error",))
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "classifier_embedding_cache_lookups_total", "Embedding cache lookups by result (hit, disk_hit, miss).", ("result",)
+)
+LABEL_LOAD_SECONDS = Histogram(
+    "classifier_label_load_seconds", "Label index sync time (unchanged: signature check only).", ("result",)
+)
+MATCH_SECONDS = Histogram("classifier_match_seconds", "Label matching time per batch of vectors.", ("mode",))
+CENTROID_UPDATE_SECONDS = Histogram(
+    "classifier_centroid_update_seconds", "Label centroid update / recompute time.", ("operation",)
+)
+DB_SECONDS = Histogram("classifier_db_seconds", "Session flush and commit time.", ("operation",))
+NO_LABEL_FIT = Counter(
+    "classifier_no_label_fit_total", "Texts rejected because no label reached the similarity threshold.", ("source",)
+)
@@ -0,0 +1,125 @@
+import logging
+import math
+
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+from app.core.config import settings
+from app.db.base import Base
+from app.db.types import uses_pgvector
+
+logger = logging.getLogger(__name__)
+
+# pgvector indexes ``vector`` columns of up to 2000 dimensions.
+_PGVECTOR_MAX_INDEX_DIM = 2000
+# (table, vector column) pairs searched in SQL on PostgreSQL.
+_SEARCHED_COLUMNS = (("labels", "centroid_vec"), ("text_entries", "embedding_vec"))
+
+
+def prepare_database(engine: Engine) -> None:
+    """Set up what ``create_all`` relies on: the pgvector extension on PostgreSQL."""
+    if uses_pgvector(engine.dialect):
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
+
+def ensure_vector_indexes(engine: Engine) -> list[str]:
+    """Create the pgvector ANN indexes (``settings.pgvector_index``) that do not exist yet.
+
+    ``vector`` columns hold embeddings of any dimension, so each index is a partial expression
+    index over ``column::vector(dim)`` for one dimension: ``settings.pgvector_index_dim``, or the
+    dimension of the newest stored vector. Repository queries use the same expression and filter.
+    Returns the names of the indexes created.
+    """
+    if not uses_pgvector(engine.dialect) or settings.pgvector_index == "none":
+        return []
+    created = []
+    with engine.begin() as conn:
+        for table, column in _SEARCHED_COLUMNS:
+            dim = settings.pgvector_index_dim or conn.execute(
+                text(f"SELECT vector_dims({column}) FROM {table} WHERE {column} IS NOT NULL ORDER BY id DESC LIMIT 1")
+            ).scalar()
+            if not dim:
+                continue
+            if dim > _PGVECTOR_MAX_INDEX_DIM:
+                logger.warning("%s.%s: %d dimensions is too many for a pgvector index; searches scan", table, column, dim)
+                continue
+            name = f"ix_{table}_{column}_{settings.pgvector_index}_{dim}"
+            if settings.pgvector_index == "hnsw":
+                options = f"m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction}"
+            else:
+                rows = conn.execute(text(f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL")).scalar()
+                options = f"lists = {settings.ivf_nlist or max(1, int(math.sqrt(rows)))}"
+            exists = conn.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": name}).scalar()
+            if exists:
+                continue
+            conn.execute(
+                text(
+                    f"CREATE INDEX {name} ON {table} USING {settings.pgvector_index} "
+                    f"(({column}::vector({dim})) vector_cosine_ops) WITH ({options}) "
+                    f"WHERE vector_dims({column}) = {dim}"
+                )
+            )
+            created.append(name)
+    return created
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """Bring existing SQLite tables in line with the mapped models.
+
+    ``create_all`` never alters tables that already exist, so databases created by older
+    versions are patched here: missing columns are added with ``ALTER TABLE ... ADD COLUMN``
+    (new columns must be nullable) and missing indexes are created. Tables with a NOT NULL
+    column that the model now declares nullable are rebuilt, since SQLite cannot drop a
+    constraint in place, and so are tables the model declares ``sqlite_autoincrement`` that were
+    created without it.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"]: column for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+            if any(
+                column.nullable and column.name in existing and not existing[column.name]["nullable"]
+                for column in table.columns
+            ) or _lacks_autoincrement(conn, table):
+                _rebuild_table(conn, table, kept_columns=[name for name in existing if name in table.columns])
+            else:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+
+def _lacks_autoincrement(conn: Connection, table: Table) -> bool:
+    if not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+    create_sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+    ).scalar()
+    return "AUTOINCREMENT" not in (create_sql or "").upper()
+
+
+def _rebuild_table(conn: Connection, table: Table, kept_columns: list[str]) -> None:
+    """Recreate ``table`` from the model definition, copying ``kept_columns`` across."""
+    temp_name = f"_new_{table.name}"
+    create_sql = str(CreateTable(table).compile(dialect=conn.dialect)).replace(
+        f"CREATE TABLE {table.name} ", f"CREATE TABLE {temp_name} ", 1
+    )
+    columns = ", ".join(kept_columns)
+
+    conn.exec_driver_sql(create_sql)
+    conn.exec_driver_sql(f"INSERT INTO {temp_name} ({columns}) SELECT {columns} FROM {table.name}")
+    conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    conn.exec_driver_sql(f"ALTER TABLE {temp_name} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(conn)
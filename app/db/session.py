@@ -1,9 +1,114 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import DB_SECONDS
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def sqlite_pragmas(read_only: bool = False) -> list[str]:
+    """PRAGMA statements run on every new SQLite connection (see the ``sqlite_*`` settings)."""
+    if not settings.sqlite_tuning_enabled:
+        return ["PRAGMA query_only = ON"] if read_only else []
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA synchronous = {settings.sqlite_synchronous.upper()}",
+        # Negative cache_size is in KiB rather than pages.
+        f"PRAGMA cache_size = -{settings.sqlite_cache_size_kib}",
+        f"PRAGMA mmap_size = {settings.sqlite_mmap_size_bytes}",
+        f"PRAGMA temp_store = {settings.sqlite_temp_store.upper()}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    elif settings.sqlite_journal_mode is not None:
+        # Persistent in the database file; WAL lets readers run while one writer commits.
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.sqlite_journal_mode.upper()}")
+    return pragmas
+
+
+def build_engine(url: str, read_only: bool = False) -> Engine:
+    """Engine for ``url`` with the configured pool sizes and per-connection settings
+    (SQLite pragmas; pgvector search parameters on PostgreSQL)."""
+    kwargs = {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            pool_size=settings.db_read_pool_size if read_only else settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+    new_engine = create_engine(url, **kwargs)
+
+    if new_engine.dialect.name == "postgresql":
+        statements = [
+            f"SET hnsw.ef_search = {settings.hnsw_ef_search}",
+            f"SET ivfflat.probes = {settings.ivf_nprobe}",
+        ]
+        if read_only:
+            statements.append("SET default_transaction_read_only = on")
+
+        @event.listens_for(new_engine, "connect")
+        def _apply_settings(dbapi_connection, _) -> None:
+            cursor = dbapi_connection.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.close()
+            dbapi_connection.commit()
+
+    if new_engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(read_only=read_only)
+
+        @event.listens_for(new_engine, "connect")
+        def _apply_pragmas(dbapi_connection, _) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
 
+    return new_engine
 
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, connect_args=connect_args)
+
+engine = build_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# GET routes use their own pool of read-only connections, so they never queue behind writers for
+# a pooled connection. An in-memory database only exists on the write engine's connection.
+if settings.db_read_pool_enabled and not _is_memory_sqlite(settings.database_url):
+    read_engine = build_engine(settings.database_url, read_only=True)
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+# Flush and commit timings for /metrics (commit includes the flush it triggers).
+@event.listens_for(Session, "before_flush")
+def _flush_started(session: Session, flush_context, instances) -> None:
+    session.info["flush_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _flush_finished(session: Session, flush_context) -> None:
+    started = session.info.pop("flush_started", None)
+    if started is not None:
+        DB_SECONDS.observe(time.perf_counter() - started, "flush")
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session: Session) -> None:
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session: Session) -> None:
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_SECONDS.observe(time.perf_counter() - started, "commit")
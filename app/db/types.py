@@ -0,0 +1,129 @@
+import numpy as np
+from sqlalchemy import Float, Integer, LargeBinary, cast, column, func, literal_column, values
+from sqlalchemy.types import TypeDecorator, UserDefinedType
+
+from app.core.config import settings
+
+# Blob layout: b"V" + dtype code + 2 reserved bytes, then little-endian values. The 4-byte header
+# keeps the payload aligned for float16/float32 so it can be decoded with np.frombuffer in place.
+_MAGIC = b"V"
+_HEADER_SIZE = 4
+_DTYPES = {
+    "float16": (b"e", np.dtype("<f2")),
+    "float32": (b"f", np.dtype("<f4")),
+    "float64": (b"d", np.dtype("<f8")),
+}
+_DTYPES_BY_CODE = {code: dtype for code, dtype in _DTYPES.values()}
+
+
+def encode_vector(values: list[float] | np.ndarray, dtype: str = "float32") -> bytes:
+    code, np_dtype = _DTYPES[dtype]
+    return _MAGIC + code + b"\0\0" + np.asarray(values, dtype=np_dtype).tobytes()
+
+
+def decode_vector(blob: bytes | memoryview) -> np.ndarray:
+    """Zero-copy view of an encoded vector (read-only, no float parsing)."""
+    header = bytes(blob[:_HEADER_SIZE])
+    if len(header) != _HEADER_SIZE or header[:1] != _MAGIC or header[1:2] not in _DTYPES_BY_CODE:
+        raise ValueError("Not an encoded vector blob")
+    return np.frombuffer(blob, dtype=_DTYPES_BY_CODE[header[1:2]], offset=_HEADER_SIZE)
+
+
+def uses_pgvector(dialect) -> bool:
+    """Whether vectors are stored in pgvector ``vector`` columns (and can be searched in SQL)."""
+    return dialect.name == "postgresql"
+
+
+class PGVector(UserDefinedType):
+    """pgvector's ``vector`` type (``vector(dim)`` when ``dim`` is given), exchanged as '[x,y,...]' text."""
+
+    cache_ok = True
+
+    def __init__(self, dim: int | None = None):
+        self.dim = dim
+
+    def get_col_spec(self, **kw) -> str:
+        return "VECTOR" if self.dim is None else f"VECTOR({self.dim})"
+
+    def bind_expression(self, bindvalue):
+        return cast(bindvalue, self)
+
+
+def to_pgvector(values: list[float] | np.ndarray) -> str:
+    return "[" + ",".join(map(str, np.asarray(values, dtype=np.float32).tolist())) + "]"
+
+
+def from_pgvector(value: str) -> np.ndarray:
+    body = value.strip()[1:-1]
+    return np.array(body.split(",") if body else [], dtype=np.float32)
+
+
+class VectorType(TypeDecorator):
+    """Stores a vector as a compact binary blob and loads it back as a numpy array.
+
+    ``dtype`` defaults to ``settings.vector_storage_dtype``; pass ``"float64"`` for values that
+    accumulate (running sums) and must not lose precision. On PostgreSQL, float16/float32 vectors
+    are pgvector ``vector`` columns instead (always float32), so they can be searched in SQL.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype: str | None = None):
+        super().__init__()
+        self.dtype = dtype
+
+    def _pgvector(self, dialect) -> bool:
+        return uses_pgvector(dialect) and self.dtype != "float64"
+
+    def load_dialect_impl(self, dialect):
+        if self._pgvector(dialect):
+            return dialect.type_descriptor(PGVector())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if self._pgvector(dialect):
+            return to_pgvector(value)
+        return encode_vector(value, self.dtype or settings.vector_storage_dtype)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if self._pgvector(dialect):
+            return from_pgvector(value)
+        return decode_vector(value)
+
+    def compare_values(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return np.array_equal(x, y)
+
+
+def query_vectors_sql(vectors: list[list[float]] | np.ndarray) -> list[tuple[int, object]]:
+    """The query ``vectors`` as ``(dim, VALUES (n, vec))`` pairs, one per distinct dimension, where
+    ``n`` is the vector's position in ``vectors`` and ``vec`` is typed ``vector(dim)``.
+
+    Joined LATERAL to a ``cosine_distance_sql`` subquery, one statement searches for all of them.
+    """
+    rows_by_dim: dict[int, list[tuple[int, str]]] = {}
+    for n, vector in enumerate(vectors):
+        rows_by_dim.setdefault(len(vector), []).append((n, to_pgvector(vector)))
+    return [
+        (dim, values(column("n", Integer), column("vec", PGVector(dim)), name="queries").data(rows))
+        for dim, rows in rows_by_dim.items()
+    ]
+
+
+def cosine_distance_sql(column, query, dim: int):
+    """``(distance, same_dim)`` SQL expressions comparing a pgvector ``column`` with ``query``, a
+    ``vector(dim)`` expression such as the ``vec`` column of ``query_vectors_sql``.
+
+    The column is cast to ``vector(dim)`` and filtered to that (literal) dimension: the same
+    expression and predicate as the partial indexes from ``app.db.schema.ensure_vector_indexes``,
+    so ``ORDER BY distance`` can be served by them. Cosine similarity is ``1 - distance``.
+    """
+    typed = cast(column, PGVector(dim))
+    distance = typed.op("<=>", return_type=Float)(query)
+    return distance, func.vector_dims(column) == literal_column(str(int(dim)))
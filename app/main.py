@@ -1,19 +1,84 @@
+import logging
+
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
+from app.api.middleware import RequestMetricsMiddleware
 from app.api.routes.classification import router as classification_router
+from app.api.routes.embeddings import router as embeddings_router
 from app.api.routes.entries import router as entries_router
 from app.api.routes.labels import router as labels_router
+from app.api.routes.metrics import router as metrics_router
 from app.api.routes.stats import router as stats_router
 from app.core.config import settings
+from app.core.errors import OllamaBadResponseError, OllamaUnavailableError
 from app.db.base import Base
-from app.db.session import engine
-from app.models import Label, TextEntry  # noqa: F401
+from app.db.schema import ensure_vector_indexes, prepare_database, upgrade_schema
+from app.db.session import SessionLocal, engine
+from app.models import CentroidDelta, EmbeddingMigrationJob, EntryCounter, Label, LabelsVersion, ReclassifyJob, TextEntry  # noqa: F401
+from app.services.centroid_worker import CentroidWorker, flush_all_centroid_deltas
+from app.services.embedding_migration_service import follow_active_model, resume_embedding_migrations
+from app.services.embedding_store import get_embedding_store
+from app.services.label_index import get_label_index, save_label_indexes
+from app.services.reclassify_job_service import resume_reclassify_jobs
+from app.services.service_factory import build_async_embedding_client, build_embedding_client, build_ollama_client
+from app.services.stats_service import StatsReconciler, ensure_stats
+
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    prepare_database(engine)
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    created = ensure_vector_indexes(engine)
+    if created:
+        logger.info("Created vector indexes %s", created)
+    if ensure_stats(engine):
+        logger.info("Built the entry counters for /stats")
+    with SessionLocal() as db:
+        # A completed embedding model migration overrides the configured model.
+        follow_active_model(db, 0)
+        # Load (or build) the label index now rather than on the first request.
+        get_label_index(db).sync(db)
+        store = get_embedding_store(engine)
+        if store is not None:
+            # Backfills a new store and recovers appends lost between a commit and a crash.
+            appended = store.catch_up(db)
+            if appended:
+                logger.info("Appended %d entries to the embedding store", appended)
+    ollama = build_ollama_client()
+    try:
+        ollama.discover_endpoint()
+    except (OllamaUnavailableError, OllamaBadResponseError) as e:
+        # Not fatal: the endpoint is discovered on the first embedding request instead.
+        logger.warning("Ollama endpoint discovery failed: %s", e)
+    resumed = resume_reclassify_jobs(engine, build_embedding_client())
+    if resumed:
+        logger.info("Resumed reclassify jobs %s", resumed)
+    resumed = resume_embedding_migrations(engine)
+    if resumed:
+        logger.info("Resumed embedding model migrations %s", resumed)
+    # Deltas left by a previous run (or by deferred mode before switching to immediate).
+    applied = flush_all_centroid_deltas(engine, build_embedding_client())
+    if applied:
+        logger.info("Applied %d pending centroid deltas", applied)
+    centroid_worker = None
+    if settings.centroid_update_mode == "deferred":
+        centroid_worker = CentroidWorker(engine, build_embedding_client(), settings.centroid_flush_interval_ms).start()
+    reconciler = None
+    if settings.stats_reconcile_interval_seconds > 0:
+        reconciler = StatsReconciler(engine, settings.stats_reconcile_interval_seconds).start()
     yield
+    if reconciler is not None:
+        reconciler.stop()
+    if centroid_worker is not None:
+        centroid_worker.stop()
+    save_label_indexes()
+    if build_async_embedding_client.cache_info().currsize:
+        await build_async_embedding_client().aclose()
+    ollama.close()
 
 
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
@@ -25,6 +90,10 @@ def health() -> dict[str, str]:
 
 
 app.include_router(classification_router)
+app.include_router(embeddings_router)
 app.include_router(entries_router)
 app.include_router(labels_router)
 app.include_router(stats_router)
+if settings.metrics_enabled:
+    app.include_router(metrics_router)
+    app.add_middleware(RequestMetricsMiddleware)
@@ -1,4 +1,9 @@
+from app.models.centroid_delta import CentroidDelta
+from app.models.embedding_migration_job import EmbeddingMigrationJob
+from app.models.entry_counter import EntryCounter
 from app.models.label import Label
+from app.models.labels_version import LabelsVersion
+from app.models.reclassify_job import ReclassifyJob
 from app.models.text_entry import TextEntry
 
-__all__ = ["Label", "TextEntry"]
+__all__ = ["CentroidDelta", "EmbeddingMigrationJob", "EntryCounter", "Label", "LabelsVersion", "ReclassifyJob", "TextEntry"]
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+from app.db.types import VectorType
+
+
+class CentroidDelta(Base):
+    """A pending change to a label's running sum, written instead of updating the label when
+    ``CENTROID_UPDATE_MODE=deferred`` and applied by ``app/services/centroid_worker.py``."""
+
+    __tablename__ = "label_centroid_deltas"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    label_id: Mapped[int] = mapped_column(Integer, index=True)
+    # Entries added (positive) or removed (negative), and the sum of their embeddings (None if
+    # none of them had one).
+    count: Mapped[int] = mapped_column(Integer)
+    vectors_sum: Mapped[np.ndarray | None] = mapped_column(VectorType("float64"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
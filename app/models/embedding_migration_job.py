@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class EmbeddingMigrationJob(Base):
+    __tablename__ = "embedding_migration_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    # queued -> running -> switching -> completed | cancelled | failed
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)
+    source_model: Mapped[str] = mapped_column(String(200))
+    target_model: Mapped[str] = mapped_column(String(200))
+    chunk_size: Mapped[int] = mapped_column(Integer, default=200)
+    max_texts_per_second: Mapped[float] = mapped_column(Float, default=0.0)
+    # Keyset cursor: every entry with id <= last_entry_id has a target_model embedding committed.
+    last_entry_id: Mapped[int] = mapped_column(Integer, default=0)
+    total_count: Mapped[int] = mapped_column(Integer, default=0)
+    embedded_count: Mapped[int] = mapped_column(Integer, default=0)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Token of the worker currently allowed to write progress; a resumed worker takes it over.
+    owner: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,19 @@
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class EntryCounter(Base):
+    """Number of entries per (label, confidence, score bucket), kept in step with ``text_entries``.
+
+    ``label_id`` 0 counts unlabelled entries, ``confidence`` "" entries without one, and
+    ``bucket`` -1 entries without a score (see ``app/services/stats_service.py``).
+    """
+
+    __tablename__ = "entry_counters"
+
+    label_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    confidence: Mapped[str] = mapped_column(String(20), primary_key=True)
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    count: Mapped[int] = mapped_column(Integer, default=0)
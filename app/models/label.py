@@ -1,10 +1,12 @@
 import json
 from datetime import datetime
 
+import numpy as np
 from sqlalchemy import DateTime, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
+from app.db.types import VectorType
 
 
 class Label(Base):
@@ -13,7 +15,16 @@ class Label(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(120), unique=True, index=True)
     definition: Mapped[str] = mapped_column(Text)
-    centroid_json: Mapped[str] = mapped_column(Text)
+    centroid_vec: Mapped[np.ndarray | None] = mapped_column(VectorType(), nullable=True)
+    # Legacy JSON-text centroid; only read for rows that scripts/migrate_vectors.py has not converted.
+    centroid_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Cached definition embedding and running sum of member entry embeddings, so the centroid
+    # can be updated in O(dim) when entries are added, removed or moved.
+    definition_embedding_vec: Mapped[np.ndarray | None] = mapped_column(VectorType(), nullable=True)
+    # What definition_embedding_vec was computed from: embedding model and sha256 of the definition.
+    definition_model: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    definition_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    entries_sum_vec: Mapped[np.ndarray | None] = mapped_column(VectorType("float64"), nullable=True)
     usage_count: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -21,9 +32,28 @@ class Label(Base):
     entries = relationship("TextEntry", back_populates="label")
 
     @property
-    def centroid(self) -> list[float]:
-        return json.loads(self.centroid_json)
+    def centroid(self) -> np.ndarray:
+        if self.centroid_vec is not None:
+            return self.centroid_vec
+        return np.asarray(json.loads(self.centroid_json or "[]"), dtype=np.float32)
 
     @centroid.setter
-    def centroid(self, value: list[float]) -> None:
-        self.centroid_json = json.dumps(value)
+    def centroid(self, value: list[float] | np.ndarray) -> None:
+        self.centroid_vec = np.asarray(value, dtype=np.float32)
+        self.centroid_json = None
+
+    @property
+    def definition_embedding(self) -> np.ndarray | None:
+        return self.definition_embedding_vec
+
+    @definition_embedding.setter
+    def definition_embedding(self, value: list[float] | np.ndarray | None) -> None:
+        self.definition_embedding_vec = None if value is None else np.asarray(value, dtype=np.float32)
+
+    @property
+    def entries_sum(self) -> np.ndarray | None:
+        return self.entries_sum_vec
+
+    @entries_sum.setter
+    def entries_sum(self, value: list[float] | np.ndarray | None) -> None:
+        self.entries_sum_vec = None if value is None else np.asarray(value, dtype=np.float64)
@@ -0,0 +1,14 @@
+from sqlalchemy import Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class LabelsVersion(Base):
+    """Single row counting committed changes to ``labels``; bumped in the writing transaction, so
+    it only ever grows in commit order (unlike ``max(updated_at)``)."""
+
+    __tablename__ = "labels_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    version: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ReclassifyJob(Base):
+    __tablename__ = "reclassify_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    # queued -> running -> completed | cancelled | failed
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)
+    include_forced: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Matching mode, fixed when the job starts (None: jobs queued before modes were recorded).
+    mode: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    chunk_size: Mapped[int] = mapped_column(Integer, default=500)
+    # Keyset cursor: every entry with id <= last_entry_id has been processed and committed.
+    last_entry_id: Mapped[int] = mapped_column(Integer, default=0)
+    total_count: Mapped[int] = mapped_column(Integer, default=0)
+    scanned_count: Mapped[int] = mapped_column(Integer, default=0)
+    reclassified_count: Mapped[int] = mapped_column(Integer, default=0)
+    skipped_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Token of the worker currently allowed to write progress; a resumed worker takes it over.
+    owner: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
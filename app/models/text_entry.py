@@ -1,34 +1,64 @@
 import json
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, Text
+import numpy as np
+from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, Text, case
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.core.embedding_model import active_embedding_model
 from app.db.base import Base
+from app.db.types import VectorType
 
 
 class TextEntry(Base):
     __tablename__ = "text_entries"
+    # Never reuse the id of a deleted entry: the in-process k-NN index and the embedding store
+    # only pick up ids above the last one they have seen.
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     text: Mapped[str] = mapped_column(Text)
-    similarity_score: Mapped[float | None] = mapped_column(Float, nullable=True)
-    confidence: Mapped[str | None] = mapped_column(String(20), nullable=True, index=True)
+    # active_history: entry counters need the previous value even when it was not loaded.
+    similarity_score: Mapped[float | None] = mapped_column(Float, nullable=True, active_history=True)
+    confidence: Mapped[str | None] = mapped_column(String(20), nullable=True, index=True, active_history=True)
+    embedding_vec: Mapped[np.ndarray | None] = mapped_column(VectorType(), nullable=True)
+    # Legacy JSON-text embedding; only read for rows that scripts/migrate_vectors.py has not converted.
     embedding_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Model that produced the embedding (None: written before models were tagged).
+    embedding_model: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    # Filled by an embedding model migration. Once its target model is active this is the entry's
+    # embedding (see embedding_for) until the migration moves it into embedding_vec.
+    next_embedding_vec: Mapped[np.ndarray | None] = mapped_column(VectorType(), nullable=True)
+    next_embedding_model: Mapped[str | None] = mapped_column(String(200), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    label_id: Mapped[int | None] = mapped_column(ForeignKey("labels.id"), nullable=True, index=True)
+    label_id: Mapped[int | None] = mapped_column(ForeignKey("labels.id"), nullable=True, index=True, active_history=True)
     label = relationship("Label", back_populates="entries")
 
     @property
-    def embedding(self) -> list[float] | None:
+    def embedding(self) -> np.ndarray | None:
+        """The embedding for the active model."""
+        if self.next_embedding_model is not None and self.next_embedding_model == active_embedding_model():
+            return self.next_embedding_vec
+        if self.embedding_vec is not None:
+            return self.embedding_vec
         if self.embedding_json is None:
             return None
-        return json.loads(self.embedding_json)
-
-    @embedding.setter
-    def embedding(self, value: list[float] | None) -> None:
-        if value is None:
-            self.embedding_json = None
-            return
-        self.embedding_json = json.dumps(value)
+        return np.asarray(json.loads(self.embedding_json), dtype=np.float32)
+
+    def set_embedding(self, value: list[float] | np.ndarray | None, model: str | None) -> None:
+        """Store ``value``, tagged with the ``model`` that embedded it (``embedding_model_name`` of
+        the client). A pending migration vector no longer matches and is dropped, so the migration
+        re-embeds the entry."""
+        self.embedding_vec = None if value is None else np.asarray(value, dtype=np.float32)
+        self.embedding_json = None
+        self.embedding_model = None if value is None else model
+        if self.next_embedding_model is not None:
+            self.next_embedding_vec = None
+            self.next_embedding_model = None
+
+    @classmethod
+    def embedding_for(cls, model: str):
+        """SQL for the vector column holding the embedding for ``model`` (``embedding`` in SQL);
+        legacy ``embedding_json`` rows are not covered."""
+        return case((cls.next_embedding_model == model, cls.next_embedding_vec), else_=cls.embedding_vec)
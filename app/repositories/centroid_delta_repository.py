@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, distinct, func, select
+from sqlalchemy.orm import Session
+
+from app.models.centroid_delta import CentroidDelta
+
+# SQLite caps bound parameters per statement; keep IN (...) lists well below it.
+_IN_CHUNK = 500
+
+
+class CentroidDeltaRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add(self, label_id: int, count: int, vectors_sum: np.ndarray | None) -> None:
+        self.db.add(CentroidDelta(label_id=label_id, count=count, vectors_sum=vectors_sum))
+
+    def take_oldest(self, limit: int) -> list[tuple[int, int, np.ndarray | None]]:
+        """Delete and return the ``limit`` oldest ``(label_id, count, vectors_sum)`` deltas.
+
+        A write is the transaction's first statement, so on SQLite it holds the write lock from
+        the start and the label updates that follow cannot fail on a stale read snapshot.
+        """
+        oldest = select(CentroidDelta.id).order_by(CentroidDelta.id).limit(limit)
+        rows = self.db.execute(
+            delete(CentroidDelta)
+            .where(CentroidDelta.id.in_(oldest.scalar_subquery()))
+            .returning(CentroidDelta.label_id, CentroidDelta.count, CentroidDelta.vectors_sum),
+            execution_options={"synchronize_session": False},
+        ).all()
+        return [tuple(row) for row in rows]
+
+    def discard_for_labels(self, label_ids: list[int]) -> None:
+        """Drop pending deltas of labels that are about to be rebuilt from their entries."""
+        for start in range(0, len(label_ids), _IN_CHUNK):
+            self.db.execute(
+                delete(CentroidDelta).where(CentroidDelta.label_id.in_(label_ids[start : start + _IN_CHUNK])),
+                execution_options={"synchronize_session": False},
+            )
+
+    def label_ids(self) -> set[int]:
+        """Labels with pending deltas."""
+        return set(self.db.execute(select(CentroidDelta.label_id).distinct()).scalars().all())
+
+    def summary(self) -> tuple[int, int, datetime | None]:
+        """``(pending deltas, labels with pending deltas, oldest created_at)``."""
+        count, labels, oldest = self.db.execute(
+            select(func.count(CentroidDelta.id), func.count(distinct(CentroidDelta.label_id)), func.min(CentroidDelta.created_at))
+        ).one()
+        return count, labels, oldest
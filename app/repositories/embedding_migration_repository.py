@@ -0,0 +1,57 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.embedding_migration_job import EmbeddingMigrationJob
+
+ACTIVE_STATUSES = ("queued", "running", "switching")
+
+
+class EmbeddingMigrationRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(
+        self, source_model: str, target_model: str, chunk_size: int, max_texts_per_second: float, total_count: int
+    ) -> EmbeddingMigrationJob:
+        job = EmbeddingMigrationJob(
+            status="queued",
+            source_model=source_model,
+            target_model=target_model,
+            chunk_size=chunk_size,
+            max_texts_per_second=max_texts_per_second,
+            total_count=total_count,
+        )
+        self.db.add(job)
+        self.db.flush()
+        return job
+
+    def get_by_id(self, job_id: int) -> EmbeddingMigrationJob | None:
+        return self.db.execute(
+            select(EmbeddingMigrationJob).where(EmbeddingMigrationJob.id == job_id)
+        ).scalar_one_or_none()
+
+    def get_active(self) -> EmbeddingMigrationJob | None:
+        return self.db.execute(
+            select(EmbeddingMigrationJob)
+            .where(EmbeddingMigrationJob.status.in_(ACTIVE_STATUSES))
+            .order_by(EmbeddingMigrationJob.id)
+            .limit(1)
+        ).scalar_one_or_none()
+
+    def list_active_ids(self) -> list[int]:
+        return list(
+            self.db.execute(
+                select(EmbeddingMigrationJob.id)
+                .where(EmbeddingMigrationJob.status.in_(ACTIVE_STATUSES))
+                .order_by(EmbeddingMigrationJob.id)
+            ).scalars()
+        )
+
+    def current_model(self) -> str | None:
+        """Target model of the most recent completed migration (None if none ever completed)."""
+        return self.db.execute(
+            select(EmbeddingMigrationJob.target_model)
+            .where(EmbeddingMigrationJob.status == "completed")
+            .order_by(EmbeddingMigrationJob.id.desc())
+            .limit(1)
+        ).scalar_one_or_none()
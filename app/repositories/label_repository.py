@@ -1,7 +1,12 @@
-from sqlalchemy import func, select
+import numpy as np
+from sqlalchemy import func, insert, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
+from app.db.types import cosine_distance_sql, query_vectors_sql
 from app.models.label import Label
+from app.models.labels_version import LabelsVersion
 
 
 class LabelRepository:
@@ -11,12 +16,52 @@ class LabelRepository:
     def list_labels(self) -> list[Label]:
         return self.db.execute(select(Label).order_by(Label.usage_count.desc(), Label.name.asc())).scalars().all()
 
+    def list_names(self) -> list[tuple[int, str]]:
+        """``(id, name)`` of every label, without loading the vectors."""
+        return [tuple(row) for row in self.db.execute(select(Label.id, Label.name).order_by(Label.name)).all()]
+
     def get_by_name(self, name: str) -> Label | None:
         return self.db.execute(select(Label).where(Label.name == name)).scalar_one_or_none()
 
     def get_by_id(self, label_id: int) -> Label | None:
         return self.db.execute(select(Label).where(Label.id == label_id)).scalar_one_or_none()
 
+    def get_by_ids(self, label_ids: list[int]) -> list[Label]:
+        if not label_ids:
+            return []
+        return self.db.execute(select(Label).where(Label.id.in_(label_ids))).scalars().all()
+
+    def get_by_names(self, names: list[str]) -> list[Label]:
+        if not names:
+            return []
+        return self.db.execute(select(Label).where(Label.name.in_(names))).scalars().all()
+
+    def nearest_by_centroid(self, vectors: list[list[float]] | np.ndarray, k: int) -> list[list[tuple[int, str, float]]]:
+        """For each of ``vectors``, the ``k`` most similar labels as ``(id, name, cosine similarity)``,
+        best first (pgvector only). One statement per distinct vector dimension."""
+        results: list[list[tuple[int, str, float]]] = [[] for _ in vectors]
+        for dim, queries in query_vectors_sql(vectors):
+            for n, label_id, name, distance in self.db.execute(self.nearest_by_centroid_sql(queries, dim, k)):
+                results[n].append((label_id, name, 1.0 - float(distance)))
+        return results
+
+    @staticmethod
+    def nearest_by_centroid_sql(queries, dim: int, k: int):
+        """``(n, id, name, distance)`` rows of the ``k`` nearest centroids of each query vector."""
+        distance, same_dim = cosine_distance_sql(Label.centroid_vec, queries.c.vec, dim)
+        hits = (
+            select(Label.id, Label.name, distance.label("distance"))
+            .where(same_dim)
+            .order_by(distance)
+            .limit(k)
+            .lateral("hits")
+        )
+        return (
+            select(queries.c.n, hits.c.id, hits.c.name, hits.c.distance)
+            .select_from(queries.join(hits, true()))
+            .order_by(queries.c.n, hits.c.distance)
+        )
+
     def create(self, name: str, definition: str, centroid: list[float]) -> Label:
         label = Label(name=name, definition=definition)
         label.centroid = centroid
@@ -30,3 +75,21 @@ class LabelRepository:
 
     def count(self) -> int:
         return self.db.execute(select(func.count(Label.id))).scalar_one()
+
+    def version(self) -> int:
+        """Change counter of the labels table (see ``bump_version``)."""
+        return self.db.execute(select(LabelsVersion.version).where(LabelsVersion.id == 1)).scalar() or 0
+
+    def bump_version(self) -> None:
+        """Count a change to ``labels`` in the current transaction. The row lock serializes label
+        writers until commit, so a higher version is always committed after a lower one."""
+        # Runs from inside flush events, so go through the connection rather than the session.
+        conn = self.db.connection()
+        table = LabelsVersion.__table__
+        dialect = conn.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(table).values(id=1, version=1)
+            conn.execute(stmt.on_conflict_do_update(index_elements=[table.c.id], set_={"version": table.c.version + 1}))
+            return
+        if not conn.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1)).rowcount:
+            conn.execute(insert(table).values(id=1, version=1))
@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.reclassify_job import ReclassifyJob
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class ReclassifyJobRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, include_forced: bool, chunk_size: int, total_count: int, mode: str | None = None) -> ReclassifyJob:
+        job = ReclassifyJob(
+            status="queued", include_forced=include_forced, mode=mode, chunk_size=chunk_size, total_count=total_count
+        )
+        self.db.add(job)
+        self.db.flush()
+        return job
+
+    def get_by_id(self, job_id: int) -> ReclassifyJob | None:
+        return self.db.execute(select(ReclassifyJob).where(ReclassifyJob.id == job_id)).scalar_one_or_none()
+
+    def get_active(self) -> ReclassifyJob | None:
+        return self.db.execute(
+            select(ReclassifyJob).where(ReclassifyJob.status.in_(ACTIVE_STATUSES)).order_by(ReclassifyJob.id).limit(1)
+        ).scalar_one_or_none()
+
+    def list_active_ids(self) -> list[int]:
+        return list(
+            self.db.execute(
+                select(ReclassifyJob.id).where(ReclassifyJob.status.in_(ACTIVE_STATUSES)).order_by(ReclassifyJob.id)
+            ).scalars()
+        )
@@ -0,0 +1,100 @@
+from collections.abc import Mapping
+
+from sqlalchemy import Integer, case, cast, delete, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.entry_counter import EntryCounter
+from app.models.text_entry import TextEntry
+
+# Score histogram: SCORE_BINS equal buckets over [-1, 1]; bucket -1 holds entries without a score.
+SCORE_BINS = 20
+NO_SCORE = -1
+
+CounterKey = tuple[int, str, int]  # (label_id or 0, confidence or "", bucket)
+
+
+def score_bucket(score: float | None) -> int:
+    if score is None:
+        return NO_SCORE
+    return min(max(int((score + 1.0) * (SCORE_BINS / 2)), 0), SCORE_BINS - 1)
+
+
+def counter_key(label_id: int | None, confidence: str | None, score: float | None) -> CounterKey:
+    return (label_id or 0, confidence or "", score_bucket(score))
+
+
+class StatsRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def apply(self, deltas: Mapping[CounterKey, int]) -> None:
+        """Add ``deltas`` to the counters inside the current transaction."""
+        rows = [
+            {"label_id": label_id, "confidence": confidence, "bucket": bucket, "count": delta}
+            for (label_id, confidence, bucket), delta in deltas.items()
+            if delta
+        ]
+        if not rows:
+            return
+        # Runs from inside flush events, so go through the connection rather than the session.
+        conn = self.db.connection()
+        table = EntryCounter.__table__
+        dialect = conn.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.label_id, table.c.confidence, table.c.bucket],
+                set_={"count": table.c["count"] + stmt.excluded["count"]},
+            )
+            conn.execute(stmt, rows)
+            return
+        for row in rows:
+            key = (
+                (table.c.label_id == row["label_id"])
+                & (table.c.confidence == row["confidence"])
+                & (table.c.bucket == row["bucket"])
+            )
+            if not conn.execute(update(table).where(key).values(count=table.c["count"] + row["count"])).rowcount:
+                conn.execute(insert(table).values(**row))
+
+    def reconcile(self) -> None:
+        """Recompute every counter from ``text_entries`` (one grouped scan) in the current transaction."""
+        conn = self.db.connection()
+        if conn.dialect.name == "postgresql":
+            # Hold off concurrent increments until the recount commits.
+            conn.execute(text("LOCK TABLE entry_counters IN EXCLUSIVE MODE"))
+        score = TextEntry.similarity_score
+        scaled = (score + 1.0) * (SCORE_BINS / 2)
+        # Non-negative here, so truncation is floor; PostgreSQL's integer cast rounds instead.
+        floored = func.floor(scaled) if conn.dialect.name == "postgresql" else scaled
+        bucket = case(
+            (score.is_(None), NO_SCORE),
+            (score >= 1.0, SCORE_BINS - 1),
+            (score < -1.0, 0),
+            else_=cast(floored, Integer),
+        )
+        label_id = func.coalesce(TextEntry.label_id, 0)
+        confidence = func.coalesce(TextEntry.confidence, "")
+        conn.execute(delete(EntryCounter))
+        conn.execute(
+            insert(EntryCounter).from_select(
+                ["label_id", "confidence", "bucket", "count"],
+                select(label_id, confidence, bucket, func.count()).group_by(label_id, confidence, bucket),
+            )
+        )
+
+    def is_empty(self) -> bool:
+        return self.db.execute(select(EntryCounter.label_id).limit(1)).first() is None
+
+    def list_counters(self) -> list[tuple[int, str, int, int]]:
+        """Non-zero ``(label_id, confidence, bucket, count)`` rows; O(labels x confidences x buckets)."""
+        return [
+            tuple(row)
+            for row in self.db.execute(
+                select(EntryCounter.label_id, EntryCounter.confidence, EntryCounter.bucket, EntryCounter.count).where(
+                    EntryCounter.count != 0
+                )
+            ).all()
+        ]
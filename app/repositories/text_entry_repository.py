@@ -1,8 +1,18 @@
-from sqlalchemy import func, select
+import json
+from collections.abc import Iterator
+
+import numpy as np
+from sqlalchemy import case, func, select, true, union_all
 from sqlalchemy.orm import Session
 
+from app.core.embedding_model import active_embedding_model
+from app.db.types import cosine_distance_sql, query_vectors_sql
+from app.models.label import Label
 from app.models.text_entry import TextEntry
 
+# SQLite caps bound parameters per statement; keep IN (...) lists well below it.
+_IN_CHUNK = 500
+
 
 class TextEntryRepository:
     def __init__(self, db: Session):
@@ -15,14 +25,42 @@ class TextEntryRepository:
         similarity_score: float | None,
         confidence: str | None = None,
         embedding: list[float] | None = None,
+        embedding_model: str | None = None,
     ) -> TextEntry:
         entry = TextEntry(text=text, label_id=label_id, similarity_score=similarity_score, confidence=confidence)
         if embedding is not None:
-            entry.embedding = embedding
+            entry.set_embedding(embedding, embedding_model)
         self.db.add(entry)
         self.db.flush()
         return entry
 
+    def create_many(self, rows: list[dict]) -> list[TextEntry]:
+        entries = []
+        for row in rows:
+            embedding = row.get("embedding")
+            entry = TextEntry(
+                text=row["text"],
+                label_id=row["label_id"],
+                similarity_score=row.get("similarity_score"),
+                confidence=row.get("confidence"),
+            )
+            if embedding is not None:
+                entry.set_embedding(embedding, row.get("embedding_model"))
+            entries.append(entry)
+        self.db.add_all(entries)
+        self.db.flush()
+        return entries
+
+    def count(self) -> int:
+        return self.db.execute(select(func.count(TextEntry.id))).scalar_one()
+
+    def max_id(self) -> int:
+        return self.db.execute(select(func.max(TextEntry.id))).scalar() or 0
+
+    def count_by_model(self) -> dict[str | None, int]:
+        """Entries per ``embedding_model`` tag."""
+        return dict(self.db.execute(select(TextEntry.embedding_model, func.count(TextEntry.id)).group_by(TextEntry.embedding_model)).all())
+
     def count_classified(self) -> int:
         return self.db.execute(select(func.count(TextEntry.id)).where(TextEntry.label_id.is_not(None))).scalar_one()
 
@@ -41,6 +79,161 @@ class TextEntryRepository:
     def list_by_label(self, label_id: int) -> list[TextEntry]:
         return self.db.execute(select(TextEntry).where(TextEntry.label_id == label_id)).scalars().all()
 
+    def labels_for_entries(self, entry_ids: list[int]) -> dict[int, tuple[int, str]]:
+        """Current ``(label_id, label_name)`` of each labelled entry in ``entry_ids``."""
+        labels = {}
+        for start in range(0, len(entry_ids), _IN_CHUNK):
+            rows = self.db.execute(
+                select(TextEntry.id, Label.id, Label.name)
+                .join(Label, TextEntry.label_id == Label.id)
+                .where(TextEntry.id.in_(entry_ids[start : start + _IN_CHUNK]))
+            ).all()
+            labels.update((entry_id, (label_id, name)) for entry_id, label_id, name in rows)
+        return labels
+
+    def nearest_labelled(
+        self, vectors: list[list[float]] | np.ndarray, k: int
+    ) -> list[list[tuple[int, int, str, float]]]:
+        """For each of ``vectors``, the ``k`` most similar labelled entries as ``(entry_id, label_id,
+        label_name, cosine similarity)`` (pgvector only). One statement per distinct vector dimension."""
+        model = active_embedding_model()
+        results: list[list[tuple[int, int, str, float]]] = [[] for _ in vectors]
+        for dim, queries in query_vectors_sql(vectors):
+            for n, entry_id, label_id, name, distance in self.db.execute(self.nearest_labelled_sql(queries, dim, k, model)):
+                if len(results[n]) < k:
+                    results[n].append((entry_id, label_id, name, 1.0 - float(distance)))
+        return results
+
+    @staticmethod
+    def nearest_labelled_sql(queries, dim: int, k: int, model: str):
+        """``(n, entry_id, label_id, label_name, distance)`` rows of the ``k`` nearest labelled entries
+        of each query vector, by their embedding for ``model``; up to ``2 * k`` rows per query.
+
+        ``embedding_vec`` and the ``next_embedding_vec`` of a completed migration still being moved
+        over (see ``TextEntry.embedding_for``) are searched separately, so the first can use its
+        vector index.
+        """
+        queries = select(queries).cte("query_vectors")
+        branches = []
+        for name, column, owns in (
+            ("hits", TextEntry.embedding_vec, TextEntry.next_embedding_model.is_distinct_from(model)),
+            ("next_hits", TextEntry.next_embedding_vec, TextEntry.next_embedding_model == model),
+        ):
+            distance, same_dim = cosine_distance_sql(column, queries.c.vec, dim)
+            hits = (
+                select(TextEntry.id.label("entry_id"), Label.id.label("label_id"), Label.name, distance.label("distance"))
+                .join(Label, TextEntry.label_id == Label.id)
+                .where(owns, same_dim)
+                .order_by(distance)
+                .limit(k)
+                .lateral(name)
+            )
+            branches.append(
+                select(queries.c.n, hits.c.entry_id, hits.c.label_id, hits.c.name, hits.c.distance).select_from(
+                    queries.join(hits, true())
+                )
+            )
+        hits = union_all(*branches).subquery("all_hits")
+        return select(hits).order_by(hits.c.n, hits.c.distance)
+
+    def list_copies(self, entry: TextEntry, span: int) -> list[TextEntry]:
+        """Entries with ``entry``'s text (``entry`` included) at most ``span`` ids away, in id order:
+        multi-label classification stores the copies of a text under consecutive ids."""
+        return (
+            self.db.execute(
+                select(TextEntry)
+                .where(TextEntry.id.between(entry.id - span, entry.id + span), TextEntry.text == entry.text)
+                .order_by(TextEntry.id)
+            )
+            .scalars()
+            .all()
+        )
+
+    def list_after(self, after_id: int, limit: int) -> list[TextEntry]:
+        """Keyset page: the next ``limit`` entries with ``id > after_id``, in id order."""
+        return (
+            self.db.execute(select(TextEntry).where(TextEntry.id > after_id).order_by(TextEntry.id).limit(limit))
+            .scalars()
+            .all()
+        )
+
+    def export_page(self, after_id: int, up_to_id: int, limit: int, label_id: int | None = None) -> list:
+        """Keyset page of ``(id, text, label_name, similarity_score, confidence, created_at, embedding)``."""
+        stmt = (
+            select(
+                TextEntry.id,
+                TextEntry.text,
+                Label.name,
+                TextEntry.similarity_score,
+                TextEntry.confidence,
+                TextEntry.created_at,
+                TextEntry.embedding_for(active_embedding_model()),
+                TextEntry.embedding_json,
+            )
+            .outerjoin(Label, TextEntry.label_id == Label.id)
+            .where(TextEntry.id > after_id, TextEntry.id <= up_to_id)
+            .order_by(TextEntry.id)
+            .limit(limit)
+        )
+        if label_id is not None:
+            stmt = stmt.where(TextEntry.label_id == label_id)
+        # yield_per streams the page through a server-side cursor where the driver has one.
+        rows = self.db.execute(stmt.execution_options(yield_per=limit))
+        page = []
+        for *values, vector, raw in rows:
+            if vector is None and raw is not None:
+                vector = np.asarray(json.loads(raw), dtype=np.float32)
+            page.append((*values, vector))
+        return page
+
+    def iter_label_embeddings(self, chunk_size: int = 1000) -> Iterator[tuple[int, np.ndarray | None, str | None]]:
+        """Yield ``(label_id, embedding, embedding_model)`` for every labelled entry, reading
+        ``chunk_size`` rows at a time."""
+        model = active_embedding_model()
+        pending = TextEntry.next_embedding_model == model
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                select(
+                    TextEntry.id,
+                    TextEntry.label_id,
+                    TextEntry.embedding_for(model),
+                    TextEntry.embedding_json,
+                    case((pending, TextEntry.next_embedding_model), else_=TextEntry.embedding_model),
+                )
+                .where(TextEntry.id > last_id, TextEntry.label_id.is_not(None))
+                .order_by(TextEntry.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return
+            for _, label_id, vector, raw, model in rows:
+                if vector is None and raw is not None:
+                    vector = np.asarray(json.loads(raw), dtype=np.float32)
+                yield label_id, vector, model
+            last_id = rows[-1][0]
+
+    def iter_next_label_embeddings(self, model: str, chunk_size: int = 1000) -> Iterator[tuple[int, np.ndarray]]:
+        """Yield ``(label_id, next_embedding)`` for every labelled entry whose pending migration
+        vector is from ``model``, reading ``chunk_size`` rows at a time."""
+        last_id = 0
+        while True:
+            rows = self.db.execute(
+                select(TextEntry.id, TextEntry.label_id, TextEntry.next_embedding_vec)
+                .where(
+                    TextEntry.id > last_id,
+                    TextEntry.label_id.is_not(None),
+                    TextEntry.next_embedding_model == model,
+                )
+                .order_by(TextEntry.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return
+            for _, label_id, vector in rows:
+                yield label_id, vector
+            last_id = rows[-1][0]
+
     def delete(self, entry: TextEntry) -> None:
         self.db.delete(entry)
 
@@ -1,3 +1,7 @@
+from datetime import datetime
+
+from typing import Literal
+
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
@@ -13,6 +17,20 @@ class ClassifyRequest(BaseModel):
         ge=1,
         description="Optional existing label id to force-assign. If omitted (and label omitted), request uses similarity matching.",
     )
+    mode: Literal["centroid", "knn"] | None = Field(
+        default=None,
+        description="Similarity matching mode: label centroids or a k-NN vote of stored entries. Defaults to CLASSIFICATION_MODE.",
+    )
+    top_k: int | None = Field(
+        default=None,
+        ge=1,
+        le=100,
+        description="Also return the k best candidate labels with their scores (similarity matching only).",
+    )
+    multi_label: bool = Field(
+        default=False,
+        description="Store the text under every label above the threshold (up to MULTI_LABEL_MAX_LABELS), not just the best one.",
+    )
 
     @field_validator("label", mode="before")
     @classmethod
@@ -24,6 +42,11 @@ class ClassifyRequest(BaseModel):
         return value
 
 
+class LabelScore(BaseModel):
+    label: str
+    score: float
+
+
 class ClassificationResponse(BaseModel):
     text: str
     assigned_label: str | None
@@ -32,6 +55,33 @@ class ClassificationResponse(BaseModel):
     reason: str
     best_match_label: str | None = None
     best_match_score: float | None = None
+    assigned_labels: list[str] | None = None
+    top_labels: list[LabelScore] | None = None
+
+
+class BatchClassifyRequest(BaseModel):
+    items: list[ClassifyRequest] = Field(min_length=1)
+
+
+class BatchClassifyItemResponse(BaseModel):
+    index: int
+    text: str
+    assigned_label: str | None = None
+    similarity_score: float | None = None
+    reason: str
+    best_match_label: str | None = None
+    best_match_score: float | None = None
+    assigned_labels: list[str] | None = None
+    top_labels: list[LabelScore] | None = None
+    error: str | None = None
+
+
+class BatchClassifyResponse(BaseModel):
+    submitted_count: int
+    classified_count: int
+    failed_count: int
+    classified: list[BatchClassifyItemResponse] = Field(default_factory=list)
+    failed: list[BatchClassifyItemResponse] = Field(default_factory=list)
 
 
 class LabelOut(BaseModel):
@@ -65,6 +115,16 @@ class CreateLabelResponse(BaseModel):
     name: str
 
 
+class UpdateLabelRequest(BaseModel):
+    definition: str = Field(min_length=1, max_length=2000)
+
+
+class UpdateLabelResponse(BaseModel):
+    updated: bool
+    name: str
+    reason: str
+
+
 class DeleteEntryResponse(BaseModel):
     deleted: bool
     entry_id: int
@@ -72,6 +132,10 @@ class DeleteEntryResponse(BaseModel):
 class ReclassifiedItemRequest(BaseModel):
     label: str | None = Field(default=None, max_length=120)
     label_id: int | None = Field(default=None, ge=1)
+    mode: Literal["centroid", "knn"] | None = Field(
+        default=None,
+        description="Similarity matching mode when no label is forced. Defaults to CLASSIFICATION_MODE.",
+    )
 
     @field_validator("label", mode="before")
     @classmethod
@@ -100,9 +164,126 @@ class ReclassifyResponse(BaseModel):
     failed: list[ReclassifiedItemResponse] = Field(default_factory=list) 
 
 
+class ReclassifyAllRequest(BaseModel):
+    include_forced: bool = Field(
+        default=False,
+        description="Also re-score entries that were force-assigned a label. Skipped by default.",
+    )
+    chunk_size: int | None = Field(default=None, ge=1, le=10000)
+    mode: Literal["centroid", "knn"] | None = Field(
+        default=None,
+        description="Similarity matching mode. Defaults to CLASSIFICATION_MODE when the job starts.",
+    )
+
+
+class ReclassifyJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    status: str
+    include_forced: bool
+    mode: str | None = None
+    total_count: int
+    scanned_count: int
+    reclassified_count: int
+    skipped_count: int
+    failed_count: int
+    last_entry_id: int
+    cancel_requested: bool
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+
+
+
+class ImportRowErrorResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    line: int
+    reason: str
+    best_match_label: str | None = None
+    best_match_score: float | None = None
+
+
+class ImportResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    read_count: int
+    imported_count: int
+    matched_count: int
+    forced_count: int
+    failed_count: int
+    errors: list[ImportRowErrorResponse] = Field(
+        default_factory=list,
+        description="The first rejected rows (at most 100); failed_count has the total.",
+    )
+
+
+
+
+class EmbeddingMigrationRequest(BaseModel):
+    target_model: str = Field(min_length=1, max_length=200)
+    chunk_size: int | None = Field(default=None, ge=1, le=10000)
+    max_texts_per_second: float | None = Field(
+        default=None,
+        ge=0.0,
+        description="Throttle on the migration's embedding calls (0 = unthrottled). Defaults to the configured one.",
+    )
+
+
+class EmbeddingMigrationResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    status: str
+    source_model: str
+    target_model: str
+    chunk_size: int
+    max_texts_per_second: float
+    total_count: int
+    embedded_count: int
+    last_entry_id: int
+    cancel_requested: bool
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+
+
+class EmbeddingModelResponse(BaseModel):
+    active_model: str
+    entries_by_model: dict[str, int] = Field(
+        default_factory=dict, description='Entries per embedding model tag ("untagged": written before tags existed).'
+    )
+    migration: EmbeddingMigrationResponse | None = None
+
+
+class ScoreBucket(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class LabelStats(BaseModel):
+    name: str
+    entries_count: int
+    score_histogram: list[int] = Field(description="Entry counts per bucket of the top-level score_histogram.")
+
+
+class CentroidStats(BaseModel):
+    mode: str
+    pending_updates: int
+    pending_labels: int
+    oldest_pending_seconds: float | None = None
+    staleness_bound_ms: float
 
 
 class StatsResponse(BaseModel):
     labels_count: int
     classified_entries_count: int
     unclassified_entries_count: int
+    confidence_counts: dict[str, int] = Field(default_factory=dict)
+    score_histogram: list[ScoreBucket] = Field(default_factory=list)
+    labels: list[LabelStats] = Field(default_factory=list)
+    centroids: CentroidStats | None = None
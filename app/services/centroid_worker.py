@@ -0,0 +1,99 @@
+"""Applies the centroid deltas recorded with ``CENTROID_UPDATE_MODE=deferred``.
+
+Requests only append a row to ``label_centroid_deltas`` in their own transaction, so they never
+write (or lock) a label row. The worker takes the oldest deltas, sums them per label and updates
+each label once, so a burst of N classifications into one label costs one centroid update. A
+centroid lags its entries by at most about ``centroid_flush_interval_ms`` plus the flush time.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.repositories.centroid_delta_repository import CentroidDeltaRepository
+from app.repositories.label_repository import LabelRepository
+from app.services.embedding_service import EmbeddingClient
+from app.services.label_embedding_service import LabelEmbeddingService, flush_requested
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_LIMIT = 10000
+
+
+def flush_centroid_deltas(db: Session, embedding_client: EmbeddingClient, limit: int = _FLUSH_LIMIT) -> int:
+    """Apply (and commit) up to ``limit`` pending deltas; returns how many were applied."""
+    deltas = CentroidDeltaRepository(db).take_oldest(limit)
+    if not deltas:
+        db.rollback()
+        return 0
+    counts: dict[int, int] = defaultdict(int)
+    sums: dict[int, np.ndarray | None] = {}
+    mixed: set[int] = set()
+    for label_id, count, vectors_sum in deltas:
+        counts[label_id] += count
+        if vectors_sum is None:
+            sums.setdefault(label_id, None)
+            continue
+        current = sums.get(label_id)
+        if current is None:
+            sums[label_id] = np.asarray(vectors_sum, dtype=np.float64).copy()
+        elif len(current) == len(vectors_sum):
+            current += vectors_sum
+        else:
+            mixed.add(label_id)
+
+    service = LabelEmbeddingService(db, embedding_client, deferred=False)
+    # Deltas of deleted labels are simply dropped. apply_delta locks each label row; taking them
+    # in id order keeps concurrent workers from deadlocking on each other.
+    for label in sorted(LabelRepository(db).get_by_ids(list(counts)), key=lambda label: label.id):
+        if label.id in mixed:
+            service.recompute_for_label(label)
+        else:
+            service.apply_delta(label, sums[label.id], counts[label.id])
+    db.commit()
+    return len(deltas)
+
+
+def flush_all_centroid_deltas(bind: Engine, embedding_client: EmbeddingClient) -> int:
+    total = 0
+    while True:
+        with Session(bind) as db:
+            applied = flush_centroid_deltas(db, embedding_client)
+        total += applied
+        if applied < _FLUSH_LIMIT:
+            return total
+
+
+class CentroidWorker:
+    """Background thread flushing the deltas every ``interval_ms``, or as soon as
+    ``centroid_flush_max_changes`` were recorded."""
+
+    def __init__(self, bind: Engine, embedding_client: EmbeddingClient, interval_ms: float):
+        self.bind = bind
+        self.embedding_client = embedding_client
+        self.interval = interval_ms / 1000.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="centroid-worker", daemon=True)
+
+    def start(self) -> "CentroidWorker":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        flush_requested.set()
+        self._thread.join(timeout=30)
+
+    def _run(self) -> None:
+        while True:
+            flush_requested.wait(self.interval)
+            flush_requested.clear()
+            try:
+                flush_all_centroid_deltas(self.bind, self.embedding_client)
+            except Exception:
+                logger.exception("Centroid delta flush failed")
+            if self._stop.is_set():
+                return
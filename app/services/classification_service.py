@@ -1,16 +1,31 @@
 from __future__ import annotations
 
+import heapq
+import time
+from collections import defaultdict
 from dataclasses import dataclass
 
+import numpy as np
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.errors import NoLabelFitError
+from app.core.metrics import MATCH_SECONDS, NO_LABEL_FIT
+from app.db.types import uses_pgvector
 from app.models.label import Label
 from app.repositories.label_repository import LabelRepository
 from app.repositories.text_entry_repository import TextEntryRepository
-from app.services.embedding_service import EmbeddingClient, cosine_similarity
-from app.core.label_utils import normalize_label_name, best_label_match
+from app.services.embedding_migration_service import dual_write, follow_active_model
+from app.services.embedding_service import EmbeddingClient, cosine_similarity, embed_texts, embedding_model_name
+from app.core.label_utils import normalize_label_name
+from app.services.entry_index import get_entry_index
 from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.label_index import get_label_index
+
+# (label_id, label_name, score, reason); label_id is None when nothing matched.
+Match = tuple[int | None, str | None, float, str]
+
+_NO_MATCH: Match = (None, None, 0.0, "matched_existing_label")
 
 
 @dataclass
@@ -21,6 +36,66 @@ class ClassificationResult:
     reason: str
     best_match_label: str | None = None
     best_match_score: float | None = None
+    # (label name, score) of the best candidates, when top_k was requested.
+    top_labels: list[tuple[str, float]] | None = None
+    # Every label the text was stored under, in multi-label mode.
+    assigned_labels: list[str] | None = None
+
+
+@dataclass
+class BatchItem:
+    text: str
+    label: str | None = None
+    label_id: int | None = None
+    mode: str | None = None
+    top_k: int | None = None
+    multi_label: bool = False
+
+
+@dataclass
+class BatchItemOutcome:
+    index: int
+    result: ClassificationResult | None = None
+    error: str | None = None
+    top_labels: list[tuple[str, float]] | None = None
+
+
+def _candidate_count(top_k: int | None, multi_label: bool) -> int:
+    """Labels to rank: ``top_k``, or enough for a multi-label assignment."""
+    return max(top_k or 1, settings.multi_label_max_labels if multi_label else 1)
+
+
+def _top_labels(ranked: list[Match], top_k: int | None) -> list[tuple[str, float]] | None:
+    if not top_k:
+        return None
+    return [(name, round(score, 4)) for _, name, score, _ in ranked[:top_k]]
+
+
+def _fitting(ranked: list[Match], multi_label: bool) -> list[Match]:
+    """Matches to store the text under: the best one, or all of them in multi-label mode."""
+    fits = [match for match in ranked if match[0] is not None and match[2] >= settings.similarity_threshold]
+    return fits if multi_label else fits[:1]
+
+
+def _reassign(label_ids: list[int | None], ranked: list[Match]) -> list[Match | None]:
+    """New label of each stored copy of one text (currently under ``label_ids``); None keeps the
+    copy's label. Copies under several labels were stored in multi-label mode: those whose label
+    still fits keep it and the others move to the fitting labels no copy holds yet."""
+    multi_label = len(set(label_ids)) > 1
+    fits = _fitting(ranked, multi_label)
+    if not multi_label:
+        return [fits[0] if fits else None for _ in label_ids]
+    by_label = {match[0]: match for match in fits}
+    assigned: list[Match | None] = [None] * len(label_ids)
+    moving = []
+    for i, label_id in enumerate(label_ids):
+        if label_id in by_label:
+            assigned[i] = by_label.pop(label_id)
+        else:
+            moving.append(i)
+    for i, match in zip(moving, [match for match in fits if match[0] in by_label]):
+        assigned[i] = match
+    return assigned
 
 
 class ClassificationService:
@@ -31,9 +106,51 @@ class ClassificationService:
         self.embedding_client = embedding_client
         self.label_embeddings = LabelEmbeddingService(db, embedding_client)
 
-    def classify(self, text: str, label: str | None = None, label_id: int | None = None) -> ClassificationResult:
+    def classify(
+        self,
+        text: str,
+        label: str | None = None,
+        label_id: int | None = None,
+        mode: str | None = None,
+        top_k: int | None = None,
+        multi_label: bool = False,
+    ) -> ClassificationResult:
+        follow_active_model(self.db)
+        vector_model = embedding_model_name(self.embedding_client)
         vector = self.embedding_client.get_embedding(text)
+        return self.classify_vector(
+            text,
+            vector,
+            label=label,
+            label_id=label_id,
+            mode=mode,
+            top_k=top_k,
+            multi_label=multi_label,
+            vector_model=vector_model,
+        )
+
+    def classify_vector(
+        self,
+        text: str,
+        vector: list[float],
+        label: str | None = None,
+        label_id: int | None = None,
+        mode: str | None = None,
+        top_k: int | None = None,
+        multi_label: bool = False,
+        vector_model: str | None = None,
+    ) -> ClassificationResult:
+        """Classify ``text`` whose embedding was already computed (e.g. by an async client).
 
+        ``top_k`` also returns the k best candidate labels; ``multi_label`` stores the text under
+        every label above the threshold (one entry each). Both only apply to similarity matching.
+        ``vector_model`` is the model ``vector`` came from; it is re-embedded if a model migration
+        switched over in the meantime.
+        """
+        follow_active_model(self.db)
+        model = embedding_model_name(self.embedding_client)
+        if vector_model is not None and vector_model != model:
+            vector = self.embedding_client.get_embedding(text)
         forced_label = None
         if label_id is not None:
             forced_label = self.labels.get_by_id(label_id)
@@ -47,14 +164,16 @@ class ClassificationService:
                 raise ValueError("label_not_found")
 
             score = cosine_similarity(vector, existing.centroid)
-            self.entries.create(
+            entry = self.entries.create(
                 text=text,
                 label_id=existing.id,
                 similarity_score=score,
                 confidence="forced",
                 embedding=vector,
+                embedding_model=model,
             )
-            self.label_embeddings.recompute_for_label(existing)
+            dual_write(self.db, [entry])
+            self.label_embeddings.add_entry(existing, vector)
             self.db.commit()
             return ClassificationResult(
                 assigned_label=existing.name,
@@ -63,36 +182,293 @@ class ClassificationService:
                 reason="forced_label_assigned",
             )
 
-        known_labels = self.labels.list_labels()
-        best_label, best_score = best_label_match(vector, known_labels)
-        best_match_label = best_label.name if best_label else None
-        best_match_score = round(best_score, 4) if best_label else None
+        ranked = self._ranked_matches([vector], mode, _candidate_count(top_k, multi_label))[0]
+        best_label_id, best_match_label, best_score, reason = ranked[0] if ranked else _NO_MATCH
+        best_match_score = round(best_score, 4) if best_label_id is not None else None
+        top_labels = _top_labels(ranked, top_k)
 
-        if best_label and best_score >= settings.similarity_threshold:
-            self.entries.create(
-                text=text,
-                label_id=best_label.id,
-                similarity_score=best_score,
-                confidence="high",
-                embedding=vector,
-            )
-            self.label_embeddings.recompute_for_label(best_label)
+        fits = _fitting(ranked, multi_label)
+        if fits:
+            by_id = {label.id: label for label in self.labels.get_by_ids([match[0] for match in fits])}
+            best_label = by_id.get(best_label_id)
+            if best_label is None:
+                raise ValueError("label_not_found")
+            assigned, created = [], []
+            for match_id, _, score, _ in fits:
+                matched = by_id.get(match_id)
+                if matched is None:
+                    continue
+                entry = self.entries.create(
+                    text=text,
+                    label_id=matched.id,
+                    similarity_score=score,
+                    confidence="high",
+                    embedding=vector,
+                    embedding_model=model,
+                )
+                self.label_embeddings.add_entry(matched, vector)
+                assigned.append(matched.name)
+                created.append(entry)
+            dual_write(self.db, created)
             self.db.commit()
             return ClassificationResult(
                 assigned_label=best_label.name,
                 similarity_score=round(best_score, 4),
                 created_new_label=False,
-                reason="matched_existing_label",
+                reason=reason,
                 best_match_label=best_match_label,
                 best_match_score=best_match_score,
+                top_labels=top_labels,
+                assigned_labels=assigned if multi_label else None,
             )
 
         # Safety rule: never store an unlabelled entry.
-        raise ValueError(
-            f"no_label_fit: best_match_label={best_match_label!r} best_match_score={best_match_score!r}"
+        NO_LABEL_FIT.inc("classify")
+        raise NoLabelFitError(best_match_label, best_match_score, top_labels)
+
+    def classify_batch(self, items: list[BatchItem]) -> list[BatchItemOutcome]:
+        """Classify many texts with one embedding call, one scoring pass and one commit.
+
+        Per-item failures (``label_not_found`` / ``no_label_fit:...``) are reported in the
+        outcome instead of raising; Ollama errors still abort the whole batch.
+        """
+        follow_active_model(self.db)
+        vector_model = embedding_model_name(self.embedding_client)
+        vectors = embed_texts(self.embedding_client, [item.text for item in items])
+        return self.classify_batch_vectors(items, vectors, vector_model=vector_model)
+
+    def classify_batch_vectors(
+        self, items: list[BatchItem], vectors: list[list[float]], vector_model: str | None = None
+    ) -> list[BatchItemOutcome]:
+        follow_active_model(self.db)
+        model = embedding_model_name(self.embedding_client)
+        if vector_model is not None and vector_model != model:
+            # A model migration switched over while the texts were being embedded.
+            vectors = embed_texts(self.embedding_client, [item.text for item in items])
+
+        forced_ids = {item.label_id for item in items if item.label_id is not None}
+        forced_names = {
+            normalize_label_name(item.label)
+            for item in items
+            if item.label_id is None and item.label is not None and item.label.strip() != ""
+        }
+        by_id = {label.id: label for label in self.labels.get_by_ids(sorted(forced_ids))}
+        by_name = {label.name: label for label in self.labels.get_by_names(sorted(forced_names))}
+
+        index = get_label_index(self.db).sync(self.db)
+        ranked_by_item: dict[int, list[Match]] = {}
+        for mode in {item.mode or settings.classification_mode for item in items}:
+            positions = [i for i, item in enumerate(items) if (item.mode or settings.classification_mode) == mode]
+            # One ranking pass per mode, deep enough for the item asking for the most labels.
+            k = max(_candidate_count(items[i].top_k, items[i].multi_label) for i in positions)
+            ranked_by_item.update(zip(positions, self._ranked_matches([vectors[i] for i in positions], mode, k)))
+
+        outcomes: list[BatchItemOutcome] = []
+        rows: list[dict] = []
+        matched_ids: set[int] = set()
+        for i, (item, vector) in enumerate(zip(items, vectors)):
+            if item.label_id is not None or (item.label is not None and item.label.strip() != ""):
+                if item.label_id is not None:
+                    existing = by_id.get(item.label_id)
+                else:
+                    existing = by_name.get(normalize_label_name(item.label))
+                if not existing:
+                    outcomes.append(BatchItemOutcome(index=i, error="label_not_found"))
+                    continue
+
+                score = index.score_label(vector, existing.id)
+                if score is None:
+                    score = cosine_similarity(vector, existing.centroid)
+                rows.append(
+                    dict(
+                        text=item.text,
+                        label_id=existing.id,
+                        similarity_score=score,
+                        confidence="forced",
+                        embedding=vector,
+                        embedding_model=model,
+                    )
+                )
+                outcomes.append(
+                    BatchItemOutcome(
+                        index=i,
+                        result=ClassificationResult(
+                            assigned_label=existing.name,
+                            similarity_score=round(score, 4),
+                            created_new_label=False,
+                            reason="forced_label_assigned",
+                        ),
+                    )
+                )
+                continue
+
+            ranked = ranked_by_item[i][: _candidate_count(item.top_k, item.multi_label)]
+            best_label_id, best_match_label, best_score, reason = ranked[0] if ranked else _NO_MATCH
+            best_match_score = round(best_score, 4) if best_label_id is not None else None
+            top_labels = _top_labels(ranked, item.top_k)
+
+            fits = _fitting(ranked, item.multi_label)
+            if not fits:
+                NO_LABEL_FIT.inc("batch")
+                outcomes.append(
+                    BatchItemOutcome(
+                        index=i,
+                        error=str(NoLabelFitError(best_match_label, best_match_score)),
+                        top_labels=top_labels,
+                    )
+                )
+                continue
+
+            for match_id, _, score, _ in fits:
+                matched_ids.add(match_id)
+                rows.append(
+                    dict(
+                        text=item.text,
+                        label_id=match_id,
+                        similarity_score=score,
+                        confidence="high",
+                        embedding=vector,
+                        embedding_model=model,
+                    )
+                )
+            outcomes.append(
+                BatchItemOutcome(
+                    index=i,
+                    result=ClassificationResult(
+                        assigned_label=best_match_label,
+                        similarity_score=round(best_score, 4),
+                        created_new_label=False,
+                        reason=reason,
+                        best_match_label=best_match_label,
+                        best_match_score=best_match_score,
+                        top_labels=top_labels,
+                        assigned_labels=[name for _, name, _, _ in fits] if item.multi_label else None,
+                    ),
+                )
+            )
+
+        if not rows:
+            return outcomes
+
+        dual_write(self.db, self.entries.create_many(rows))
+
+        touched = {label.id: label for label in by_id.values()} | {label.id: label for label in by_name.values()}
+        touched |= {label.id: label for label in self.labels.get_by_ids(sorted(matched_ids - touched.keys()))}
+        added: dict[int, list[list[float]]] = defaultdict(list)
+        for row in rows:
+            added[row["label_id"]].append(row["embedding"])
+        for label_id, label_vectors in added.items():
+            self.label_embeddings.add_entries(touched[label_id], label_vectors)
+
+        self.db.commit()
+        return outcomes
+
+    def rescore_copies(
+        self, vectors: list[list[float]], copies: list[list[tuple[int, int | None]]], mode: str | None = None
+    ) -> list[tuple[Match, list[Match | None]]]:
+        """New labels of stored entries, scored like new texts under ``mode``.
+
+        ``copies[i]`` holds the ``(entry id, label id)`` of the stored copies of one text, whose
+        embedding is ``vectors[i]``: one entry, or one per label in multi-label mode. Returns the
+        best match of each text and the new match of each copy, None where it should keep its
+        label. The copies do not vote for themselves in k-NN mode.
+        """
+        multi_label = any(len({label_id for _, label_id in group}) > 1 for group in copies)
+        ranked = self._ranked_matches(
+            vectors, mode, _candidate_count(None, multi_label), exclude=[{entry_id for entry_id, _ in group} for group in copies]
         )
+        return [
+            (matches[0] if matches else _NO_MATCH, _reassign([label_id for _, label_id in group], matches))
+            for group, matches in zip(copies, ranked)
+        ]
 
+    def _best_matches(self, vectors: list[list[float]], mode: str | None = None) -> list[Match]:
+        """Best existing label for each vector under ``mode`` (default ``settings.classification_mode``)."""
+        return [ranked[0] if ranked else _NO_MATCH for ranked in self._ranked_matches(vectors, mode, 1)]
 
+    def _ranked_matches(
+        self, vectors: list[list[float]], mode: str | None = None, k: int = 1, exclude: list[set[int]] | None = None
+    ) -> list[list[Match]]:
+        """Up to ``k`` labels per vector, best first; labels scoring below 0 are left out.
+        ``exclude[i]`` are entries that may not vote for vector ``i`` in k-NN mode."""
+        mode = mode or settings.classification_mode
+        start = time.perf_counter()
+        if mode == "knn":
+            ranked = self._knn_votes(vectors, k, exclude)
+            fallback = [i for i, votes in enumerate(ranked) if not votes]
+            # No labelled neighbours yet (empty corpus / new dimension): use the centroids.
+            for i, matches in zip(fallback, self._centroid_matches([vectors[i] for i in fallback], k)):
+                ranked[i] = matches
+        else:
+            ranked = self._centroid_matches(vectors, k)
+        MATCH_SECONDS.observe(time.perf_counter() - start, mode)
+        return ranked
 
+    def _centroid_matches(self, vectors: list[list[float]], k: int = 1) -> list[list[Match]]:
+        if not vectors:
+            return []
+        if uses_pgvector(self.db.get_bind().dialect):
+            # PostgreSQL: nearest centroids in SQL (pgvector cosine operator and index), all
+            # vectors in one LATERAL-joined statement.
+            return [
+                [(*hit, "matched_existing_label") for hit in hits if hit[2] >= 0]
+                for hits in self.labels.nearest_by_centroid(vectors, k)
+            ]
+        index = get_label_index(self.db).sync(self.db)
+        # Partial selection (argpartition) over each row of scores; only the k kept are sorted.
+        best_ids, best_scores = index.search(np.asarray(vectors, dtype=np.float32), k, db=self.db)
+        return [
+            [
+                (label_id, index.names[index.position(label_id)], score, "matched_existing_label")
+                for label_id, score in zip(row_ids, row_scores)
+                if label_id >= 0 and score >= 0
+            ]
+            for row_ids, row_scores in zip(best_ids.tolist(), best_scores.tolist())
+        ]
 
+    def _knn_votes(self, vectors: list[list[float]], k: int = 1, exclude: list[set[int]] | None = None) -> list[list[Match]]:
+        """Similarity-weighted vote of the ``knn_k`` most similar stored entries; the ``k``
+        labels with the most weight, best first.
+
+        A label's score is its vote weight divided by the number of voting neighbours: the mean
+        similarity of its voters times its share of the vote. Labels are ranked and thresholded on
+        that same score, which equals the mean similarity when the vote is unanimous. Labels are
+        read fresh from the database. On PostgreSQL the
+        neighbours come from a pgvector query instead of the in-process entry index. The entries in
+        ``exclude[i]`` are skipped, and replaced by the next neighbours, for vector ``i``.
+        """
+        exclude = exclude or [set() for _ in vectors]
+        # Fetch enough neighbours that knn_k remain once the excluded ones are dropped.
+        n = settings.knn_k + max(map(len, exclude), default=0)
+        if uses_pgvector(self.db.get_bind().dialect):
+            neighbours = [
+                [((label_id, name), score) for entry_id, label_id, name, score in hits if entry_id not in skip][: settings.knn_k]
+                for hits, skip in zip(self.entries.nearest_labelled(vectors, n), exclude)
+            ]
+        else:
+            hit_ids, hit_scores = get_entry_index(self.db).sync(self.db).search(
+                np.asarray(vectors, dtype=np.float32), n, db=self.db
+            )
+            labels = self.entries.labels_for_entries(sorted(set(hit_ids[hit_ids >= 0].tolist())))
+            neighbours = [
+                [
+                    (labels[entry_id], score)
+                    for entry_id, score in zip(row_ids, row_scores)
+                    if entry_id in labels and entry_id not in skip
+                ][: settings.knn_k]
+                for row_ids, row_scores, skip in zip(hit_ids.tolist(), hit_scores.tolist(), exclude)
+            ]
 
+        votes: list[list[Match]] = []
+        for row in neighbours:
+            weights: dict[tuple[int, str], float] = defaultdict(float)
+            voters = 0
+            for label, score in row:
+                if score <= 0:
+                    continue
+                weights[label] += score
+                voters += 1
+            # At most knn_k voted labels, so a heap is cheap; ties keep neighbour order.
+            winners = heapq.nlargest(k, weights, key=weights.__getitem__)
+            votes.append([(label[0], label[1], weights[label] / voters, "matched_by_entry_vote") for label in winners])
+        return votes
@@ -0,0 +1,219 @@
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
+from app.core.metrics import EMBEDDING_CACHE_LOOKUPS
+from app.services.embedding_service import AsyncEmbeddingClient, EmbeddingClient, embed_texts
+
+
+def text_key(text: str) -> bytes:
+    """Content hash of ``text`` after Unicode/whitespace normalization."""
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
+
+
+class SqliteEmbeddingStore:
+    """Persistent cache tier: one SQLite file of float32 vectors keyed by (model, text hash).
+
+    Rows written for any other model are dropped on open, so changing the embedding model
+    invalidates the tier cleanly. ``model=None`` follows the active model.
+    """
+
+    def __init__(self, path: str, model: str | None = None):
+        self._model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                " model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.execute("DELETE FROM embedding_cache WHERE model != ?", (self.model,))
+
+    @property
+    def model(self) -> str:
+        return self._model or active_embedding_model()
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        found: dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (self.model, *chunk),
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype="<f4")) for key, blob in rows)
+        return found
+
+    def put_many(self, items: dict[bytes, np.ndarray]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(self.model, key, vector.astype("<f4").tobytes()) for key, vector in items.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """Bounded in-memory LRU of float32 vectors in front of an optional persistent tier.
+
+    Keys are ``text_key(text)`` under one ``model`` (None: the active model). Shared by the sync
+    and async caching clients so both request paths see the same entries and counters.
+    """
+
+    def __init__(self, model: str | None, max_entries: int, store: SqliteEmbeddingStore | None = None):
+        self._model = model
+        self.max_entries = max_entries
+        self.store = store
+        self._lru: OrderedDict[tuple[str, bytes], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def model(self) -> str:
+        return self._model or active_embedding_model()
+
+    def lookup(self, keys: list[bytes]) -> tuple[dict[bytes, np.ndarray], list[bytes]]:
+        """Return cached vectors and the distinct keys that still need embedding."""
+        found: dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get((self.model, key))
+                if vector is not None:
+                    self._lru.move_to_end((self.model, key))
+                    found[key] = vector
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        disk_hits = 0
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            disk_hits = len(stored)
+            with self._lock:
+                self.disk_hits += disk_hits
+            found.update(stored)
+            self._remember(stored)
+            missing = [key for key in missing if key not in stored]
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        if len(keys) - len(missing) - disk_hits:
+            EMBEDDING_CACHE_LOOKUPS.inc("hit", amount=len(keys) - len(missing) - disk_hits)
+        if disk_hits:
+            EMBEDDING_CACHE_LOOKUPS.inc("disk_hit", amount=disk_hits)
+        if missing:
+            EMBEDDING_CACHE_LOOKUPS.inc("miss", amount=len(missing))
+        return found, missing
+
+    def add(self, vectors: dict[bytes, np.ndarray]) -> None:
+        self._remember(vectors)
+        if self.store is not None:
+            self.store.put_many(vectors)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._lru),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def _remember(self, vectors: dict[bytes, np.ndarray]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                self._lru[(self.model, key)] = vector
+                self._lru.move_to_end((self.model, key))
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+
+def _first_text_per_key(keys: list[bytes], texts: list[str], missing: list[bytes]) -> list[str]:
+    texts_by_key: dict[bytes, str] = {}
+    for key, text in zip(keys, texts):
+        texts_by_key.setdefault(key, text)
+    return [texts_by_key[key] for key in missing]
+
+
+class CachingEmbeddingClient:
+    """EmbeddingClient wrapper that serves repeated texts from an ``EmbeddingCache``."""
+
+    def __init__(
+        self,
+        inner: EmbeddingClient,
+        model: str | None,
+        max_entries: int,
+        store: SqliteEmbeddingStore | None = None,
+    ):
+        self.inner = inner
+        self.cache = EmbeddingCache(model=model, max_entries=max_entries, store=store)
+        self.provider_name = getattr(inner, "provider_name", "unknown")
+
+    @property
+    def model(self) -> str:
+        return self.cache.model
+
+    def get_embedding(self, text: str) -> list[float]:
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_key(text) for text in texts]
+        found, missing = self.cache.lookup(keys)
+        if missing:
+            vectors = embed_texts(self.inner, _first_text_per_key(keys, texts, missing))
+            fetched = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            found.update(fetched)
+            self.cache.add(fetched)
+        return [found[key].tolist() for key in keys]
+
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
+
+
+class AsyncCachingEmbeddingClient:
+    """AsyncEmbeddingClient wrapper sharing an ``EmbeddingCache`` with the sync path."""
+
+    def __init__(self, inner: AsyncEmbeddingClient, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+        self.provider_name = getattr(inner, "provider_name", "unknown")
+
+    @property
+    def model(self) -> str:
+        return self.cache.model
+
+    async def get_embedding(self, text: str) -> list[float]:
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_key(text) for text in texts]
+        found, missing = self.cache.lookup(keys)
+        if missing:
+            vectors = await self.inner.get_embeddings(_first_text_per_key(keys, texts, missing))
+            fetched = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            found.update(fetched)
+            self.cache.add(fetched)
+        return [found[key].tolist() for key in keys]
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,68 @@
+import asyncio
+
+from app.services.embedding_service import AsyncEmbeddingClient
+
+
+class CoalescingEmbeddingClient:
+    """AsyncEmbeddingClient that merges concurrent requests into batched embed calls.
+
+    Texts are queued until ``window_ms`` has passed since the first queued text or ``max_batch``
+    texts are waiting, then sent as one ``inner.get_embeddings`` call whose results are fanned
+    back out to the waiting callers. Must be used from a single event loop.
+    """
+
+    def __init__(self, inner: AsyncEmbeddingClient, window_ms: float, max_batch: int):
+        self.inner = inner
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.provider_name = getattr(inner, "provider_name", "unknown")
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        self.batches_sent = 0
+
+    async def get_embedding(self, text: str) -> list[float]:
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    async def aclose(self) -> None:
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await self.inner.aclose()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        self.batches_sent += 1
+        try:
+            vectors = await self.inner.get_embeddings([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
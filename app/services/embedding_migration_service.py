@@ -0,0 +1,468 @@
+"""Embedding model migrations: move every stored vector to a new model without downtime.
+
+While a migration runs, the app keeps classifying with the source model and the job fills
+``next_embedding_vec`` with the target model's vector of every entry, in throttled keyset chunks
+that are committed with the job cursor. Entries written meanwhile are embedded with both models
+(see ``dual_write``); one whose target vector is missing anyway (re-embedded behind the cursor,
+see ``TextEntry.set_embedding``, or the target model failed) is picked up at the cutover.
+
+The cutover first embeds the few entries still missing a target vector (throttled, like the
+chunks), the label definitions, and sums the target vectors per label. Then one short
+transaction marks the job completed and sets the label centroids from those sums; no entry row
+is written and nothing is embedded while it holds the lock. From then on readers take an
+entry's embedding from ``next_embedding_vec`` (see ``TextEntry.embedding_for``), and the job
+moves those vectors into ``embedding_vec`` in small committed chunks. Other processes follow
+the completed job's target model within ``_MODEL_CHECK_SECONDS`` (see ``follow_active_model``);
+entries they wrote with the source model in that window are re-embedded by a final sweep.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model, set_active_embedding_model
+from app.core.label_utils import definition_hash
+from app.models.embedding_migration_job import EmbeddingMigrationJob
+from app.models.label import Label
+from app.models.text_entry import TextEntry
+from app.repositories.centroid_delta_repository import CentroidDeltaRepository
+from app.repositories.embedding_migration_repository import ACTIVE_STATUSES, EmbeddingMigrationRepository
+from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.services.embedding_service import EmbeddingClient, embed_texts, embedding_model_name
+from app.services.embedding_store import get_embedding_store
+from app.services.entry_index import drop_entry_index
+from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.service_factory import build_model_client
+
+logger = logging.getLogger(__name__)
+
+ClientFactory = Callable[[str], EmbeddingClient]
+
+_MODEL_CHECK_SECONDS = 1.0
+_model_checked_at = 0.0
+_migration_checked_at = 0.0
+_migration_target: str | None = None
+
+# Clients for the target of the running migration, shared by the write paths of this process.
+_target_clients: dict[str, EmbeddingClient] = {}
+_target_clients_lock = threading.Lock()
+
+_workers: dict[int, threading.Thread] = {}
+_workers_lock = threading.Lock()
+
+
+def _throttle(embedded: int, max_texts_per_second: float, started: float) -> None:
+    if max_texts_per_second > 0:
+        time.sleep(max(embedded / max_texts_per_second - (time.perf_counter() - started), 0.0))
+
+
+def _label_state(label: Label) -> tuple:
+    """What changes when entries are added to or removed from ``label``, or it is redefined."""
+    entries_sum = label.entries_sum
+    return (
+        label.usage_count,
+        None if entries_sum is None else np.asarray(entries_sum, dtype=np.float64).tobytes(),
+        label.definition_hash,
+    )
+
+
+def follow_active_model(db: Session, max_age_seconds: float = _MODEL_CHECK_SECONDS) -> str:
+    """Switch this process to the target model of the last completed migration if it is not
+    using it yet; the database is checked at most every ``max_age_seconds``. Returns the active
+    model. Only called on the write paths that embed, never from read-only routes."""
+    global _model_checked_at
+    now = time.monotonic()
+    if now - _model_checked_at < max_age_seconds:
+        return active_embedding_model()
+    _model_checked_at = now
+    model = EmbeddingMigrationRepository(db).current_model()
+    if model is not None and model != active_embedding_model():
+        logger.warning(
+            "Switching the embedding model from %r to %r (the target of the last completed migration)",
+            active_embedding_model(),
+            model,
+        )
+        set_active_embedding_model(model)
+        drop_entry_index(db.get_bind())
+    return active_embedding_model()
+
+
+def migration_target(db: Session, max_age_seconds: float = _MODEL_CHECK_SECONDS) -> str | None:
+    """Target model of the active migration (None if there is none); the database is checked at
+    most every ``max_age_seconds``."""
+    global _migration_checked_at, _migration_target
+    now = time.monotonic()
+    if now - _migration_checked_at >= max_age_seconds:
+        job = EmbeddingMigrationRepository(db).get_active()
+        _migration_target = None if job is None else job.target_model
+        _migration_checked_at = now
+    return _migration_target
+
+
+def dual_write(db: Session, entries: list[TextEntry]) -> None:
+    """While a migration is active, also embed ``entries`` (just written with the active model)
+    with its target model, so the migration does not have to come back for them."""
+    texts = list(dict.fromkeys(entry.text for entry in entries))  # multi-label entries share a text
+    embedded = embed_for_migration(db, texts)
+    if embedded is None:
+        return
+    model, vectors = embedded
+    by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(texts, vectors)}
+    for entry in entries:
+        entry.next_embedding_vec = by_text[entry.text]
+        entry.next_embedding_model = model
+
+
+def embed_for_migration(db: Session, texts: list[str]) -> tuple[str, list[list[float]]] | None:
+    """``(target model, vectors)`` of ``texts`` while a migration is active, else None. A failure
+    of the target model is logged, not raised: the cutover embeds whatever is still missing."""
+    if not texts:
+        return None
+    target = migration_target(db)
+    if target is None or target == active_embedding_model():
+        return None
+    try:
+        with _target_clients_lock:
+            client = _target_clients.get(target)
+            if client is None:
+                client = _target_clients[target] = build_model_client(target)
+        return embedding_model_name(client), embed_texts(client, texts)
+    except Exception:
+        logger.warning("Could not embed %d texts with migration target %r", len(texts), target, exc_info=True)
+        return None
+
+
+def start_embedding_migration(
+    db: Session,
+    target_model: str,
+    chunk_size: int | None = None,
+    max_texts_per_second: float | None = None,
+) -> EmbeddingMigrationJob:
+    """Queue a migration to ``target_model``; only one may be active at a time."""
+    source_model = follow_active_model(db, 0)
+    jobs = EmbeddingMigrationRepository(db)
+    if jobs.get_active() is not None:
+        raise ValueError("migration_running")
+    if target_model == source_model:
+        raise ValueError("model_already_active")
+    job = jobs.create(
+        source_model=source_model,
+        target_model=target_model,
+        chunk_size=chunk_size or settings.embedding_migration_chunk_size,
+        max_texts_per_second=(
+            settings.embedding_migration_max_texts_per_second if max_texts_per_second is None else max_texts_per_second
+        ),
+        total_count=TextEntryRepository(db).count(),
+    )
+    db.commit()
+    return job
+
+
+def cancel_embedding_migration(db: Session, job_id: int) -> EmbeddingMigrationJob:
+    """Ask the worker to stop after its current chunk. Vectors embedded so far are kept, so a new
+    migration to the same model skips them. Finished jobs are returned unchanged."""
+    job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+    if job is None:
+        raise ValueError("job_not_found")
+    if job.status in ACTIVE_STATUSES:
+        job.cancel_requested = True
+        db.commit()
+    return job
+
+
+def launch_migration_worker(bind: Engine, job_id: int, client_for_model: ClientFactory = build_model_client) -> None:
+    """Run ``job_id`` on a daemon thread unless this process is already running it."""
+    with _workers_lock:
+        worker = _workers.get(job_id)
+        if worker is not None and worker.is_alive():
+            return
+        runner = EmbeddingMigrationRunner(sessionmaker(bind=bind, autocommit=False, autoflush=False), client_for_model)
+        worker = threading.Thread(target=runner.run, args=(job_id,), name=f"embedding-migration-{job_id}", daemon=True)
+        _workers[job_id] = worker
+        worker.start()
+
+
+def resume_embedding_migrations(bind: Engine, client_for_model: ClientFactory = build_model_client) -> list[int]:
+    """Restart workers for migrations left active by a previous process."""
+    with Session(bind) as db:
+        job_ids = EmbeddingMigrationRepository(db).list_active_ids()
+    for job_id in job_ids:
+        launch_migration_worker(bind, job_id, client_for_model)
+    return job_ids
+
+
+class EmbeddingMigrationRunner:
+    """Re-embeds every entry with the job's target model, then switches the app over to it."""
+
+    # How long after the cutover the sweep waits for other processes to follow the new model.
+    sweep_delay_seconds = 2 * _MODEL_CHECK_SECONDS
+
+    def __init__(self, session_factory: sessionmaker, client_for_model: ClientFactory):
+        self.session_factory = session_factory
+        # Called once per model and run; the runner closes the clients it gets when the run ends.
+        self.client_for_model = client_for_model
+        self.owner = uuid.uuid4().hex
+        self._clients: dict[str, EmbeddingClient] = {}
+
+    def run(self, job_id: int) -> None:
+        try:
+            self._run(job_id)
+        finally:
+            self._close_clients()
+
+    def _run(self, job_id: int) -> None:
+        if not self._claim(job_id):
+            return
+        try:
+            with self.session_factory() as db:
+                job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+                # Vectors a previous migration left to move (it stopped after its cutover) would be
+                # overwritten by this one's.
+                self._promote(db, job.source_model, job.chunk_size)
+            while True:
+                with self.session_factory() as db:
+                    job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+                    if job is None or job.owner != self.owner:
+                        return
+                    if job.cancel_requested:
+                        self._update_job(db, job.id, status="cancelled", finished_at=datetime.utcnow())
+                        db.commit()
+                        return
+                    max_texts_per_second = job.max_texts_per_second
+                    start = time.perf_counter()
+                    embedded = self._run_chunk(db, job)
+                    if embedded is None:
+                        return
+                    if embedded == 0 and job.last_entry_id >= TextEntryRepository(db).max_id():
+                        changed = self._cutover(db, job)
+                        if changed is not None:
+                            try:
+                                self._sweep(db, job, changed)
+                            except Exception:
+                                # The migration itself completed; stale entries are repaired on rebuild.
+                                logger.exception("Post-cutover sweep of embedding migration %s failed", job_id)
+                        return
+                _throttle(embedded, max_texts_per_second, start)
+        except Exception as e:
+            logger.exception("Embedding migration %s failed", job_id)
+            with self.session_factory() as db:
+                self._update_job(db, job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                db.commit()
+
+    def _claim(self, job_id: int) -> bool:
+        with self.session_factory() as db:
+            claimed = db.execute(
+                update(EmbeddingMigrationJob)
+                .where(EmbeddingMigrationJob.id == job_id, EmbeddingMigrationJob.status.in_(ACTIVE_STATUSES))
+                .values(status="running", owner=self.owner, updated_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+        return claimed == 1
+
+    def _run_chunk(self, db: Session, job: EmbeddingMigrationJob) -> int | None:
+        """Embed and commit the next chunk; returns how many texts were embedded, or None if the
+        job was taken over."""
+        entries = TextEntryRepository(db).list_after(job.last_entry_id, job.chunk_size)
+        if not entries:
+            return 0
+        todo = [entry for entry in entries if entry.next_embedding_model != job.target_model]
+        self._embed(todo, job.target_model)
+        db.flush()
+        if not self._update_job(
+            db, job.id, last_entry_id=entries[-1].id, embedded_count=job.embedded_count + len(todo)
+        ):
+            db.rollback()
+            return None
+        db.commit()
+        return len(todo)
+
+    def _cutover(self, db: Session, job: EmbeddingMigrationJob) -> set[int] | None:
+        """Switch to the target model; returns the labels the sweep must rebuild, or None if the
+        job was taken over.
+
+        Everything slow happens before the switching transaction: the entries still missing a
+        target vector are embedded in throttled chunks, the label definitions are embedded and the
+        target vectors are summed per label. The transaction only completes the job and sets the
+        centroids from those sums; entries keep their target vectors in ``next_embedding_vec``,
+        where readers look once the target model is active, until the sweep moves them. Labels
+        that changed in between get the sums too, which may miss the change, and are rebuilt from
+        their entries by the sweep.
+        """
+        target_model, source_model = job.target_model, active_embedding_model()
+        client = self._client(target_model)
+        if self._embed_stragglers(db, job) is None:
+            return None
+        labels = LabelRepository(db).list_labels()
+        states = {label.id: _label_state(label) for label in labels}
+        hashes = {label.id: definition_hash(label.definition) for label in labels}
+        definitions = dict(zip((label.id for label in labels), embed_texts(client, [label.definition for label in labels])))
+        sums: dict[int, np.ndarray] = {}
+        counts: dict[int, int] = defaultdict(int)
+        for label_id, vector in TextEntryRepository(db).iter_next_label_embeddings(target_model):
+            counts[label_id] += 1
+            if label_id not in sums:
+                sums[label_id] = np.zeros(len(vector), dtype=np.float64)
+            sums[label_id] += vector
+        db.rollback()
+
+        # Written first, so on SQLite the transaction holds the write lock from here on.
+        if not self._update_job(db, job.id, status="switching"):
+            db.rollback()
+            return None
+        try:
+            label_embeddings = LabelEmbeddingService(db, client, deferred=False)
+            labels = LabelRepository(db).list_labels()
+            deltas = CentroidDeltaRepository(db)
+            # Pending deltas hold source-model sums; labels that have any changed after the scan or
+            # were not applied yet, and are rebuilt by the sweep either way.
+            changed = deltas.label_ids()
+            deltas.discard_for_labels([label.id for label in labels])
+            for label in labels:
+                if states.get(label.id) != _label_state(label):
+                    changed.add(label.id)
+                if label.id not in definitions or hashes[label.id] != definition_hash(label.definition):
+                    changed.add(label.id)  # new or redefined since: its definition is not embedded
+                    continue
+                label_embeddings.use_definition_embedding(label, definitions[label.id])
+                label_embeddings.use_entries_sum(label, sums.get(label.id), counts[label.id])
+            if not self._update_job(db, job.id, status="completed", finished_at=datetime.utcnow()):
+                raise RuntimeError("migration was taken over during its cutover")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        set_active_embedding_model(target_model)
+        bind = db.get_bind()
+        store = get_embedding_store(bind)
+        if store is not None:
+            store.rebuild(db)
+        drop_entry_index(bind)
+        logger.info("Switched the embedding model from %r to %r", source_model, target_model)
+        return changed
+
+    def _embed_stragglers(self, db: Session, job: EmbeddingMigrationJob) -> int | None:
+        """Embed, in throttled chunks, the entries still missing a target vector (re-embedded
+        behind the cursor or written since); returns how many, or None if the job was taken over."""
+        target_model, chunk_size, max_texts_per_second = job.target_model, job.chunk_size, job.max_texts_per_second
+        embedded_count = job.embedded_count
+        stragglers = 0
+        while True:
+            start = time.perf_counter()
+            pending = (
+                db.execute(
+                    select(TextEntry)
+                    .where(or_(TextEntry.next_embedding_model.is_(None), TextEntry.next_embedding_model != target_model))
+                    .order_by(TextEntry.id)
+                    .limit(chunk_size)
+                )
+                .scalars()
+                .all()
+            )
+            if not pending:
+                return stragglers
+            self._embed(pending, target_model)
+            db.flush()
+            stragglers += len(pending)
+            if not self._update_job(db, job.id, embedded_count=embedded_count + stragglers):
+                db.rollback()
+                return None
+            db.commit()
+            _throttle(len(pending), max_texts_per_second, start)
+
+    def _sweep(self, db: Session, job: EmbeddingMigrationJob, label_ids: set[int]) -> None:
+        """Move the target vectors into ``embedding_vec``, re-embed entries written with the source
+        model by processes that had not switched yet, then rebuild their labels and ``label_ids``."""
+        time.sleep(self.sweep_delay_seconds)
+        self._promote(db, job.target_model, job.chunk_size)
+        client = self._client(job.target_model)
+        label_ids = set(label_ids)
+        while True:
+            stale = (
+                db.execute(
+                    select(TextEntry)
+                    .where(TextEntry.embedding_model == job.source_model)
+                    .order_by(TextEntry.id)
+                    .limit(job.chunk_size)
+                )
+                .scalars()
+                .all()
+            )
+            if not stale:
+                break
+            for entry, vector in zip(stale, embed_texts(client, [entry.text for entry in stale])):
+                entry.set_embedding(vector, embedding_model_name(client))
+                if entry.label_id is not None:
+                    label_ids.add(entry.label_id)
+            db.commit()
+        if label_ids:
+            LabelEmbeddingService(db, client, deferred=False).rebuild_from_stored(
+                LabelRepository(db).get_by_ids(sorted(label_ids))
+            )
+            db.commit()
+            logger.info("Rebuilt %d labels after the cutover", len(label_ids))
+
+    def _promote(self, db: Session, model: str, chunk_size: int) -> int:
+        """Move ``model``'s vectors from ``next_embedding_vec`` into ``embedding_vec``, one committed
+        chunk at a time; returns how many. Once ``model`` is active readers already take them from
+        ``next_embedding_vec``, so what they see does not change."""
+        moved = 0
+        while True:
+            entry_ids = db.scalars(
+                select(TextEntry.id).where(TextEntry.next_embedding_model == model).order_by(TextEntry.id).limit(chunk_size)
+            ).all()
+            if not entry_ids:
+                return moved
+            db.execute(
+                update(TextEntry)
+                .where(TextEntry.id.in_(entry_ids), TextEntry.next_embedding_model == model)
+                .values(
+                    embedding_vec=TextEntry.next_embedding_vec,
+                    embedding_json=None,
+                    embedding_model=TextEntry.next_embedding_model,
+                    next_embedding_vec=None,
+                    next_embedding_model=None,
+                ),
+                execution_options={"synchronize_session": False},
+            )
+            db.commit()
+            moved += len(entry_ids)
+
+    def _embed(self, entries: list[TextEntry], model: str) -> None:
+        vectors = embed_texts(self._client(model), [entry.text for entry in entries])
+        for entry, vector in zip(entries, vectors):
+            entry.next_embedding_vec = np.asarray(vector, dtype=np.float32)
+            entry.next_embedding_model = model
+
+    def _client(self, model: str) -> EmbeddingClient:
+        """The run's client for ``model``, so every chunk reuses its connection pool."""
+        client = self._clients.get(model)
+        if client is None:
+            client = self._clients[model] = self.client_for_model(model)
+        return client
+
+    def _close_clients(self) -> None:
+        for client in self._clients.values():
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
+        self._clients.clear()
+
+    def _update_job(self, db: Session, job_id: int, **values) -> bool:
+        """Write job progress only while this runner still owns the job."""
+        updated = db.execute(
+            update(EmbeddingMigrationJob)
+            .where(EmbeddingMigrationJob.id == job_id, EmbeddingMigrationJob.owner == self.owner)
+            .values(updated_at=datetime.utcnow(), **values)
+        ).rowcount
+        return updated == 1
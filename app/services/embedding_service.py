@@ -1,82 +1,368 @@
+import functools
+import inspect
+import http.client
 import json
-import math
+import queue
+import threading
+import time
 import urllib.error
-import urllib.request
+import urllib.parse
 from typing import Protocol
 
+import httpx
+import numpy as np
+
 from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
 from app.core.errors import OllamaBadResponseError, OllamaUnavailableError
+from app.core.metrics import OLLAMA_ERRORS, OLLAMA_REQUEST_SECONDS
+
+
+def _count_errors(method):
+    """Count Ollama errors leaving ``method`` (once, however many counted methods they pass)."""
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await method(*args, **kwargs)
+            except (OllamaUnavailableError, OllamaBadResponseError) as e:
+                _count_error(e)
+                raise
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except (OllamaUnavailableError, OllamaBadResponseError) as e:
+            _count_error(e)
+            raise
+
+    return wrapper
+
+
+def _count_error(error: Exception) -> None:
+    if not getattr(error, "_counted", False):
+        error._counted = True
+        OLLAMA_ERRORS.inc(type(error).__name__)
 
 
 class EmbeddingClient(Protocol):
     def get_embedding(self, text: str) -> list[float]: ...
 
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]: ...
+
+
+class AsyncEmbeddingClient(Protocol):
+    async def get_embedding(self, text: str) -> list[float]: ...
+
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]: ...
+
+    async def aclose(self) -> None: ...
+
+
+class HTTPConnectionPool:
+    """Keep-alive ``http.client`` connections to one host, at most ``max_size`` open at once."""
+
+    def __init__(self, base_url: str, timeout_seconds: float, max_size: int):
+        parts = urllib.parse.urlsplit(base_url)
+        self._connection_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._base_path = parts.path.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def post(self, path: str, body: bytes, headers: dict[str, str]) -> tuple[int, str, bytes]:
+        if not self._slots.acquire(timeout=self.timeout_seconds):
+            raise OllamaUnavailableError(f"Timed out waiting for a free Ollama connection to {self._netloc}")
+        try:
+            try:
+                idle = self._idle.get_nowait()
+            except queue.Empty:
+                return self._send(self._connect(), path, body, headers)
+            try:
+                return self._send(idle, path, body, headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed the idle keep-alive connection; retry once on a fresh one.
+                return self._send(self._connect(), path, body, headers)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return self._connection_cls(self._netloc, timeout=self.timeout_seconds)
+
+    def _send(self, conn: http.client.HTTPConnection, path: str, body: bytes, headers: dict[str, str]) -> tuple[int, str, bytes]:
+        try:
+            conn.request("POST", self._base_path + path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        return resp.status, resp.reason, data
+
 
 class OllamaEmbeddingClient:
     """Embedding client that calls a local Ollama server.
 
-    Requires Ollama running locally (default: http://localhost:11434).
+    Requires Ollama running locally (default: http://localhost:11434). Connections are pooled and
+    kept alive; build one client per process (see ``service_factory.build_embedding_client``).
     """
     provider_name = "ollama"
 
+    EMBED_ENDPOINT = "/api/embed"
+    LEGACY_ENDPOINT = "/api/embeddings"
+
     def __init__(
         self,
         host: str | None = None,
         model: str | None = None,
         timeout_seconds: float | None = None,
+        batch_size: int | None = None,
+        pool_size: int | None = None,
     ):
         self.host = (host or settings.ollama_host).rstrip("/")
-        self.model = model or settings.ollama_embedding_model
+        # None follows the active model (app.core.embedding_model), which a model migration
+        # switches at its cutover.
+        self._model = model
         self.timeout_seconds = timeout_seconds or settings.ollama_timeout_seconds
+        self.batch_size = batch_size or settings.ollama_embed_batch_size
+        self.pool = HTTPConnectionPool(self.host, self.timeout_seconds, pool_size or settings.ollama_pool_size)
+        # None until discovered: /api/embed (batch-capable) or the legacy single-text /api/embeddings.
+        self.endpoint: str | None = None
+
+    @property
+    def model(self) -> str:
+        return self._model or active_embedding_model()
 
+    @property
+    def supports_batch(self) -> bool:
+        return self.endpoint != self.LEGACY_ENDPOINT
+
+    @_count_errors
+    def discover_endpoint(self) -> str:
+        """Probe once which embedding endpoint the server offers and remember it."""
+        if self.endpoint is None:
+            self._embed_batch(["ping"])
+        return self.endpoint or self.LEGACY_ENDPOINT
+
+    @_count_errors
     def get_embedding(self, text: str) -> list[float]:
-        payload = {"model": self.model, "prompt": text}
+        if self.supports_batch:
+            batch = self._embed_batch([text])
+            if batch is not None:
+                return batch[0]
+
         try:
-            data = self._post_json("/api/embeddings", payload)
+            data = self._post_json(self.LEGACY_ENDPOINT, {"model": self.model, "prompt": text})
         except urllib.error.HTTPError as e:
-            if e.code == 404:
+            raise OllamaUnavailableError(f"Ollama HTTP {e.code} at {self.host}{self.LEGACY_ENDPOINT}") from e
+
+        return _parse_single_payload(data)
+
+    @_count_errors
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """Embed ``texts`` via ``/api/embed`` array input, ``batch_size`` texts per request.
+
+        Falls back to one ``get_embedding`` call per text when the server has no ``/api/embed``
+        or returns a batch payload that does not line up with the input.
+        """
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            chunk = texts[start : start + self.batch_size]
+            batch = None
+            if self.supports_batch:
                 try:
-                    data = self._post_json("/api/embed", {"model": self.model, "input": text})
-                except urllib.error.HTTPError as e2:
-                    raise OllamaUnavailableError(
-                        f"Ollama endpoint not found: tried /api/embeddings and /api/embed on {self.host} (last HTTP {e2.code})"
-                    ) from e2
-            else:
-                raise OllamaUnavailableError(f"Ollama HTTP {e.code} at {self.host}/api/embeddings") from e
-
-        embedding = data.get("embedding")
-        if embedding is None and "embeddings" in data:
-            embeddings = data.get("embeddings")
-            if isinstance(embeddings, list) and embeddings and isinstance(embeddings[0], list):
-                embedding = embeddings[0]
-
-        if not isinstance(embedding, list) or not embedding:
-            raise OllamaBadResponseError(
-                f"Ollama returned unexpected embedding payload keys={list(data.keys())}"
-            )
-        return [float(x) for x in embedding]
+                    batch = self._embed_batch(chunk)
+                except OllamaBadResponseError:
+                    if len(chunk) == 1:
+                        raise
+            vectors.extend(batch if batch is not None else [self.get_embedding(text) for text in chunk])
+        return vectors
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]] | None:
+        """Returns None when the server has no ``/api/embed`` (the endpoint is then remembered)."""
+        try:
+            data = self._post_json(self.EMBED_ENDPOINT, {"model": self.model, "input": texts})
+        except urllib.error.HTTPError as e:
+            if e.code == 404 and self.endpoint is None:
+                self.endpoint = self.LEGACY_ENDPOINT
+                return None
+            raise OllamaUnavailableError(f"Ollama HTTP {e.code} at {self.host}{self.EMBED_ENDPOINT}") from e
+        self.endpoint = self.EMBED_ENDPOINT
+        return _parse_batch_payload(data, len(texts))
 
     def _post_json(self, path: str, payload: dict) -> dict:
-        url = f"{self.host}{path}"
         body = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        start = time.perf_counter()
         try:
-            with urllib.request.urlopen(req, timeout=self.timeout_seconds) as resp:
-                raw = resp.read().decode("utf-8")
-            return json.loads(raw)
-        except urllib.error.HTTPError:
-            # Let caller handle HTTP status codes (e.g. 404 fallback from /api/embeddings -> /api/embed)
-            raise
-        except urllib.error.URLError as e:
+            status, reason, raw = self.pool.post(path, body, {"Content-Type": "application/json"})
+        except (OSError, http.client.HTTPException) as e:
             raise OllamaUnavailableError(f"Ollama unreachable at {self.host}: {e}") from e
+        finally:
+            OLLAMA_REQUEST_SECONDS.observe(time.perf_counter() - start, path, self.model)
+        if status >= 400:
+            # Let caller handle HTTP status codes (e.g. 404 when /api/embed is missing)
+            raise urllib.error.HTTPError(f"{self.host}{path}", status, reason, None, None)  # type: ignore[arg-type]
+        try:
+            return json.loads(raw.decode("utf-8"))
+        except ValueError as e:
+            raise OllamaBadResponseError(f"Ollama returned invalid JSON from {path}") from e
+
+
+class AsyncOllamaEmbeddingClient:
+    """Non-blocking Ollama client for async routes, backed by a pooled ``httpx.AsyncClient``.
+
+    Mirrors ``OllamaEmbeddingClient``: same endpoint discovery, batching and error mapping.
+    """
+    provider_name = "ollama"
+
+    def __init__(
+        self,
+        host: str | None = None,
+        model: str | None = None,
+        timeout_seconds: float | None = None,
+        batch_size: int | None = None,
+        pool_size: int | None = None,
+        endpoint: str | None = None,
+    ):
+        self.host = (host or settings.ollama_host).rstrip("/")
+        self._model = model
+        self.timeout_seconds = timeout_seconds or settings.ollama_timeout_seconds
+        self.batch_size = batch_size or settings.ollama_embed_batch_size
+        pool_size = pool_size or settings.ollama_pool_size
+        self.endpoint = endpoint
+        self._http = httpx.AsyncClient(
+            base_url=self.host,
+            timeout=self.timeout_seconds,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    @property
+    def model(self) -> str:
+        return self._model or active_embedding_model()
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.endpoint != OllamaEmbeddingClient.LEGACY_ENDPOINT
+
+    @_count_errors
+    async def get_embedding(self, text: str) -> list[float]:
+        if self.supports_batch:
+            batch = await self._embed_batch([text])
+            if batch is not None:
+                return batch[0]
+
+        status, data = await self._post_json(OllamaEmbeddingClient.LEGACY_ENDPOINT, {"model": self.model, "prompt": text})
+        if status >= 400:
+            raise OllamaUnavailableError(f"Ollama HTTP {status} at {self.host}{OllamaEmbeddingClient.LEGACY_ENDPOINT}")
+        return _parse_single_payload(data)
+
+    @_count_errors
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            chunk = texts[start : start + self.batch_size]
+            batch = None
+            if self.supports_batch:
+                try:
+                    batch = await self._embed_batch(chunk)
+                except OllamaBadResponseError:
+                    if len(chunk) == 1:
+                        raise
+            if batch is None:
+                batch = [await self.get_embedding(text) for text in chunk]
+            vectors.extend(batch)
+        return vectors
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]] | None:
+        status, data = await self._post_json(OllamaEmbeddingClient.EMBED_ENDPOINT, {"model": self.model, "input": texts})
+        if status == 404 and self.endpoint is None:
+            self.endpoint = OllamaEmbeddingClient.LEGACY_ENDPOINT
+            return None
+        if status >= 400:
+            raise OllamaUnavailableError(f"Ollama HTTP {status} at {self.host}{OllamaEmbeddingClient.EMBED_ENDPOINT}")
+        self.endpoint = OllamaEmbeddingClient.EMBED_ENDPOINT
+        return _parse_batch_payload(data, len(texts))
+
+    async def _post_json(self, path: str, payload: dict) -> tuple[int, dict]:
+        start = time.perf_counter()
+        try:
+            resp = await self._http.post(path, json=payload)
+        except httpx.HTTPError as e:
+            raise OllamaUnavailableError(f"Ollama unreachable at {self.host}: {e!r}") from e
+        finally:
+            OLLAMA_REQUEST_SECONDS.observe(time.perf_counter() - start, path, self.model)
+        if resp.status_code >= 400:
+            return resp.status_code, {}
+        try:
+            return resp.status_code, resp.json()
+        except ValueError as e:
+            raise OllamaBadResponseError(f"Ollama returned invalid JSON from {path}") from e
+
+
+def _parse_single_payload(data: dict) -> list[float]:
+    embedding = data.get("embedding")
+    if not isinstance(embedding, list) or not embedding:
+        raise OllamaBadResponseError(
+            f"Ollama returned unexpected embedding payload keys={list(data.keys())}"
+        )
+    return [float(x) for x in embedding]
+
+
+def _parse_batch_payload(data: dict, expected: int) -> list[list[float]]:
+    embeddings = data.get("embeddings")
+    if (
+        not isinstance(embeddings, list)
+        or len(embeddings) != expected
+        or not all(isinstance(embedding, list) and embedding for embedding in embeddings)
+    ):
+        raise OllamaBadResponseError(
+            f"Ollama returned unexpected embedding payload keys={list(data.keys())}"
+        )
+    return [[float(x) for x in embedding] for embedding in embeddings]
+
+
+def embedding_model_name(client: EmbeddingClient) -> str:
+    """Model whose vectors ``client`` returns (the active model unless it says otherwise)."""
+    return getattr(client, "model", None) or active_embedding_model()
+
+
+def embed_texts(client: EmbeddingClient, texts: list[str]) -> list[list[float]]:
+    """Embed ``texts`` in one batch when the client supports it, else one call per text."""
+    get_embeddings = getattr(client, "get_embeddings", None)
+    if get_embeddings is not None:
+        return get_embeddings(texts)
+    return [client.get_embedding(text) for text in texts]
 
 
-def cosine_similarity(a: list[float], b: list[float]) -> float:
-    if not a or not b or len(a) != len(b):
+def cosine_similarity(a: list[float] | np.ndarray | None, b: list[float] | np.ndarray | None) -> float:
+    if a is None or b is None or len(a) == 0 or len(a) != len(b):
         return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    a_norm = math.sqrt(sum(x * x for x in a))
-    b_norm = math.sqrt(sum(y * y for y in b))
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    a_norm = np.linalg.norm(a)
+    b_norm = np.linalg.norm(b)
     if a_norm == 0 or b_norm == 0:
         return 0.0
-    return dot / (a_norm * b_norm)
+    return float(a @ b / (a_norm * b_norm))
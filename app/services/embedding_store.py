@@ -0,0 +1,359 @@
+"""Append-only, memory-mapped store of entry embeddings keyed by ``TextEntry.id``.
+
+Two files live next to the database:
+
+* ``<stem>.embeddings``: a 256-byte header (magic, dim, dtype, model) followed by fixed-size rows.
+* ``<stem>.embeddings.ids``: one little-endian int64 per row; ``-id`` marks a tombstone.
+
+Row ``i`` of both files belongs together and the latest row for an id wins. Writers append under an
+exclusive lock on ``<stem>.embeddings.lock`` (vectors first, then ids), so a reader that sees ``n``
+ids always has ``n`` complete vectors. Readers map both files read-only, so all worker processes
+share one copy in the OS page cache. ``scripts/compact_embeddings.py`` drops superseded rows and
+tombstones offline.
+"""
+import fcntl
+import itertools
+import logging
+import os
+import struct
+import threading
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
+from app.models.text_entry import TextEntry
+from app.services.vector_index import index_path_for
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TCEMB001"
+HEADER_SIZE = 256
+_HEADER = struct.Struct("<8sI8s128s")
+_DTYPES = {"float16": np.dtype("<f2"), "float32": np.dtype("<f4")}
+_COPY_CHUNK = 4096
+
+
+class EmbeddingStore:
+    def __init__(self, path: str, model: str, dtype: str = "float32"):
+        self.path = path
+        self.ids_path = path + ".ids"
+        self.lock_path = path + ".lock"
+        self.model = model
+        self.dtype = dtype
+        self.dim = 0
+        self._inode: int | None = None
+        self._mapped_inode: int | None = None
+        self._rows = 0
+        self._ids = np.empty(0, dtype="<i8")
+        self._vectors = np.empty((0, 0), dtype=_DTYPES[dtype])
+        self._mutex = threading.Lock()
+        if os.path.exists(path):
+            self._read_header()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def generation(self) -> int | None:
+        """Changes when the files are replaced (compaction/rebuild); row numbers reset then."""
+        return self._mapped_inode
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Row ids as of the last ``refresh`` (negative = tombstone)."""
+        return self._ids
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only ``(rows, dim)`` view of the mapped vectors as of the last ``refresh``."""
+        return self._vectors
+
+    def refresh(self) -> int:
+        """Map rows appended (by any process) since the last call; returns the row count."""
+        with self._mutex, self._locked(fcntl.LOCK_SH):
+            return self._refresh()
+
+    def append(self, entry_ids: list[int], vectors: list | np.ndarray) -> None:
+        if not entry_ids:
+            return
+        matrix = np.asarray(vectors, dtype=_DTYPES[self.dtype])
+        with self._locked(fcntl.LOCK_EX):
+            if not os.path.exists(self.path):
+                self._create(matrix.shape[1])
+            elif os.stat(self.path).st_ino != self._inode:
+                self._read_header()
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"embedding_store_dim_mismatch: store has dim {self.dim}, got {matrix.shape[1]}")
+            self._write_rows(np.asarray(entry_ids, dtype="<i8"), matrix)
+
+    def delete(self, entry_ids: list[int]) -> None:
+        """Append tombstones for ``entry_ids``."""
+        if not entry_ids or not os.path.exists(self.path):
+            return
+        with self._locked(fcntl.LOCK_EX):
+            if os.stat(self.path).st_ino != self._inode:
+                self._read_header()
+            tombstones = -np.asarray(entry_ids, dtype="<i8")
+            self._write_rows(tombstones, np.zeros((len(entry_ids), self.dim), dtype=_DTYPES[self.dtype]))
+
+    def live_rows(self) -> tuple[np.ndarray, np.ndarray]:
+        """``(entry_ids, rows)`` of the latest non-tombstoned row per id, ordered by id."""
+        with self._mutex, self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            return self._live_rows()
+
+    def compact(self) -> tuple[int, int]:
+        """Rewrite the files without superseded rows and tombstones; returns (rows before, after)."""
+        with self._mutex, self._locked(fcntl.LOCK_EX):
+            before = self._refresh()
+            entry_ids, rows = self._live_rows()
+            chunks = (
+                (entry_ids[start : start + _COPY_CHUNK], self._vectors[rows[start : start + _COPY_CHUNK]])
+                for start in range(0, len(entry_ids), _COPY_CHUNK)
+            )
+            self._replace(chunks, self.dim)
+            self._refresh()
+        return before, len(entry_ids)
+
+    def rebuild(self, db: Session) -> int:
+        """Replace the files with the stored embeddings in ``db`` (those of the newest entry's dim)."""
+        model = active_embedding_model()
+        vector_column = TextEntry.embedding_for(model)
+        newest = db.execute(
+            select(vector_column)
+            .where(vector_column.is_not(None))
+            .order_by(TextEntry.id.desc())
+            .limit(1)
+        ).scalar()
+        if newest is None:
+            return 0
+        dim = len(newest)
+
+        def chunks():
+            batch_ids, batch = [], []
+            for entry_id, vector in _iter_entry_embeddings(db, 0, model):
+                if len(vector) != dim:
+                    continue
+                batch_ids.append(entry_id)
+                batch.append(vector)
+                if len(batch) >= _COPY_CHUNK:
+                    yield batch_ids, batch
+                    batch_ids, batch = [], []
+            yield batch_ids, batch
+
+        with self._mutex, self._locked(fcntl.LOCK_EX):
+            self.model = model
+            written = self._replace(chunks(), dim)
+            self._refresh()
+        return written
+
+    def catch_up(self, db: Session) -> int:
+        """Append DB entries newer than the newest stored id (e.g. commits lost in a crash)."""
+        self.refresh()
+        last_id = int(np.abs(self._ids).max()) if len(self._ids) else 0
+        added = 0
+        batch_ids, batch = [], []
+        for entry_id, vector in _iter_entry_embeddings(db, last_id, self.model):
+            if self.dim and len(vector) != self.dim:
+                continue
+            batch_ids.append(entry_id)
+            batch.append(vector)
+            if len(batch) >= _COPY_CHUNK:
+                self.append(batch_ids, batch)
+                added += len(batch)
+                batch_ids, batch = [], []
+        self.append(batch_ids, batch)
+        return added + len(batch)
+
+    @contextmanager
+    def _locked(self, mode: int):
+        with open(self.lock_path, "a+b") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> int:
+        if not os.path.exists(self.path):
+            return self._rows
+        inode = os.stat(self.path).st_ino
+        if inode != self._mapped_inode:
+            if inode != self._inode:
+                self._read_header()
+            self._mapped_inode = inode
+            self._rows = -1
+        rows = os.path.getsize(self.ids_path) // 8 if os.path.exists(self.ids_path) else 0
+        if rows != self._rows:
+            self._rows = rows
+            if rows:
+                self._ids = np.memmap(self.ids_path, dtype="<i8", mode="r", shape=(rows,))
+                self._vectors = np.memmap(
+                    self.path, dtype=_DTYPES[self.dtype], mode="r", offset=HEADER_SIZE, shape=(rows, self.dim)
+                )
+            else:
+                self._ids = np.empty(0, dtype="<i8")
+                self._vectors = np.empty((0, self.dim), dtype=_DTYPES[self.dtype])
+        return self._rows
+
+    def _live_rows(self) -> tuple[np.ndarray, np.ndarray]:
+        ids = np.asarray(self._ids)
+        if not len(ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        # Last occurrence of every id: np.unique over the reversed array returns first indexes.
+        unique, first_from_end = np.unique(np.abs(ids)[::-1], return_index=True)
+        last = len(ids) - 1 - first_from_end
+        alive = ids[last] > 0
+        return unique[alive].astype(np.int64), last[alive].astype(np.int64)
+
+    def _create(self, dim: int) -> None:
+        with open(self.path, "wb") as f:
+            f.write(self._header(dim))
+        open(self.ids_path, "wb").close()
+        self._read_header()
+
+    def _header(self, dim: int) -> bytes:
+        header = _HEADER.pack(MAGIC, dim, self.dtype.encode(), self.model.encode("utf-8")[:128])
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def _read_header(self) -> None:
+        with open(self.path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+            self._inode = os.fstat(f.fileno()).st_ino
+        magic, dim, dtype, model = _HEADER.unpack(raw[: _HEADER.size])
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not an embedding store")
+        self.dim = dim
+        self.dtype = dtype.rstrip(b"\0").decode()
+        self.model = model.rstrip(b"\0").decode("utf-8")
+
+    def _write_rows(self, entry_ids: np.ndarray, matrix: np.ndarray) -> None:
+        rows = os.path.getsize(self.ids_path) // 8
+        with open(self.path, "r+b") as f:
+            # Overwrites any tail left by a writer that died between the two files.
+            f.seek(HEADER_SIZE + rows * self.dim * _DTYPES[self.dtype].itemsize)
+            f.write(matrix.tobytes())
+            f.truncate()
+        with open(self.ids_path, "r+b") as f:
+            f.seek(rows * 8)
+            f.write(entry_ids.tobytes())
+
+    def _replace(self, chunks, dim: int) -> int:
+        """Write ``(ids, vectors)`` chunks to new files and swap them in; returns the row count."""
+        written = 0
+        tmp_path, tmp_ids_path = self.path + ".tmp", self.ids_path + ".tmp"
+        with open(tmp_path, "wb") as vectors_file, open(tmp_ids_path, "wb") as ids_file:
+            vectors_file.write(self._header(dim))
+            for entry_ids, vectors in chunks:
+                if not len(entry_ids):
+                    continue
+                vectors_file.write(np.asarray(vectors, dtype=_DTYPES[self.dtype]).tobytes())
+                ids_file.write(np.asarray(entry_ids, dtype="<i8").tobytes())
+                written += len(entry_ids)
+        # Readers only look at the files under the lock and re-map when the inode changes.
+        os.replace(tmp_ids_path, self.ids_path)
+        os.replace(tmp_path, self.path)
+        self._read_header()
+        return written
+
+
+def _iter_entry_embeddings(db: Session, after_id: int, model: str, chunk_size: int = _COPY_CHUNK):
+    vector_column = TextEntry.embedding_for(model)
+    last_id = after_id
+    while True:
+        rows = db.execute(
+            select(TextEntry.id, vector_column)
+            .where(TextEntry.id > last_id, vector_column.is_not(None))
+            .order_by(TextEntry.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+_stores: "weakref.WeakKeyDictionary[object, EmbeddingStore | None]" = weakref.WeakKeyDictionary()
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(bind) -> EmbeddingStore | None:
+    """The entry embedding store for ``bind``'s database, or None if disabled/unavailable."""
+    if not settings.entry_store_enabled:
+        return None
+    with _stores_lock:
+        if bind not in _stores:
+            path = settings.entry_store_path or index_path_for(bind, "embeddings")
+            store = None
+            if path is not None:
+                model = active_embedding_model()
+                store = EmbeddingStore(path, model=model, dtype=settings.vector_storage_dtype)
+                if store.dim and store.model != model:
+                    logger.warning(
+                        "Ignoring entry embedding store %s: built for model %r, not %r (rebuild it with "
+                        "scripts/compact_embeddings.py --rebuild)",
+                        path,
+                        store.model,
+                        model,
+                    )
+                    store = None
+            _stores[bind] = store
+        return _stores[bind]
+
+
+def drop_embedding_store(bind) -> None:
+    """Forget ``bind``'s store so the next ``get_embedding_store`` re-opens (and re-checks) it."""
+    with _stores_lock:
+        _stores.pop(bind, None)
+
+
+# Keep the store in step with the database: collect entry changes at flush time and append them
+# only once the transaction has committed.
+_PENDING_KEY = "entry_store_pending"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_entry_changes(session: Session, flush_context) -> None:
+    if not settings.entry_store_enabled:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, TextEntry) and obj.embedding_vec is not None:
+            pending.append((obj.id, obj.embedding_vec))
+    for obj in session.dirty:
+        if isinstance(obj, TextEntry) and inspect(obj).attrs.embedding_vec.history.has_changes():
+            pending.append((obj.id, obj.embedding_vec))
+    for obj in session.deleted:
+        if isinstance(obj, TextEntry):
+            pending.append((obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _write_entry_changes(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    store = get_embedding_store(session.get_bind())
+    if store is None:
+        return
+    try:
+        # Keep the commit's order: consecutive appends (or tombstones) are written together.
+        for is_delete, group in itertools.groupby(pending, key=lambda change: change[1] is None):
+            group = list(group)
+            if is_delete:
+                store.delete([entry_id for entry_id, _ in group])
+            else:
+                store.append([entry_id for entry_id, _ in group], [vector for _, vector in group])
+    except (OSError, ValueError) as e:
+        # The database stays the source of truth; catch_up()/rebuild() bring the store back in line.
+        logger.warning("Entry embedding store append failed: %s", e)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_entry_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
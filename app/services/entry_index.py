@@ -0,0 +1,325 @@
+import json
+import threading
+import weakref
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
+from app.models.text_entry import TextEntry
+from app.services.embedding_store import EmbeddingStore, drop_embedding_store, get_embedding_store
+from app.services.vector_index import VectorIndex, build_vector_index, normalize_rows, top_k_rows
+
+_LOAD_CHUNK = 5000
+# SQLite caps bound parameters per statement; keep IN (...) lists well below it.
+_IN_CHUNK = 500
+# Bytes of vectors scored per matmul; bounds the (queries x rows) score block.
+_SCAN_BYTES = 64 * 1024 * 1024
+
+
+class EntryIndex:
+    """Entry embeddings for k-NN search, keyed by ``TextEntry.id``.
+
+    Without a ``store`` the embeddings are copied into a private in-memory matrix: ``sync``
+    appends entries with an id above the last one loaded, and in-place changes made in this
+    process are applied with ``upsert``/``discard``. With a ``store`` (see
+    ``app/services/embedding_store.py``) the matrix is the store's read-only mapping, shared by
+    every worker, and ``sync`` follows the rows and tombstones appended to it.
+
+    The index holds no labels: callers look the labels of the hits up in the database, so
+    relabelled or deleted entries are never stale. With an approximate ``backend`` and at least
+    ``min_size`` entries, queries only re-score the backend's candidates.
+
+    A compressed backend without a ``store`` keeps no float32 rows at all: ``sync`` feeds the
+    loaded rows straight into the codes (their projection is fitted on the first chunk), every
+    search goes through the backend whatever ``min_size`` is, and the candidates are re-scored
+    from the rows ``search`` reads from ``db``.
+    """
+
+    def __init__(self, backend: VectorIndex | None = None, min_size: int = 0, store: EmbeddingStore | None = None) -> None:
+        self._lock = threading.RLock()
+        self._backend = backend
+        self._min_size = min_size
+        self._store = store
+        self._store_generation: int | None = None
+        self._codes_only = store is None and backend is not None and backend.kind == "compressed"
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self._backend) if self._codes_only else len(self._positions)
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def sync(self, db: Session) -> "EntryIndex":
+        if self._store is not None:
+            return self._sync_store()
+        if (db.execute(select(func.max(TextEntry.id))).scalar() or 0) <= self._last_id:
+            return self
+        vector_column = TextEntry.embedding_for(active_embedding_model())
+        with self._lock:
+            while True:
+                rows = db.execute(
+                    select(TextEntry.id, vector_column, TextEntry.embedding_json)
+                    .where(TextEntry.id > self._last_id)
+                    .order_by(TextEntry.id)
+                    .limit(_LOAD_CHUNK)
+                ).all()
+                if not rows:
+                    return self
+                ids, vectors = [], []
+                for entry_id, vector, raw in rows:
+                    if vector is None and raw is not None:
+                        vector = json.loads(raw)
+                    if vector is not None:
+                        ids.append(entry_id)
+                        vectors.append(vector)
+                if self._codes_only:
+                    self._encode(ids, vectors)
+                else:
+                    self._append(ids, vectors)
+                self._last_id = rows[-1][0]
+
+    def upsert(self, entry_id: int, vector: list[float] | np.ndarray) -> None:
+        if self._store is not None:
+            return  # the store is appended to on commit and picked up by sync
+        with self._lock:
+            if self._codes_only:
+                self._backend.remove([entry_id])
+                self._encode([entry_id], [vector])
+                return
+            pos = self._positions.get(entry_id)
+            vector = np.asarray(vector, dtype=np.float32)
+            if pos is None or len(vector) != self._dim:
+                self._discard([entry_id])
+                self._append([entry_id], [vector])
+                return
+            self._matrix[pos] = normalize_rows(vector)
+            if self._backend_ready:
+                self._backend.upsert(np.array([entry_id]), self._matrix[pos][None, :])
+
+    def discard(self, entry_ids: list[int]) -> None:
+        if self._store is not None:
+            return
+        with self._lock:
+            self._discard(entry_ids)
+
+    def search(self, vectors: np.ndarray, k: int, db: Session | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` ``(entry_ids, scores)`` per query row, best first, padded with -1 / -inf.
+        ``db`` is where a codes-only index reads the candidates it re-scores."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.full((len(vectors), k), -1, dtype=np.int64)
+        scores = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        with self._lock:
+            if vectors.ndim != 2 or vectors.shape[1] != self._dim or not len(self):
+                return ids, scores
+            queries = normalize_rows(vectors)
+            if self._codes_only:
+                if db is None:
+                    raise ValueError("entry_index_needs_db")
+                candidates = self._backend.candidates(queries, k)
+                wanted = set(np.concatenate(candidates).tolist()) if candidates else set()
+                rows = self._read_rows(db, sorted(wanted))
+                for i, row_ids in enumerate(candidates):
+                    found = [entry_id for entry_id in row_ids.tolist() if entry_id in rows]
+                    if not found:
+                        continue
+                    top, values = top_k_rows((np.asarray([rows[entry_id] for entry_id in found]) @ queries[i])[None, :], k)
+                    ids[i, : top.shape[1]] = np.asarray(found, dtype=np.int64)[top[0]]
+                    scores[i, : values.shape[1]] = values[0]
+                return ids, scores
+            if self._use_backend():
+                for i, candidates in enumerate(self._backend.candidates(queries, k)):
+                    positions = np.array([self._positions[c] for c in candidates.tolist() if c in self._positions], dtype=np.int64)
+                    top, values = top_k_rows((self._rows(positions) @ queries[i])[None, :], k)
+                    ids[i, : top.shape[1]] = self._ids[positions[top[0]]]
+                    scores[i, : values.shape[1]] = values[0]
+                return ids, scores
+
+            chunk = max(1, _SCAN_BYTES // (self._dim * self._matrix.dtype.itemsize))
+            best_pos = np.empty((len(queries), 0), dtype=np.int64)
+            best_val = np.empty((len(queries), 0), dtype=np.float32)
+            for start in range(0, self._size, chunk):
+                end = min(start + chunk, self._size)
+                block = (queries @ np.asarray(self._matrix[start:end], dtype=np.float32).T) * self._inv_norms[start:end]
+                block[:, ~self._alive[start:end]] = -np.inf
+                pos, val = top_k_rows(block, k)
+                merged_pos = np.concatenate([best_pos, pos + start], axis=1)
+                top, best_val = top_k_rows(np.concatenate([best_val, val], axis=1), k)
+                best_pos = np.take_along_axis(merged_pos, top, axis=1)
+            found = best_val > -np.inf
+            ids[:, : best_pos.shape[1]] = np.where(found, self._ids[best_pos], -1)
+            scores[:, : best_val.shape[1]] = best_val
+            return ids, scores
+
+    def _reset(self) -> None:
+        self._backend_ready = False
+        self._last_id = 0
+        self._dim = 0
+        self._size = 0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        # 1 / row norm; all ones for the (pre-normalized) in-memory matrix.
+        self._inv_norms = np.empty(0, dtype=np.float32)
+        self._positions: dict[int, int] = {}
+
+    def _rows(self, positions: np.ndarray) -> np.ndarray:
+        """Normalized rows at ``positions``."""
+        return np.asarray(self._matrix[positions], dtype=np.float32) * self._inv_norms[positions][:, None]
+
+    def _encode(self, ids: list[int], vectors: list) -> None:
+        """Add rows to the backend's codes only (codes-only index)."""
+        if not ids:
+            return
+        if self._dim == 0:
+            self._dim = len(vectors[0])
+        keep = [i for i, vector in enumerate(vectors) if len(vector) == self._dim]
+        if not keep:
+            return
+        block = normalize_rows(np.asarray([vectors[i] for i in keep], dtype=np.float32))
+        block_ids = np.asarray([ids[i] for i in keep], dtype=np.int64)
+        if self._backend_ready:
+            self._backend.upsert(block_ids, block)
+        else:
+            self._backend.build(block_ids, block)
+            self._backend_ready = True
+
+    def _read_rows(self, db: Session, entry_ids: list[int]) -> dict[int, np.ndarray]:
+        """Normalized current embeddings of ``entry_ids`` (of the index's dim) from ``db``."""
+        vector_column = TextEntry.embedding_for(active_embedding_model())
+        rows = {}
+        for start in range(0, len(entry_ids), _IN_CHUNK):
+            for entry_id, vector, raw in db.execute(
+                select(TextEntry.id, vector_column, TextEntry.embedding_json).where(
+                    TextEntry.id.in_(entry_ids[start : start + _IN_CHUNK])
+                )
+            ).all():
+                if vector is None and raw is not None:
+                    vector = json.loads(raw)
+                if vector is not None and len(vector) == self._dim:
+                    rows[entry_id] = normalize_rows(np.asarray(vector, dtype=np.float32))
+        return rows
+
+    def _discard(self, entry_ids: list[int]) -> None:
+        for entry_id in entry_ids:
+            pos = self._positions.pop(entry_id, None)
+            if pos is not None:
+                self._alive[pos] = False
+        if self._backend_ready:
+            self._backend.remove(entry_ids)
+
+    def _use_backend(self) -> bool:
+        if self._backend is None or len(self._positions) < self._min_size:
+            return False
+        if not self._backend_ready or self._backend.dim != self._dim:
+            positions = np.flatnonzero(self._alive[: self._size])
+            self._backend.build(self._ids[positions], self._rows(positions))
+            self._backend_ready = True
+        return True
+
+    def _grow(self, needed: int) -> None:
+        """Make room for ``needed`` rows in the per-row arrays (and the private matrix)."""
+        if needed <= len(self._alive):
+            return
+        capacity = max(needed, 2 * len(self._alive), 1024)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        inv_norms = np.ones(capacity, dtype=np.float32)
+        inv_norms[: self._size] = self._inv_norms[: self._size]
+        self._alive, self._inv_norms = alive, inv_norms
+        if self._store is None:
+            matrix = np.zeros((capacity, self._dim), dtype=np.float32)
+            ids = np.zeros(capacity, dtype=np.int64)
+            if self._size:
+                matrix[: self._size] = self._matrix[: self._size]
+                ids[: self._size] = self._ids[: self._size]
+            self._matrix, self._ids = matrix, ids
+
+    def _append(self, ids: list[int], vectors: list) -> None:
+        if not ids:
+            return
+        if self._dim == 0:
+            self._dim = len(vectors[0])
+        # Entries embedded with a different model/dimension cannot be compared; skip them.
+        keep = [i for i, vector in enumerate(vectors) if len(vector) == self._dim]
+        if not keep:
+            return
+        block = normalize_rows(np.asarray([vectors[i] for i in keep], dtype=np.float32))
+        block_ids = np.asarray([ids[i] for i in keep], dtype=np.int64)
+
+        needed = self._size + len(block)
+        self._grow(needed)
+        self._matrix[self._size : needed] = block
+        self._ids[self._size : needed] = block_ids
+        self._alive[self._size : needed] = True
+        self._positions.update(zip(block_ids.tolist(), range(self._size, needed)))
+        self._size = needed
+        if self._backend_ready:
+            self._backend.upsert(block_ids, block)
+
+    def _sync_store(self) -> "EntryIndex":
+        with self._lock:
+            rows = self._store.refresh()
+            if self._store.generation != self._store_generation:
+                # Compacted or rebuilt: row numbers changed, start over.
+                self._reset()
+                self._store_generation = self._store.generation
+            if rows <= self._size:
+                return self
+
+            start = self._size
+            self._dim = self._store.dim
+            self._matrix, self._ids = self._store.vectors, self._store.ids
+            self._grow(rows)
+            norms = np.linalg.norm(np.asarray(self._matrix[start:rows], dtype=np.float32), axis=1)
+            norms[norms == 0] = 1.0
+            self._inv_norms[start:rows] = 1.0 / norms
+
+            removed, added = [], []
+            for pos, entry_id in enumerate(np.asarray(self._ids[start:rows]).tolist(), start):
+                previous = self._positions.pop(abs(entry_id), None)
+                if previous is not None:
+                    self._alive[previous] = False
+                if entry_id < 0:
+                    removed.append(-entry_id)
+                    continue
+                self._positions[entry_id] = pos
+                self._alive[pos] = True
+                added.append(pos)
+            self._size = rows
+
+            if self._backend_ready:
+                self._backend.remove(removed)
+                positions = np.asarray(added, dtype=np.int64)
+                self._backend.upsert(self._ids[positions], self._rows(positions))
+            return self
+
+
+_indexes: "weakref.WeakKeyDictionary[object, EntryIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_entry_index(db: Session) -> EntryIndex:
+    """Return the process-wide entry index for the engine ``db`` is bound to."""
+    bind = db.get_bind()
+    with _indexes_lock:
+        index = _indexes.get(bind)
+        if index is None:
+            index = _indexes[bind] = EntryIndex(
+                backend=build_vector_index(),
+                min_size=settings.vector_index_min_size,
+                store=get_embedding_store(bind),
+            )
+        return index
+
+
+def drop_entry_index(bind) -> None:
+    """Forget ``bind``'s entry index and embedding store, e.g. once its embeddings moved to
+    another model; the next ``get_entry_index`` loads them afresh."""
+    with _indexes_lock:
+        _indexes.pop(bind, None)
+    drop_embedding_store(bind)
@@ -0,0 +1,111 @@
+import json
+from collections.abc import Iterator
+from typing import BinaryIO, TextIO
+
+import numpy as np
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.repositories.text_entry_repository import TextEntryRepository
+
+# Fixed .npy header size, so the final row count can be patched in after streaming.
+_NPY_HEADER_SIZE = 128
+
+
+def iter_export_records(
+    bind: Engine, label_id: int | None = None, after_id: int = 0, chunk_size: int | None = None
+) -> Iterator[tuple[dict, np.ndarray | None]]:
+    """Yield ``(record, embedding)`` for every entry with ``id > after_id``, in id order.
+
+    Entries are read in keyset pages on ``TextEntry.id`` and every page runs in its own short
+    read transaction, so memory stays constant and SQLite writers are never blocked for long.
+    Entries created after the export started are not included.
+    """
+    chunk_size = chunk_size or settings.export_chunk_size
+    with Session(bind) as db:
+        entries = TextEntryRepository(db)
+        up_to_id = entries.max_id()
+        last_id = after_id
+        while True:
+            page = entries.export_page(last_id, up_to_id, chunk_size, label_id=label_id)
+            db.rollback()  # end the read transaction between pages
+            if not page:
+                return
+            for entry_id, text, label, score, confidence, created_at, vector in page:
+                record = {
+                    "id": entry_id,
+                    "text": text,
+                    "label": label,
+                    "similarity_score": score,
+                    "confidence": confidence,
+                    "created_at": created_at.isoformat() if created_at else None,
+                }
+                yield record, vector
+            last_id = page[-1][0]
+
+
+def iter_export_ndjson(bind: Engine, label_id: int | None = None, after_id: int = 0) -> Iterator[bytes]:
+    """NDJSON lines for ``iter_export_records``, one chunk per page."""
+    lines = []
+    for record, _ in iter_export_records(bind, label_id=label_id, after_id=after_id):
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= settings.export_chunk_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class NpySidecarWriter:
+    """Streams embeddings into a ``(rows, dim)`` ``.npy`` file whose header is patched on ``close``.
+
+    ``dim`` is taken from the first embedding; embeddings of another dimension are not written.
+    """
+
+    def __init__(self, f: BinaryIO, dtype: str = "float32"):
+        self.f = f
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.dim = 0
+        self.rows = 0
+        f.write(b"\0" * _NPY_HEADER_SIZE)
+
+    def add(self, vector: np.ndarray | None) -> int | None:
+        """Append ``vector``; returns its row number, or None if it was not written."""
+        if vector is None:
+            return None
+        if not self.dim:
+            self.dim = len(vector)
+        if len(vector) != self.dim:
+            return None
+        self.f.write(np.asarray(vector, dtype=self.dtype).tobytes())
+        self.rows += 1
+        return self.rows - 1
+
+    def close(self) -> None:
+        header = {"descr": self.dtype.str, "fortran_order": False, "shape": (self.rows, self.dim)}
+        text = repr(header).encode("latin1")
+        preamble = b"\x93NUMPY\x01\x00" + (_NPY_HEADER_SIZE - 10).to_bytes(2, "little")
+        self.f.seek(0)
+        self.f.write(preamble + text.ljust(_NPY_HEADER_SIZE - len(preamble) - 1) + b"\n")
+        self.f.seek(0, 2)
+
+
+def export_entries(
+    bind: Engine, out: TextIO, embeddings: BinaryIO | None = None, label_id: int | None = None, after_id: int = 0
+) -> int:
+    """Write entries as NDJSON to ``out``; with ``embeddings``, also a ``.npy`` sidecar.
+
+    With a sidecar every record gets an ``embedding_row`` (row in the ``.npy`` file, or null).
+    Returns the number of entries written.
+    """
+    sidecar = NpySidecarWriter(embeddings, settings.vector_storage_dtype) if embeddings is not None else None
+    written = 0
+    for record, vector in iter_export_records(bind, label_id=label_id, after_id=after_id):
+        if sidecar is not None:
+            record["embedding_row"] = sidecar.add(vector)
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        written += 1
+    if sidecar is not None:
+        sidecar.close()
+    return written
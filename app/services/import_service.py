@@ -0,0 +1,225 @@
+import csv
+import json
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.label_utils import normalize_label_name
+from app.core.metrics import NO_LABEL_FIT
+from app.models.text_entry import TextEntry
+from app.repositories.label_repository import LabelRepository
+from app.repositories.stats_repository import StatsRepository, counter_key
+from app.services.embedding_migration_service import embed_for_migration
+from app.services.embedding_service import EmbeddingClient, cosine_similarity, embed_texts, embedding_model_name
+from app.services.embedding_store import get_embedding_store
+from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.label_index import get_label_index
+
+IMPORT_FORMATS = ("ndjson", "csv")
+# Only the first rejected rows are reported back, so a bad file cannot grow the result unboundedly.
+_MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportRow:
+    line: int
+    text: str
+    label: str | None = None  # normalized label name
+
+
+@dataclass
+class ImportRowError:
+    line: int
+    reason: str
+    best_match_label: str | None = None
+    best_match_score: float | None = None
+
+
+@dataclass
+class ImportResult:
+    read_count: int = 0
+    imported_count: int = 0
+    matched_count: int = 0
+    forced_count: int = 0
+    failed_count: int = 0
+    errors: list[ImportRowError] = field(default_factory=list)
+
+    def reject(self, error: ImportRowError) -> None:
+        self.failed_count += 1
+        if len(self.errors) < _MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+
+def iter_import_rows(lines: Iterable[str], fmt: str) -> Iterator[ImportRow | ImportRowError]:
+    """Parse ``{text, label?}`` rows from NDJSON or CSV (with a header row) lazily, line by line."""
+    if fmt == "ndjson":
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield ImportRowError(line=line_no, reason="invalid_row")
+                continue
+            yield _to_row(line_no, record)
+    elif fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            # line_num is the physical line the record ended on (quoted fields may span lines).
+            yield _to_row(reader.line_num, record)
+    else:
+        raise ValueError(f"unsupported_import_format: {fmt}")
+
+
+def _to_row(line_no: int, record) -> ImportRow | ImportRowError:
+    if not isinstance(record, dict):
+        return ImportRowError(line=line_no, reason="invalid_row")
+    text, label = record.get("text"), record.get("label")
+    if not isinstance(text, str) or not text.strip() or not (label is None or isinstance(label, str)):
+        return ImportRowError(line=line_no, reason="invalid_row")
+    if label is None or not label.strip():
+        return ImportRow(line=line_no, text=text)
+    try:
+        return ImportRow(line=line_no, text=text, label=normalize_label_name(label))
+    except ValueError:
+        return ImportRowError(line=line_no, reason="label_not_found")
+
+
+class EntryImporter:
+    """Bulk-loads parsed rows into ``text_entries``.
+
+    Rows are embedded ``batch_size`` at a time, unlabelled rows are matched against the label
+    centroids (never stored below ``similarity_threshold``), and each batch is inserted with one
+    executemany. Each touched label's running sum and centroid is updated once per batch, in the
+    batch's transaction, so a failed import leaves every committed entry counted. Memory is bounded
+    by one batch.
+    """
+
+    def __init__(self, db: Session, embedding_client: EmbeddingClient, batch_size: int | None = None):
+        self.db = db
+        self.embedding_client = embedding_client
+        self.batch_size = batch_size or settings.import_batch_size
+        self.labels = LabelRepository(db)
+        self.label_embeddings = LabelEmbeddingService(db, embedding_client)
+        self._label_ids: dict[str, int | None] = {}
+
+    def run(self, rows: Iterable[ImportRow | ImportRowError]) -> ImportResult:
+        result = ImportResult()
+        batch: list[ImportRow] = []
+        try:
+            for row in rows:
+                result.read_count += 1
+                if isinstance(row, ImportRowError):
+                    result.reject(row)
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, result)
+                    batch = []
+            self._import_batch(batch, result)
+        finally:
+            self.db.rollback()
+        return result
+
+    def _import_batch(self, batch: list[ImportRow], result: ImportResult) -> None:
+        if not batch:
+            return
+        vectors = embed_texts(self.embedding_client, [row.text for row in batch])
+        self._resolve_labels([row.label for row in batch if row.label is not None])
+        index = get_label_index(self.db).sync(self.db)
+
+        unlabelled = [i for i, row in enumerate(batch) if row.label is None]
+        matches = {}
+        if unlabelled:
+            best_ids, best_scores = index.search(np.asarray([vectors[i] for i in unlabelled], dtype=np.float32), 1, db=self.db)
+            matches = dict(zip(unlabelled, zip(best_ids[:, 0].tolist(), best_scores[:, 0].tolist())))
+
+        inserts: list[dict] = []
+        for i, (row, vector) in enumerate(zip(batch, vectors)):
+            if row.label is not None:
+                label_id = self._label_ids[row.label]
+                if label_id is None:
+                    result.reject(ImportRowError(line=row.line, reason="label_not_found"))
+                    continue
+                score = index.score_label(vector, label_id)
+                if score is None:
+                    # Not in the index matrix (e.g. another dimension): score like /classify does.
+                    label = self.labels.get_by_id(label_id)
+                    score = cosine_similarity(vector, label.centroid if label is not None else None)
+                confidence = "forced"
+            else:
+                label_id, score = matches[i]
+                if label_id < 0 or score < settings.similarity_threshold:
+                    # Safety rule: never store an unlabelled entry.
+                    NO_LABEL_FIT.inc("import")
+                    position = index.position(label_id) if label_id >= 0 else None
+                    result.reject(
+                        ImportRowError(
+                            line=row.line,
+                            reason="no_label_fit",
+                            best_match_label=index.names[position] if position is not None else None,
+                            best_match_score=round(score, 4) if position is not None else None,
+                        )
+                    )
+                    continue
+                confidence = "high"
+            inserts.append(
+                dict(
+                    text=row.text,
+                    label_id=label_id,
+                    similarity_score=score,
+                    confidence=confidence,
+                    embedding_vec=np.asarray(vector, dtype=np.float32),
+                    embedding_model=embedding_model_name(self.embedding_client),
+                )
+            )
+
+        if not inserts:
+            return
+        # While a model migration runs, new entries get the target model's vector too.
+        migrated = embed_for_migration(self.db, [values["text"] for values in inserts])
+        model, next_vectors = migrated if migrated is not None else (None, [None] * len(inserts))
+        for values, vector in zip(inserts, next_vectors):
+            values["next_embedding_vec"] = None if vector is None else np.asarray(vector, dtype=np.float32)
+            values["next_embedding_model"] = model
+        entry_ids = self.db.execute(
+            insert(TextEntry).returning(TextEntry.id, sort_by_parameter_order=True), inserts
+        ).scalars().all()
+        # Bulk inserts bypass the session's flush hooks: count the new entries here.
+        StatsRepository(self.db).apply(
+            Counter(counter_key(row["label_id"], row["confidence"], row["similarity_score"]) for row in inserts)
+        )
+        self._update_labels(inserts)
+        self.db.commit()
+
+        for values in inserts:
+            if values["confidence"] == "forced":
+                result.forced_count += 1
+            else:
+                result.matched_count += 1
+        result.imported_count += len(inserts)
+
+        # Likewise for the shared embedding store.
+        store = get_embedding_store(self.db.get_bind())
+        if store is not None:
+            store.append(entry_ids, [values["embedding_vec"] for values in inserts])
+
+    def _resolve_labels(self, names: list[str]) -> None:
+        unseen = set(names) - self._label_ids.keys()
+        if not unseen:
+            return
+        found = {label.name: label.id for label in self.labels.get_by_names(sorted(unseen))}
+        self._label_ids.update((name, found.get(name)) for name in unseen)
+
+    def _update_labels(self, inserts: list[dict]) -> None:
+        """Add the batch's entries to their labels' running sums (one update per label)."""
+        vectors: dict[int, list[np.ndarray]] = {}
+        for values in inserts:
+            vectors.setdefault(values["label_id"], []).append(values["embedding_vec"])
+        for label in self.labels.get_by_ids(sorted(vectors)):
+            self.label_embeddings.add_entries(label, vectors[label.id])
@@ -1,58 +1,308 @@
-import math
+import logging
+import threading
+from collections import defaultdict
 
+import numpy as np
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.label_utils import definition_hash
+from app.core.metrics import CENTROID_UPDATE_SECONDS
 from app.models.label import Label
+from app.repositories.centroid_delta_repository import CentroidDeltaRepository
 from app.repositories.text_entry_repository import TextEntryRepository
-from app.services.embedding_service import EmbeddingClient
+from app.services.embedding_service import EmbeddingClient, embed_texts, embedding_model_name
+from app.services.label_index import get_label_index
+
+logger = logging.getLogger(__name__)
+
+Vector = list[float] | np.ndarray
+
+_EMPTY_SUM_NORM = 1e-6
+
+# Deferred mode: set once centroid_flush_max_changes deltas were recorded by this process, so the
+# centroid worker flushes before its interval is up.
+flush_requested = threading.Event()
+_deferred_changes = 0
+_deferred_lock = threading.Lock()
 
 
 class LabelEmbeddingService:
-    def __init__(self, db: Session, embedding_client: EmbeddingClient):
+    """Maintains label centroids.
+
+    centroid = normalize(0.5 * normalize(definition) + 0.5 * normalize(sum of entry embeddings))
+
+    The definition embedding and the entry sum are stored on the label, so ``add_entry`` /
+    ``remove_entry`` / ``move_entry`` cost O(dim) regardless of label size. ``recompute_for_label``
+    rebuilds both from scratch and is only needed for repairs (legacy rows, model changes). Entry
+    embeddings tagged with another model than the client's are never mixed into a sum.
+
+    With ``deferred`` (default: ``CENTROID_UPDATE_MODE=deferred``), adding and removing entries
+    only records a delta row; ``app/services/centroid_worker.py`` applies them in batches.
+    The definition embedding is tagged with its model and definition hash and only re-embedded
+    when either changes (see ``definition_embedding``).
+    """
+
+    def __init__(self, db: Session, embedding_client: EmbeddingClient, deferred: bool | None = None):
         self.db = db
         self.embedding_client = embedding_client
         self.entries = TextEntryRepository(db)
+        self.deltas = CentroidDeltaRepository(db)
+        self.deferred = settings.centroid_update_mode == "deferred" if deferred is None else deferred
 
+    @CENTROID_UPDATE_SECONDS.timed("recompute")
     def recompute_for_label(self, label: Label) -> None:
-        definition_embedding = self._normalize(self.embedding_client.get_embedding(label.definition))
+        # Recounted from the entries below, so pending deltas would be applied twice.
+        self.deltas.discard_for_labels([label.id])
+        definition_embedding = self.definition_embedding(label)
 
         label_entries = self.entries.list_by_label(label.id)
         label.usage_count = len(label_entries)
 
-        if not label_entries:
-            label.centroid = definition_embedding
-            return
-
-        entry_vectors: list[list[float]] = []
+        entries_sum = np.zeros(len(definition_embedding), dtype=np.float64)
+        model = embedding_model_name(self.embedding_client)
+        stale_entries = []
         for entry in label_entries:
             cached = entry.embedding
-            if isinstance(cached, list) and len(cached) == len(definition_embedding):
-                entry_vectors.append(cached)
+            if self._usable(cached, entry.embedding_model, len(definition_embedding), model):
+                entries_sum += cached
+            else:
+                stale_entries.append(entry)
+
+        if len(stale_entries) > settings.recompute_reembed_limit:
+            logger.warning(
+                "Label %r: %d entries have no %r embedding; rebuilding its centroid without them "
+                "(re-embed them with an embedding model migration)",
+                label.name,
+                len(stale_entries),
+                model,
+            )
+        elif stale_entries:
+            vectors = embed_texts(self.embedding_client, [entry.text for entry in stale_entries])
+            for entry, vector in zip(stale_entries, vectors):
+                if len(vector) == len(definition_embedding):
+                    entry.set_embedding(vector, model)
+                    entries_sum += vector
+
+        label.entries_sum = entries_sum
+        self._refresh_centroid(label)
+
+    @CENTROID_UPDATE_SECONDS.timed("rebuild")
+    def rebuild_from_stored(self, labels: list[Label]) -> None:
+        """Rebuild ``labels`` from stored entry embeddings in one pass over ``text_entries``.
+
+        Labels with a cached definition embedding and fully embedded entries need no embedding
+        calls; any other label falls back to ``recompute_for_label``.
+        """
+        self.deltas.discard_for_labels([label.id for label in labels])
+        by_id = {label.id: label for label in labels}
+        sums: dict[int, np.ndarray] = {}
+        counts: dict[int, int] = defaultdict(int)
+        stale: set[int] = {label.id for label in labels if not self._definition_current(label)}
+        active_model = embedding_model_name(self.embedding_client)
+        for label_id, vector, model in self.entries.iter_label_embeddings():
+            label = by_id.get(label_id)
+            if label is None or label_id in stale:
                 continue
+            counts[label_id] += 1
+            if not self._usable(vector, model, len(label.definition_embedding), active_model):
+                stale.add(label_id)
+                continue
+            if label_id not in sums:
+                sums[label_id] = np.zeros(len(vector), dtype=np.float64)
+            sums[label_id] += vector
 
-            vector = self.embedding_client.get_embedding(entry.text)
-            if len(vector) == len(definition_embedding):
-                entry.embedding = vector
-                entry_vectors.append(vector)
+        for label in labels:
+            if label.id in stale:
+                self.recompute_for_label(label)
+                continue
+            label.usage_count = counts[label.id]
+            label.entries_sum = sums.get(label.id)
+            self._refresh_centroid(label)
 
-        if not entry_vectors:
-            label.centroid = definition_embedding
+    def definition_embedding(self, label: Label) -> np.ndarray:
+        """The label's normalized definition embedding; embeds the definition only when the stored
+        one is missing or was made from another definition or model."""
+        if self._definition_current(label):
+            return np.asarray(label.definition_embedding, dtype=np.float64)
+        vector = self._normalize(self.embedding_client.get_embedding(label.definition))
+        self._set_definition_embedding(label, vector)
+        return vector
+
+    def use_definition_embedding(self, label: Label, vector: Vector) -> None:
+        """Store ``vector``, embedded from the current definition by this service's client, as the
+        label's definition embedding (e.g. computed in a batch ahead of a model cutover)."""
+        self._set_definition_embedding(label, self._normalize(vector))
+
+    def use_entries_sum(self, label: Label, entries_sum: Vector | None, count: int) -> None:
+        """Set the label's entry sum and count, computed elsewhere from this service's model's
+        embeddings (e.g. ahead of a model cutover), and refresh the centroid."""
+        label.entries_sum = None if entries_sum is None else np.asarray(entries_sum, dtype=np.float64)
+        label.usage_count = count
+        self._refresh_centroid(label)
+
+    def update_definition(self, label: Label, definition: str) -> None:
+        """Change the label's definition, re-embed it and refresh the centroid."""
+        label.definition = definition
+        if label.entries_sum is None and label.usage_count:
+            self.recompute_for_label(label)
+            return
+        self.definition_embedding(label)
+        self._refresh_centroid(label)
+
+    def initialize(self, label: Label, definition_embedding: Vector) -> None:
+        """Set up a freshly created label from its (already computed) definition embedding."""
+        self._set_definition_embedding(label, self._normalize(definition_embedding))
+        label.entries_sum = None
+        label.usage_count = 0
+        self._refresh_centroid(label)
+
+    def add_entry(self, label: Label, vector: Vector) -> None:
+        """Account for a new (already flushed) entry of ``label`` with embedding ``vector``."""
+        self.add_entries(label, [vector])
+
+    def add_entries(self, label: Label, vectors: list[Vector]) -> None:
+        """Account for several new (already flushed) entries of ``label`` in one update."""
+        if not vectors:
+            return
+        if any(len(vector) != len(vectors[0]) for vector in vectors):
+            self.recompute_for_label(label)
+            return
+        self.add_sum(label, np.asarray(vectors, dtype=np.float64).sum(axis=0), len(vectors))
+
+    @CENTROID_UPDATE_SECONDS.timed("add")
+    def add_sum(self, label: Label, vectors_sum: Vector, count: int) -> None:
+        """Account for ``count`` new (already committed or flushed) entries whose embeddings sum to ``vectors_sum``."""
+        if self.deferred:
+            self._defer(label, count, np.asarray(vectors_sum, dtype=np.float64))
+            return
+        self._lock_for_update(label)
+        if not self._has_running_sum(label, len(vectors_sum)):
+            self.recompute_for_label(label)
             return
 
-        entries_centroid = [
-            sum(vector[i] for vector in entry_vectors) / len(entry_vectors)
-            for i in range(len(definition_embedding))
-        ]
-        entries_centroid = self._normalize(entries_centroid)
+        label.entries_sum = np.asarray(label.entries_sum, dtype=np.float64) + np.asarray(vectors_sum, dtype=np.float64)
+        label.usage_count = (label.usage_count or 0) + count
+        self._refresh_centroid(label)
+
+    @CENTROID_UPDATE_SECONDS.timed("remove")
+    def remove_entry(self, label: Label, vector: Vector | None) -> None:
+        """Account for an entry (with stored embedding ``vector``) leaving ``label``."""
+        if self.deferred:
+            self._defer(label, -1, None if vector is None else -np.asarray(vector, dtype=np.float64))
+            return
+        self._lock_for_update(label)
+        entries_sum = label.entries_sum
+        if entries_sum is None and (label.usage_count or 0) > 1:
+            self.recompute_for_label(label)
+            return
+
+        label.usage_count = max((label.usage_count or 0) - 1, 0)
+        if label.usage_count == 0 or entries_sum is None:
+            entries_sum = None
+        elif vector is not None and len(vector) == len(entries_sum):
+            entries_sum = np.asarray(entries_sum, dtype=np.float64) - vector
+        label.entries_sum = entries_sum
+
+        self.definition_embedding(label)
+        self._refresh_centroid(label)
+
+    def move_entry(self, source: Label | None, target: Label, vector: Vector | None, new_vector: Vector) -> None:
+        if source is not None:
+            self.remove_entry(source, vector)
+        self.add_entry(target, new_vector)
 
-        blended = [
-            0.5 * definition_embedding[i] + 0.5 * entries_centroid[i]
-            for i in range(len(definition_embedding))
-        ]
-        label.centroid = self._normalize(blended)
+    @CENTROID_UPDATE_SECONDS.timed("apply_deferred")
+    def apply_delta(self, label: Label, vectors_sum: Vector | None, count: int) -> None:
+        """Apply coalesced deltas: ``count`` entries added (negative: removed) whose embeddings sum
+        to ``vectors_sum`` (None when none of them had an embedding)."""
+        self._lock_for_update(label)
+        usage_count = max((label.usage_count or 0) + count, 0)
+        if vectors_sum is not None and not self._has_running_sum(label, len(vectors_sum)):
+            self.recompute_for_label(label)
+            return
+        if label.entries_sum is None and usage_count > 0:
+            self.recompute_for_label(label)
+            return
+        if vectors_sum is not None:
+            label.entries_sum = np.asarray(label.entries_sum, dtype=np.float64) + np.asarray(vectors_sum, dtype=np.float64)
+        label.usage_count = usage_count
+        if usage_count == 0:
+            label.entries_sum = None
+        self.definition_embedding(label)
+        self._refresh_centroid(label)
+
+    def _lock_for_update(self, label: Label) -> None:
+        """Re-read ``label`` under the write lock before a read-modify-write of its running sum,
+        so concurrent writers queue up instead of overwriting each other's updates.
+
+        The no-op UPDATE takes the row lock (and SQLite's write lock, which pysqlite only takes on
+        the first DML of a transaction); the label's own pending changes are flushed first so the
+        refresh does not drop them.
+        """
+        self.db.flush()
+        self.db.execute(
+            update(Label).where(Label.id == label.id).values(usage_count=Label.usage_count),
+            execution_options={"synchronize_session": False},
+        )
+        self.db.refresh(label)
+
+    def _defer(self, label: Label, count: int, vectors_sum: np.ndarray | None) -> None:
+        global _deferred_changes
+        self.deltas.add(label.id, count, vectors_sum)
+        with _deferred_lock:
+            _deferred_changes += abs(count)
+            if _deferred_changes >= settings.centroid_flush_max_changes:
+                _deferred_changes = 0
+                flush_requested.set()
+
+    @staticmethod
+    def _usable(vector: np.ndarray | None, vector_model: str | None, dim: int, model: str) -> bool:
+        """Whether a stored entry embedding can be summed with ``model``'s vectors (untagged rows
+        predate model tags and are trusted when their dimension matches)."""
+        return vector is not None and len(vector) == dim and vector_model in (None, model)
+
+    def _has_running_sum(self, label: Label, dim: int) -> bool:
+        definition_embedding = label.definition_embedding
+        if definition_embedding is None or len(definition_embedding) != dim:
+            return False
+        entries_sum = label.entries_sum
+        if entries_sum is None:
+            # Labels that never had entries can start a fresh sum; older rows need one full rebuild.
+            if label.usage_count:
+                return False
+            label.entries_sum = np.zeros(dim, dtype=np.float64)
+            return True
+        return len(entries_sum) == dim
+
+    def _definition_current(self, label: Label) -> bool:
+        return (
+            label.definition_embedding is not None
+            and label.definition_model == embedding_model_name(self.embedding_client)
+            and label.definition_hash == definition_hash(label.definition)
+        )
+
+    def _set_definition_embedding(self, label: Label, vector: np.ndarray) -> None:
+        label.definition_embedding = vector
+        label.definition_model = embedding_model_name(self.embedding_client)
+        label.definition_hash = definition_hash(label.definition)
+
+    def _refresh_centroid(self, label: Label) -> None:
+        definition_embedding = np.asarray(label.definition_embedding, dtype=np.float64)
+        entries_sum = label.entries_sum
+        entries_norm = 0.0 if entries_sum is None else float(np.linalg.norm(entries_sum))
+        if entries_norm < _EMPTY_SUM_NORM:
+            # Add/remove round-off can leave a tiny residue once all embedded entries are gone.
+            label.centroid = definition_embedding
+        else:
+            blended = 0.5 * definition_embedding + 0.5 * (np.asarray(entries_sum) / entries_norm)
+            label.centroid = self._normalize(blended)
+        get_label_index(self.db).invalidate(label.id)
 
-    def _normalize(self, vector: list[float]) -> list[float]:
-        norm = math.sqrt(sum(v * v for v in vector))
+    def _normalize(self, vector: Vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float64)
+        norm = np.linalg.norm(vector)
         if norm == 0:
-            return [0.0 for _ in vector]
-        return [v / norm for v in vector]
+            return np.zeros(len(vector), dtype=np.float64)
+        return vector / norm
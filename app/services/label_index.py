@@ -0,0 +1,428 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import LABEL_LOAD_SECONDS
+from app.models.label import Label
+from app.repositories.label_repository import LabelRepository
+from app.services.vector_index import VectorIndex, build_vector_index, index_path_for, normalize_rows, top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps bound parameters per statement; keep IN (...) lists well below it.
+_IN_CHUNK = 500
+
+
+def _row_hashes(rows: Iterable[bytes]) -> np.ndarray:
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(row, digest_size=8).digest(), "little") for row in rows],
+        dtype=np.uint64,
+    )
+
+
+class LabelIndex:
+    """In-memory matrix of pre-normalized label centroids.
+
+    One instance is kept per database engine (see ``get_label_index``). ``sync`` compares the
+    labels version (a counter every label write bumps, see ``_bump_labels_version``) against the
+    last one seen and only re-decodes rows whose ``updated_at`` moved, so other workers' writes
+    are picked up without reloading every centroid on each request.
+
+    With an approximate ``backend`` (see ``app/services/vector_index.py``) and at least
+    ``min_size`` labels, queries only re-score the backend's candidates instead of every row.
+    The backend is kept in step with row updates and, given a ``path``, saved there so the next
+    process start loads it instead of rebuilding. Once a compressed backend is built the float32
+    matrix is dropped: searches re-score the candidates from the rows they read from ``db``, and
+    the matrix is only loaded again when the backend has to be rebuilt.
+    """
+
+    def __init__(self, backend: VectorIndex | None = None, path: str | None = None, min_size: int = 0) -> None:
+        self._lock = threading.RLock()
+        self._backend = backend
+        self._path = path
+        self._min_size = min_size
+        self._backend_ready = False
+        self._codes_only = backend is not None and backend.kind == "compressed"
+        self._signature: int | None = None
+        self._dim = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._names: list[str] = []
+        self._stamps: list[datetime | None] = []
+        # None once only a compressed backend's codes are kept.
+        self._matrix: np.ndarray | None = np.empty((0, 0), dtype=np.float32)
+        self._positions: dict[int, int] = {}
+        # Centroids whose dimension differs from the matrix (e.g. mid model change); they score 0.
+        self._foreign: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_labels(cls, labels: Iterable[Label]) -> "LabelIndex":
+        index = cls()
+        index._load([(label.id, label.name, label.updated_at, label.centroid) for label in labels])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids
+
+    @property
+    def names(self) -> list[str]:
+        return self._names
+
+    def position(self, label_id: int) -> int | None:
+        """Column of ``label_id`` in ``scores``/``score_batch`` results."""
+        return self._positions.get(label_id)
+
+    def invalidate(self, label_id: int | None = None) -> None:
+        """Force the next ``sync`` to re-check the table (and re-read ``label_id`` if given)."""
+        with self._lock:
+            self._signature = None
+            if label_id is not None and label_id in self._positions:
+                self._stamps[self._positions[label_id]] = None
+
+    def sync(self, db: Session) -> "LabelIndex":
+        start = time.perf_counter()
+        signature = LabelRepository(db).version()
+        with self._lock:
+            if signature == self._signature:
+                LABEL_LOAD_SECONDS.observe(time.perf_counter() - start, "unchanged")
+                return self
+
+            stamps = dict(db.execute(select(Label.id, Label.updated_at)).all())
+            removed = [label_id for label_id in self._positions if label_id not in stamps]
+            changed = [
+                label_id
+                for label_id, stamp in stamps.items()
+                if label_id not in self._positions or self._stamps[self._positions[label_id]] != stamp
+            ]
+
+            rows = self._read_rows(db, changed)
+            if self._matrix is None:
+                rows = self._sync_codes(db, stamps, removed, rows)
+            elif removed or any(label_id not in self._positions for label_id, *_ in rows):
+                keep = [
+                    (label_id, self._names[pos], self._stamps[pos], self._row_vector(label_id, pos))
+                    for label_id, pos in self._positions.items()
+                    if label_id in stamps
+                ]
+                fresh = {row[0]: row for row in rows}
+                self._load([fresh.pop(row[0], row) for row in keep] + list(fresh.values()))
+            else:
+                for row in rows:
+                    self._patch(*row)
+
+            self._refresh_backend(removed, rows)
+            self._signature = signature
+        LABEL_LOAD_SECONDS.observe(time.perf_counter() - start, "reloaded")
+        return self
+
+    def scores(self, vector: list[float] | np.ndarray) -> np.ndarray:
+        """Cosine similarity of ``vector`` against every label, aligned with ``ids``/``names``."""
+        return self.score_batch(np.asarray(vector, dtype=np.float32)[None, :])[0]
+
+    def score_batch(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._matrix is None:
+                raise ValueError("label_index_has_no_matrix")
+            if vectors.ndim != 2 or vectors.shape[1] != self._dim:
+                return np.zeros((len(vectors), len(self._names)), dtype=np.float32)
+            return normalize_rows(vectors) @ self._matrix.T
+
+    def score_label(self, vector: list[float] | np.ndarray, label_id: int) -> float | None:
+        """Cosine similarity of ``vector`` to one label, or None if it is not in the matrix (or
+        there is no matrix)."""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            pos = self._positions.get(label_id)
+            if self._matrix is None or pos is None or label_id in self._foreign or len(vector) != self._dim:
+                return None
+            return float(normalize_rows(vector) @ self._matrix[pos])
+
+    def search(self, vectors: np.ndarray, k: int = 1, db: Session | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` ``(label_ids, scores)`` per query row, best first, padded with -1 / -inf.
+        ``db`` is where the candidates are re-scored from once the matrix is dropped."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.full((len(vectors), k), -1, dtype=np.int64)
+        scores = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        with self._lock:
+            if vectors.ndim != 2 or vectors.shape[1] != self._dim or not self._names:
+                return ids, scores
+            queries = normalize_rows(vectors)
+            if not self._backend_ready:
+                positions, values = top_k_rows(queries @ self._matrix.T, k)
+                ids[:, : positions.shape[1]] = self._ids[positions]
+                scores[:, : values.shape[1]] = values
+                return ids, scores
+
+            all_candidates = self._backend.candidates(queries, k)
+            centroids = None
+            if self._matrix is None:
+                if db is None:
+                    raise ValueError("label_index_needs_db")
+                wanted = set(np.concatenate(all_candidates).tolist()) if all_candidates else set()
+                centroids = self._read_centroids(db, sorted(wanted))
+            for i, candidates in enumerate(all_candidates):
+                # Drop candidates the backend still holds but the index no longer does.
+                positions = np.searchsorted(self._ids, candidates)
+                valid = positions < len(self._ids)
+                valid[valid] = self._ids[positions[valid]] == candidates[valid]
+                if centroids is not None:
+                    valid[valid] = [label_id in centroids for label_id in candidates[valid].tolist()]
+                    rows = np.asarray([centroids[label_id] for label_id in candidates[valid].tolist()], dtype=np.float32)
+                    rows = rows.reshape(-1, self._dim)
+                else:
+                    rows = self._matrix[positions[valid]]
+                positions = positions[valid]
+                top, values = top_k_rows((rows @ queries[i])[None, :], k)
+                ids[i, : top.shape[1]] = self._ids[positions[top[0]]]
+                scores[i, : values.shape[1]] = values[0]
+            return ids, scores
+
+    def best_match(
+        self, vector: list[float] | np.ndarray, db: Session | None = None
+    ) -> tuple[int | None, str | None, float]:
+        with self._lock:
+            ids, scores = self.search(np.asarray(vector, dtype=np.float32)[None, :], 1, db=db)
+            if ids[0, 0] < 0 or scores[0, 0] < 0:
+                return None, None, 0.0
+            label_id = int(ids[0, 0])
+            return label_id, self._names[self._positions[label_id]], float(scores[0, 0])
+
+    def top_k(self, vector: list[float] | np.ndarray, k: int, db: Session | None = None) -> list[tuple[int, str, float]]:
+        if k <= 0:
+            return []
+        with self._lock:
+            ids, scores = self.search(np.asarray(vector, dtype=np.float32)[None, :], k, db=db)
+            return [
+                (int(label_id), self._names[self._positions[int(label_id)]], float(score))
+                for label_id, score in zip(ids[0], scores[0])
+                if label_id >= 0
+            ]
+
+    def save(self) -> None:
+        """Persist the approximate backend (if built) next to the database."""
+        with self._lock:
+            if self._path is None or not self._backend_ready:
+                return
+            backend_path = f"{self._path}.{self._backend.kind}"
+            self._backend.save(backend_path + ".tmp")
+            os.replace(backend_path + ".tmp", backend_path)
+            with open(self._path + ".meta.tmp", "wb") as f:
+                np.savez(f, kind=self._backend.kind, dim=self._dim, ids=self._ids, hashes=self._fingerprints())
+            os.replace(self._path + ".meta.tmp", self._path + ".meta")
+
+    def _refresh_backend(self, removed: list[int], rows: list[tuple]) -> None:
+        """Apply ``removed`` and the re-read ``rows`` to the backend (building it if needed)."""
+        if self._backend is None:
+            return
+        if len(self._names) < self._min_size or self._dim == 0:
+            self._backend_ready = False
+            return
+        if not self._backend_ready or self._backend.dim != self._dim:
+            loaded = self._load_backend()
+            if not loaded:
+                self._backend.build(self._ids, self._matrix)
+            self._backend_ready = True
+            if not loaded:
+                self.save()
+        else:
+            current = [
+                (label_id, vector)
+                for label_id, _, _, vector in rows
+                if label_id in self._positions and label_id not in self._foreign
+            ]
+            self._backend.remove(removed + [label_id for label_id, *_ in rows if label_id in self._foreign])
+            if current:
+                self._backend.upsert(
+                    np.array([label_id for label_id, _ in current], dtype=np.int64),
+                    normalize_rows(np.asarray([vector for _, vector in current], dtype=np.float32)),
+                )
+        if self._codes_only:
+            self._matrix = None
+
+    def _load_backend(self) -> bool:
+        """Load a saved backend and re-index only the rows that changed since it was saved."""
+        if self._path is None or not os.path.exists(self._path + ".meta"):
+            return False
+        backend_path = f"{self._path}.{self._backend.kind}"
+        try:
+            with np.load(self._path + ".meta") as meta:
+                kind, dim, saved_ids, saved_hashes = str(meta["kind"]), int(meta["dim"]), meta["ids"], meta["hashes"]
+            if kind != self._backend.kind or dim != self._dim or not self._backend.load(backend_path, self._dim):
+                return False
+        except (OSError, ValueError, KeyError, RuntimeError) as e:
+            logger.warning("Ignoring unreadable vector index %s: %s", backend_path, e)
+            return False
+
+        saved = dict(zip(saved_ids.tolist(), saved_hashes.tolist()))
+        hashes = self._fingerprints().tolist()
+        stale = [pos for pos, label_id in enumerate(self._ids.tolist()) if saved.get(label_id) != hashes[pos]]
+        self._backend.remove([label_id for label_id in self._backend.ids if label_id not in self._positions])
+        self._backend.upsert(self._ids[stale], self._matrix[stale])
+        return True
+
+    def _fingerprints(self) -> np.ndarray:
+        """Per row, what tells a saved backend's rows from changed ones: a hash of the matrix row,
+        or of the ``updated_at`` stamp for a compressed backend (which outlives the matrix)."""
+        if self._codes_only:
+            return _row_hashes(str(stamp).encode() for stamp in self._stamps)
+        return _row_hashes(row.tobytes() for row in self._matrix)
+
+    def _read_rows(self, db: Session, label_ids: list[int]) -> list[tuple]:
+        """``(label_id, name, updated_at, centroid)`` rows of ``label_ids``."""
+        rows = []
+        for offset in range(0, len(label_ids), _IN_CHUNK):
+            chunk = label_ids[offset : offset + _IN_CHUNK]
+            rows.extend(
+                (label_id, name, stamp, vector if vector is not None else json.loads(raw or "[]"))
+                for label_id, name, stamp, vector, raw in db.execute(
+                    select(Label.id, Label.name, Label.updated_at, Label.centroid_vec, Label.centroid_json).where(
+                        Label.id.in_(chunk)
+                    )
+                ).all()
+            )
+        return rows
+
+    def _read_centroids(self, db: Session, label_ids: list[int]) -> dict[int, np.ndarray]:
+        """Normalized current centroids of ``label_ids`` (of the index's dim) from ``db``."""
+        centroids = {}
+        for label_id, _, _, vector in self._read_rows(db, label_ids):
+            vector = np.asarray(vector, dtype=np.float32)
+            if len(vector) == self._dim:
+                centroids[label_id] = normalize_rows(vector)
+        return centroids
+
+    def _sync_codes(self, db: Session, stamps: dict, removed: list[int], rows: list[tuple]) -> list[tuple]:
+        """``sync`` without a matrix: track names and stamps, leaving the vectors to the backend.
+        Reloads every row (and so the matrix) when the backend has to be rebuilt; returns the
+        rows ``_refresh_backend`` gets."""
+        for label_id in removed:
+            self._foreign.pop(label_id, None)
+        for label_id, _, _, vector in rows:
+            if len(vector) == self._dim:
+                self._foreign.pop(label_id, None)
+            else:
+                self._foreign[label_id] = np.asarray(vector, dtype=np.float32)
+        if len(stamps) < self._min_size or len(self._foreign) * 2 > len(stamps):
+            # Back to exact scans, or most centroids moved to a new dimension.
+            rows = self._read_rows(db, sorted(stamps))
+            self._load(rows)
+            return rows
+
+        if removed or any(label_id not in self._positions for label_id, *_ in rows):
+            entries = {
+                label_id: (self._names[pos], self._stamps[pos])
+                for label_id, pos in self._positions.items()
+                if label_id in stamps
+            }
+            entries.update((label_id, (name, stamp)) for label_id, name, stamp, _ in rows)
+            ordered = sorted(entries)
+            self._ids = np.array(ordered, dtype=np.int64)
+            self._names = [entries[label_id][0] for label_id in ordered]
+            self._stamps = [entries[label_id][1] for label_id in ordered]
+            self._positions = {label_id: pos for pos, label_id in enumerate(ordered)}
+        else:
+            for label_id, name, stamp, _ in rows:
+                pos = self._positions[label_id]
+                self._names[pos] = name
+                self._stamps[pos] = stamp
+        return rows
+
+    def _row_vector(self, label_id: int, pos: int) -> np.ndarray:
+        return self._foreign.get(label_id, self._matrix[pos])
+
+    def _load(self, rows: list[tuple[int, str, datetime | None, list[float] | np.ndarray]]) -> None:
+        rows = sorted(rows, key=lambda row: row[0])
+        vectors = [np.asarray(row[3], dtype=np.float32) for row in rows]
+        dims = Counter(len(v) for v in vectors if len(v))
+        self._dim = dims.most_common(1)[0][0] if dims else 0
+
+        matrix = np.zeros((len(rows), self._dim), dtype=np.float32)
+        self._foreign = {}
+        for pos, (row, vector) in enumerate(zip(rows, vectors)):
+            if len(vector) == self._dim:
+                matrix[pos] = vector
+            else:
+                self._foreign[row[0]] = vector
+
+        self._matrix = normalize_rows(matrix)
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._names = [row[1] for row in rows]
+        self._stamps = [row[2] for row in rows]
+        self._positions = {row[0]: pos for pos, row in enumerate(rows)}
+
+    def _patch(self, label_id: int, name: str, stamp: datetime | None, vector: list[float] | np.ndarray) -> None:
+        pos = self._positions[label_id]
+        vector = np.asarray(vector, dtype=np.float32)
+        self._names[pos] = name
+        self._stamps[pos] = stamp
+        if len(vector) == self._dim:
+            self._foreign.pop(label_id, None)
+            self._matrix[pos] = normalize_rows(vector)
+            return
+
+        self._foreign[label_id] = vector
+        self._matrix[pos] = 0.0
+        if len(self._foreign) * 2 > len(self._names):
+            # Most centroids moved to a new dimension: rebuild around the new majority.
+            self._load(
+                [
+                    (ident, self._names[p], self._stamps[p], self._row_vector(ident, p))
+                    for ident, p in self._positions.items()
+                ]
+            )
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_labels_version(session: Session, flush_context, instances) -> None:
+    # max(updated_at) is no change signal: a write can commit after a later-stamped one.
+    if (
+        any(isinstance(obj, Label) for obj in session.new)
+        or any(isinstance(obj, Label) for obj in session.deleted)
+        or any(isinstance(obj, Label) and session.is_modified(obj) for obj in session.dirty)
+    ):
+        LabelRepository(session).bump_version()
+
+
+_indexes: "weakref.WeakKeyDictionary[object, LabelIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_label_index(db: Session) -> LabelIndex:
+    """Return the process-wide label index for the engine ``db`` is bound to."""
+    bind = db.get_bind()
+    with _indexes_lock:
+        index = _indexes.get(bind)
+        if index is None:
+            index = _indexes[bind] = LabelIndex(
+                backend=build_vector_index(),
+                path=index_path_for(bind, "labels"),
+                min_size=settings.vector_index_min_size,
+            )
+        return index
+
+
+def save_label_indexes() -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.save()
@@ -0,0 +1,223 @@
+import logging
+import threading
+import uuid
+from datetime import datetime
+from itertools import takewhile
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import NO_LABEL_FIT
+from app.models.reclassify_job import ReclassifyJob
+from app.repositories.label_repository import LabelRepository
+from app.repositories.reclassify_job_repository import ACTIVE_STATUSES, ReclassifyJobRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.services.classification_service import ClassificationService
+from app.services.embedding_migration_service import dual_write
+from app.services.embedding_service import EmbeddingClient, embed_texts, embedding_model_name
+from app.services.entry_index import get_entry_index
+from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.label_index import get_label_index
+
+logger = logging.getLogger(__name__)
+
+_workers: dict[int, threading.Thread] = {}
+_workers_lock = threading.Lock()
+
+
+def start_reclassify_job(
+    db: Session, include_forced: bool = False, chunk_size: int | None = None, mode: str | None = None
+) -> ReclassifyJob:
+    """Queue a reclassify-all job matching in ``mode`` (default ``settings.classification_mode``);
+    only one job may be queued or running at a time."""
+    jobs = ReclassifyJobRepository(db)
+    if jobs.get_active() is not None:
+        raise ValueError("reclassify_job_running")
+    job = jobs.create(
+        include_forced=include_forced,
+        chunk_size=chunk_size or settings.reclassify_chunk_size,
+        total_count=TextEntryRepository(db).count(),
+        mode=mode or settings.classification_mode,
+    )
+    db.commit()
+    return job
+
+
+def cancel_reclassify_job(db: Session, job_id: int) -> ReclassifyJob:
+    """Ask the worker to stop after its current chunk. Finished jobs are returned unchanged."""
+    job = ReclassifyJobRepository(db).get_by_id(job_id)
+    if job is None:
+        raise ValueError("job_not_found")
+    if job.status in ACTIVE_STATUSES:
+        job.cancel_requested = True
+        db.commit()
+    return job
+
+
+def launch_reclassify_worker(bind: Engine, embedding_client: EmbeddingClient, job_id: int) -> None:
+    """Run ``job_id`` on a daemon thread unless this process is already running it."""
+    with _workers_lock:
+        worker = _workers.get(job_id)
+        if worker is not None and worker.is_alive():
+            return
+        runner = ReclassifyJobRunner(sessionmaker(bind=bind, autocommit=False, autoflush=False), embedding_client)
+        worker = threading.Thread(target=runner.run, args=(job_id,), name=f"reclassify-job-{job_id}", daemon=True)
+        _workers[job_id] = worker
+        worker.start()
+
+
+def resume_reclassify_jobs(bind: Engine, embedding_client: EmbeddingClient) -> list[int]:
+    """Restart workers for jobs left queued/running by a previous process."""
+    with Session(bind) as db:
+        job_ids = ReclassifyJobRepository(db).list_active_ids()
+    for job_id in job_ids:
+        launch_reclassify_worker(bind, embedding_client, job_id)
+    return job_ids
+
+
+class ReclassifyJobRunner:
+    """Re-scores every stored entry against the current labels, like ``/classify`` in the job's mode.
+
+    Entries are read in keyset-paginated chunks (``id > last_entry_id``) and scored with their
+    stored embeddings; only entries without a usable embedding are sent to the embedding client.
+    Each chunk's entry updates and the job cursor are committed together, so a restarted worker
+    continues exactly where the last commit left off. Centroids are scored as they were when the
+    job started and rebuilt once at the end (also after a cancel). The copies of a text stored in
+    multi-label mode (consecutive ids) are re-scored together and stay spread over the labels that
+    fit; a chunk is extended to keep them together.
+    """
+
+    def __init__(self, session_factory: sessionmaker, embedding_client: EmbeddingClient):
+        self.session_factory = session_factory
+        self.embedding_client = embedding_client
+        self.owner = uuid.uuid4().hex
+
+    def run(self, job_id: int) -> None:
+        if not self._claim(job_id):
+            return
+        try:
+            while True:
+                with self.session_factory() as db:
+                    job = ReclassifyJobRepository(db).get_by_id(job_id)
+                    if job is None or job.owner != self.owner:
+                        return
+                    if job.cancel_requested:
+                        self._finish(db, job, "cancelled")
+                        return
+                    processed = self._run_chunk(db, job)
+                    if processed is None:
+                        return
+                    if processed == 0:
+                        self._finish(db, job, "completed")
+                        return
+        except Exception as e:
+            logger.exception("Reclassify job %s failed", job_id)
+            with self.session_factory() as db:
+                self._update_job(db, job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                db.commit()
+
+    def _claim(self, job_id: int) -> bool:
+        with self.session_factory() as db:
+            claimed = db.execute(
+                update(ReclassifyJob)
+                .where(ReclassifyJob.id == job_id, ReclassifyJob.status.in_(ACTIVE_STATUSES))
+                .values(status="running", owner=self.owner, updated_at=datetime.utcnow())
+            ).rowcount
+            db.commit()
+        return claimed == 1
+
+    def _run_chunk(self, db: Session, job: ReclassifyJob) -> int | None:
+        """Process and commit the next chunk; returns its size, or None if the job was taken over."""
+        repo = TextEntryRepository(db)
+        entries = repo.list_after(job.last_entry_id, job.chunk_size)
+        if not entries:
+            return 0
+        span = settings.multi_label_max_labels - 1
+        if len(entries) == job.chunk_size and span:
+            last = entries[-1]
+            entries += takewhile(lambda entry: entry.text == last.text, repo.list_after(last.id, span))
+
+        skipped = 0
+        if not job.include_forced:
+            skipped = sum(1 for entry in entries if entry.confidence == "forced")
+            candidates = [entry for entry in entries if entry.confidence != "forced"]
+        else:
+            candidates = entries
+
+        index = get_label_index(db).sync(db)
+        vectors = [entry.embedding for entry in candidates]
+        missing = [i for i, vector in enumerate(vectors) if vector is None or len(vector) != index.dim]
+        reembedded: list[tuple[int, np.ndarray]] = []
+        if missing and len(index):
+            fresh = embed_texts(self.embedding_client, [candidates[i].text for i in missing])
+            for i, vector in zip(missing, fresh):
+                candidates[i].set_embedding(vector, embedding_model_name(self.embedding_client))
+                vectors[i] = candidates[i].embedding
+                reembedded.append((candidates[i].id, vectors[i]))
+            dual_write(db, [candidates[i] for i in missing])
+
+        reclassified = failed = 0
+        if candidates:
+            groups: list[list[int]] = []
+            for i, entry in enumerate(candidates):
+                if groups and entry.text == candidates[groups[-1][0]].text and entry.id - candidates[groups[-1][0]].id <= span:
+                    groups[-1].append(i)
+                else:
+                    groups.append([i])
+            usable = [vector if vector is not None and len(vector) == index.dim else np.zeros(index.dim) for vector in vectors]
+            rescored = ClassificationService(db, self.embedding_client).rescore_copies(
+                [usable[group[0]] for group in groups],
+                [[(candidates[i].id, candidates[i].label_id) for i in group] for group in groups],
+                job.mode,
+            )
+            for group, (_, matches) in zip(groups, rescored):
+                for i, match in zip(group, matches):
+                    entry = candidates[i]
+                    if match is None:
+                        # Same safety rule as /classify: keep the current label rather than unlabel.
+                        failed += 1
+                        NO_LABEL_FIT.inc("reclassify_job")
+                        continue
+                    label_id, _, score, _ = match
+                    if entry.label_id != label_id:
+                        reclassified += 1
+                    entry.label_id = label_id
+                    entry.similarity_score = score
+                    entry.confidence = "high"
+        db.flush()
+
+        if not self._update_job(
+            db,
+            job.id,
+            last_entry_id=entries[-1].id,
+            scanned_count=job.scanned_count + len(entries),
+            reclassified_count=job.reclassified_count + reclassified,
+            skipped_count=job.skipped_count + skipped,
+            failed_count=job.failed_count + failed,
+        ):
+            db.rollback()
+            return None
+        db.commit()
+        entry_index = get_entry_index(db)
+        for entry_id, vector in reembedded:
+            entry_index.upsert(entry_id, vector)
+        return len(entries)
+
+    def _finish(self, db: Session, job: ReclassifyJob, status: str) -> None:
+        LabelEmbeddingService(db, self.embedding_client).rebuild_from_stored(LabelRepository(db).list_labels())
+        if not self._update_job(db, job.id, status=status, finished_at=datetime.utcnow()):
+            db.rollback()
+            return
+        db.commit()
+
+    def _update_job(self, db: Session, job_id: int, **values) -> bool:
+        """Write job progress only while this runner still owns the job."""
+        updated = db.execute(
+            update(ReclassifyJob)
+            .where(ReclassifyJob.id == job_id, ReclassifyJob.owner == self.owner)
+            .values(updated_at=datetime.utcnow(), **values)
+        ).rowcount
+        return updated == 1
@@ -1,5 +1,51 @@
-from app.services.embedding_service import EmbeddingClient, OllamaEmbeddingClient
+from functools import lru_cache
 
+from app.core.config import settings
+from app.services.embedding_coalescer import CoalescingEmbeddingClient
+from app.services.embedding_cache import AsyncCachingEmbeddingClient, CachingEmbeddingClient, SqliteEmbeddingStore
+from app.services.embedding_service import (
+    AsyncEmbeddingClient,
+    AsyncOllamaEmbeddingClient,
+    EmbeddingClient,
+    OllamaEmbeddingClient,
+)
 
-def build_embedding_client() -> EmbeddingClient:
+
+@lru_cache(maxsize=1)
+def build_ollama_client() -> OllamaEmbeddingClient:
+    """Process-wide Ollama client, so its keep-alive connection pool is shared by all requests."""
     return OllamaEmbeddingClient()
+
+
+@lru_cache(maxsize=1)
+def build_embedding_client() -> EmbeddingClient:
+    client = build_ollama_client()
+    if settings.embedding_cache_size <= 0:
+        return client
+    store = None
+    if settings.embedding_cache_path:
+        store = SqliteEmbeddingStore(settings.embedding_cache_path)
+    # model=None: the cache follows the active model, like the client, across a model migration.
+    return CachingEmbeddingClient(client, model=None, max_entries=settings.embedding_cache_size, store=store)
+
+
+@lru_cache(maxsize=1)
+def build_async_embedding_client() -> AsyncEmbeddingClient:
+    """Process-wide async client for the async routes; shares the embedding cache with the sync one."""
+    client: AsyncEmbeddingClient = AsyncOllamaEmbeddingClient(endpoint=build_ollama_client().endpoint)
+    if settings.embed_coalesce_window_ms > 0:
+        # Cache hits are answered before this point; only misses wait for the coalescing window.
+        client = CoalescingEmbeddingClient(
+            client,
+            window_ms=settings.embed_coalesce_window_ms,
+            max_batch=settings.embed_coalesce_max_batch,
+        )
+    sync_client = build_embedding_client()
+    if isinstance(sync_client, CachingEmbeddingClient):
+        return AsyncCachingEmbeddingClient(client, sync_client.cache)
+    return client
+
+
+def build_model_client(model: str) -> EmbeddingClient:
+    """Uncached Ollama client pinned to ``model`` (the target of an embedding model migration)."""
+    return OllamaEmbeddingClient(model=model)
@@ -0,0 +1,138 @@
+"""Entry counters behind ``GET /stats``.
+
+``entry_counters`` holds the number of entries per (label, confidence, score bucket). A session
+flush hook turns every ORM insert, update and delete of a ``TextEntry`` into counter deltas that
+are written in the same transaction, so the counters commit or roll back with the entries. Bulk
+inserts that bypass the ORM apply their deltas with ``StatsRepository.apply`` themselves. A
+periodic reconciliation recounts everything from ``text_entries`` to repair any drift.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.text_entry import TextEntry
+from app.repositories.centroid_delta_repository import CentroidDeltaRepository
+from app.repositories.label_repository import LabelRepository
+from app.repositories.stats_repository import NO_SCORE, SCORE_BINS, StatsRepository, counter_key
+
+logger = logging.getLogger(__name__)
+
+_COUNTED = ("label_id", "confidence", "similarity_score")
+
+
+def get_stats(db: Session) -> dict:
+    """Totals, per-confidence and per-label counts and score histograms, in O(labels)."""
+    labels = LabelRepository(db).list_names()
+    per_label: dict[int, int] = defaultdict(int)
+    per_confidence: dict[str, int] = defaultdict(int)
+    histogram = [0] * SCORE_BINS
+    label_histograms: dict[int, list[int]] = defaultdict(lambda: [0] * SCORE_BINS)
+    for label_id, confidence, bucket, count in StatsRepository(db).list_counters():
+        per_label[label_id] += count
+        per_confidence[confidence or "none"] += count
+        if bucket != NO_SCORE:
+            histogram[bucket] += count
+            label_histograms[label_id][bucket] += count
+
+    pending, pending_labels, oldest = CentroidDeltaRepository(db).summary()
+    deferred = settings.centroid_update_mode == "deferred"
+
+    width = 2.0 / SCORE_BINS
+    return {
+        "labels_count": len(labels),
+        "classified_entries_count": sum(count for label_id, count in per_label.items() if label_id),
+        "unclassified_entries_count": per_label.get(0, 0),
+        "confidence_counts": dict(per_confidence),
+        "score_histogram": [
+            {"lower": round(-1.0 + i * width, 4), "upper": round(-1.0 + (i + 1) * width, 4), "count": count}
+            for i, count in enumerate(histogram)
+        ],
+        "labels": [
+            {"name": name, "entries_count": per_label.get(label_id, 0), "score_histogram": label_histograms[label_id]}
+            for label_id, name in labels
+        ],
+        "centroids": {
+            "mode": settings.centroid_update_mode,
+            "pending_updates": pending,
+            "pending_labels": pending_labels,
+            "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else None,
+            # Nominal lag of a centroid behind its entries (excluding the flush itself).
+            "staleness_bound_ms": settings.centroid_flush_interval_ms if deferred else 0.0,
+        },
+    }
+
+
+def reconcile_stats(bind: Engine) -> None:
+    with Session(bind) as db:
+        StatsRepository(db).reconcile()
+        db.commit()
+
+
+def ensure_stats(bind: Engine) -> bool:
+    """Build the counters once for a database that has none yet; returns True if it did."""
+    with Session(bind) as db:
+        if not StatsRepository(db).is_empty():
+            return False
+    reconcile_stats(bind)
+    return True
+
+
+class StatsReconciler:
+    """Background thread running ``reconcile_stats`` every ``interval`` seconds."""
+
+    def __init__(self, bind: Engine, interval: float):
+        self.bind = bind
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-reconciler", daemon=True)
+
+    def start(self) -> "StatsReconciler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                reconcile_stats(self.bind)
+            except Exception:
+                logger.exception("Stats reconciliation failed")
+
+
+def _committed(obj: TextEntry, key: str):
+    """Value of ``key`` as last flushed (before this flush's change, if any)."""
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+@event.listens_for(Session, "before_flush")
+def _count_entry_changes(session: Session, flush_context, instances) -> None:
+    # before_flush, so previous values can still be loaded for rows about to be deleted.
+    deltas: Counter = Counter()
+    for obj in session.new:
+        if isinstance(obj, TextEntry):
+            deltas[counter_key(obj.label_id, obj.confidence, obj.similarity_score)] += 1
+    for obj in session.deleted:
+        if isinstance(obj, TextEntry):
+            deltas[counter_key(*(_committed(obj, key) for key in _COUNTED))] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, TextEntry):
+            state = inspect(obj)
+            if any(state.attrs[key].history.has_changes() for key in _COUNTED):
+                deltas[counter_key(*(_committed(obj, key) for key in _COUNTED))] -= 1
+                deltas[counter_key(obj.label_id, obj.confidence, obj.similarity_score)] += 1
+    if deltas:
+        StatsRepository(session).apply(deltas)
@@ -0,0 +1,428 @@
+"""Approximate nearest-neighbour backends for the label index.
+
+Backends only generate candidate ids for a batch of normalized queries; ``LabelIndex`` re-scores
+the candidates exactly against its centroid matrix, so reported similarities never depend on the
+backend. ``IVFIndex`` and ``CompressedIndex`` are pure NumPy; ``HNSWIndex`` needs the optional
+``hnswlib`` package.
+"""
+import os
+from typing import Protocol
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
+
+try:
+    import hnswlib
+except ImportError:  # optional: only needed for VECTOR_INDEX=hnsw
+    hnswlib = None
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column positions and values of the ``k`` largest scores of each row, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.int64), np.empty((len(scores), 0), dtype=scores.dtype)
+    if k < scores.shape[1]:
+        positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        positions = np.broadcast_to(np.arange(k), scores.shape).copy()
+    values = np.take_along_axis(scores, positions, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(positions, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class VectorIndex(Protocol):
+    kind: str
+
+    @property
+    def dim(self) -> int: ...
+
+    @property
+    def ids(self) -> set[int]: ...
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray) -> None: ...
+
+    def upsert(self, ids: np.ndarray, vectors: np.ndarray) -> None: ...
+
+    def remove(self, ids: list[int]) -> None: ...
+
+    def candidates(self, queries: np.ndarray, k: int) -> list[np.ndarray]: ...
+
+    def save(self, path: str) -> None: ...
+
+    def load(self, path: str, dim: int) -> bool: ...
+
+
+def spherical_kmeans(matrix: np.ndarray, nlist: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit-norm k-means centroids of the (normalized) rows of ``matrix``."""
+    sample = matrix
+    if len(matrix) > nlist * 256:
+        sample = matrix[rng.choice(len(matrix), nlist * 256, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        one_hot = np.zeros((len(sample), nlist), dtype=np.float32)
+        one_hot[np.arange(len(sample)), assignment] = 1.0
+        sums = one_hot.T @ sample
+        empty = one_hot.sum(axis=0) == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index: rows are bucketed under the nearest of ``nlist`` k-means centroids and a
+    query only visits its ``nprobe`` nearest buckets. Higher ``nprobe`` = better recall, slower."""
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self._centroids: np.ndarray | None = None
+        self._lists: list[np.ndarray] = []
+        self._list_of: dict[int, int] = {}
+
+    @property
+    def dim(self) -> int:
+        return 0 if self._centroids is None else self._centroids.shape[1]
+
+    @property
+    def ids(self) -> set[int]:
+        return set(self._list_of)
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray) -> None:
+        # 0 = sqrt(n) lists, the usual starting point.
+        nlist = min(self.nlist or max(1, int(round(np.sqrt(len(ids))))), len(ids))
+        self._centroids = spherical_kmeans(matrix, nlist, self.iterations, np.random.default_rng(self.seed))
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._list_of = {}
+        self.upsert(ids, matrix)
+
+    def upsert(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        self.remove(ids.tolist())
+        assignment = np.argmax(np.asarray(vectors, dtype=np.float32) @ self._centroids.T, axis=1)
+        for list_no in np.unique(assignment):
+            self._lists[list_no] = np.concatenate([self._lists[list_no], ids[assignment == list_no]])
+        self._list_of.update(zip(ids.tolist(), assignment.tolist()))
+
+    def remove(self, ids: list[int]) -> None:
+        by_list: dict[int, list[int]] = {}
+        for ident in ids:
+            list_no = self._list_of.pop(int(ident), None)
+            if list_no is not None:
+                by_list.setdefault(list_no, []).append(int(ident))
+        for list_no, members in by_list.items():
+            self._lists[list_no] = self._lists[list_no][~np.isin(self._lists[list_no], members)]
+
+    def candidates(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        probes, _ = top_k_rows(queries @ self._centroids.T, self.nprobe)
+        return [np.concatenate([self._lists[list_no] for list_no in row]) for row in probes]
+
+    def save(self, path: str) -> None:
+        sizes = np.array([len(members) for members in self._lists], dtype=np.int64)
+        members = np.concatenate(self._lists) if self._lists else np.empty(0, dtype=np.int64)
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self._centroids, sizes=sizes, members=members)
+
+    def load(self, path: str, dim: int) -> bool:
+        with np.load(path) as data:
+            centroids, sizes, members = data["centroids"], data["sizes"], data["members"]
+        if centroids.ndim != 2 or centroids.shape[1] != dim:
+            return False
+        self._centroids = centroids.astype(np.float32)
+        self._lists = list(np.split(members.astype(np.int64), np.cumsum(sizes)[:-1]))
+        self._list_of = {int(ident): list_no for list_no, row in enumerate(self._lists) for ident in row}
+        return True
+
+
+class HNSWIndex:
+    """Hierarchical navigable small-world graph (hnswlib). ``ef_search`` trades latency for recall;
+    ``m`` and ``ef_construction`` set graph quality at build time."""
+
+    kind = "hnsw"
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        if hnswlib is None:
+            raise RuntimeError("VECTOR_INDEX=hnsw requires the optional 'hnswlib' package")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = None
+        self._ids: set[int] = set()
+
+    @property
+    def dim(self) -> int:
+        return 0 if self._index is None else self._index.dim
+
+    @property
+    def ids(self) -> set[int]:
+        return set(self._ids)
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray) -> None:
+        self._index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        self._index.init_index(
+            max_elements=max(2 * len(ids), 16),
+            ef_construction=self.ef_construction,
+            M=self.m,
+        )
+        self._ids = set()
+        self.upsert(ids, matrix)
+
+    def upsert(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        # Deleted elements keep their slot, so size against everything ever added.
+        needed = self._index.get_current_count() + len(ids)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(2 * needed)
+        # Existing ids are updated in place; deleted ones are restored.
+        self._index.add_items(np.asarray(vectors, dtype=np.float32), ids)
+        self._ids.update(ids.tolist())
+
+    def remove(self, ids: list[int]) -> None:
+        for ident in ids:
+            if int(ident) in self._ids:
+                self._ids.discard(int(ident))
+                try:
+                    self._index.mark_deleted(int(ident))
+                except RuntimeError:
+                    pass  # already deleted before the index was saved
+
+    def candidates(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        k = min(k, len(self._ids))
+        if k <= 0:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+        self._index.set_ef(max(self.ef_search, k))
+        labels, _ = self._index.knn_query(np.asarray(queries, dtype=np.float32), k=k)
+        return list(labels.astype(np.int64))
+
+    def save(self, path: str) -> None:
+        self._index.save_index(path)
+
+    def load(self, path: str, dim: int) -> bool:
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(path)
+        self._index = index
+        # Includes ids deleted before saving; the caller removes whatever is no longer live.
+        self._ids = set(int(ident) for ident in index.get_ids_list())
+        return True
+
+
+# Rows the PCA basis is fitted on; enough for a stable top of the spectrum.
+_PCA_SAMPLE = 4096
+# Bytes of dequantized rows scored per matmul.
+_SCAN_BYTES = 16 * 1024 * 1024
+
+
+class CompressedIndex:
+    """Rows projected to ``dim`` dimensions (0 keeps them all) and scalar-quantized to int8.
+
+    ``projection="pca"`` learns the basis from the rows at build time (uncentered, so it keeps
+    the directions that carry the inner products); ``"random"`` is a fixed random orthogonal
+    basis. Queries scan the codes, 4x fewer bytes than the float32 matrix (times the projection
+    ratio), and return the ``candidates`` best rows for the owning index to re-score exactly.
+    The owners keep no float32 rows next to the codes: they re-score from the database or the
+    memory-mapped entry store. Saved files carry the embedding model active when they were
+    written and are ignored once another model is active.
+    """
+
+    kind = "compressed"
+
+    def __init__(self, dim: int = 0, projection: str = "pca", candidates: int = 64, seed: int = 0):
+        self.target_dim = dim
+        self.projection = projection
+        self.candidates_count = candidates
+        self.seed = seed
+        self._input_dim = 0
+        self._basis: np.ndarray | None = None
+        self._scale = np.empty(0, dtype=np.float32)
+        self._reset(0)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    @property
+    def dim(self) -> int:
+        return self._input_dim
+
+    @property
+    def ids(self) -> set[int]:
+        return set(self._positions)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held for the live rows' codes plus the projection."""
+        basis = 0 if self._basis is None else self._basis.nbytes
+        return len(self._positions) * self._codes.shape[1] + basis + self._scale.nbytes
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray) -> None:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        self._input_dim = matrix.shape[1]
+        self._basis = self._fit_basis(matrix)
+        projected = self._project(matrix)
+        self._scale = (np.maximum(np.abs(projected).max(axis=0), 1e-6) / 127.0).astype(np.float32)
+        self._reset(projected.shape[1])
+        self.upsert(ids, matrix)
+
+    def upsert(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        codes = self._quantize(self._project(np.asarray(vectors, dtype=np.float32)))
+        new = []
+        for i, ident in enumerate(ids.tolist()):
+            pos = self._positions.get(ident)
+            if pos is None:
+                new.append(i)
+            else:
+                self._codes[pos] = codes[i]
+        if not new:
+            return
+        needed = self._size + len(new)
+        if needed > len(self._ids):
+            capacity = max(needed, 2 * len(self._ids), 1024)
+            self._codes = np.concatenate([self._codes, np.zeros((capacity - len(self._ids), self._codes.shape[1]), dtype=np.int8)])
+            self._ids = np.concatenate([self._ids, np.zeros(capacity - len(self._ids), dtype=np.int64)])
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        self._codes[self._size : needed] = codes[new]
+        self._ids[self._size : needed] = ids[new]
+        self._alive[self._size : needed] = True
+        self._positions.update(zip(ids[new].tolist(), range(self._size, needed)))
+        self._size = needed
+
+    def remove(self, ids: list[int]) -> None:
+        for ident in ids:
+            pos = self._positions.pop(int(ident), None)
+            if pos is not None:
+                self._alive[pos] = False
+        if self._size and len(self._positions) * 2 < self._size:
+            keep = np.flatnonzero(self._alive[: self._size])
+            codes, kept_ids = self._codes[keep], self._ids[keep]
+            self._reset(self._codes.shape[1])
+            self._codes, self._ids, self._alive = codes, kept_ids, np.ones(len(keep), dtype=bool)
+            self._positions = {ident: pos for pos, ident in enumerate(kept_ids.tolist())}
+            self._size = len(keep)
+
+    def candidates(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        n = max(k, self.candidates_count)
+        # Dequantization is folded into the queries: q . (scale * code) = (q * scale) . code.
+        scaled = self._project(np.asarray(queries, dtype=np.float32)) * self._scale
+        chunk = max(1, _SCAN_BYTES // (4 * max(1, self._codes.shape[1])))
+        best_pos = np.empty((len(scaled), 0), dtype=np.int64)
+        best_val = np.empty((len(scaled), 0), dtype=np.float32)
+        for start in range(0, self._size, chunk):
+            end = min(start + chunk, self._size)
+            block = scaled @ self._codes[start:end].astype(np.float32).T
+            block[:, ~self._alive[start:end]] = -np.inf
+            pos, val = top_k_rows(block, n)
+            merged_pos = np.concatenate([best_pos, pos + start], axis=1)
+            top, best_val = top_k_rows(np.concatenate([best_val, val], axis=1), n)
+            best_pos = np.take_along_axis(merged_pos, top, axis=1)
+        return [self._ids[row[values > -np.inf]] for row, values in zip(best_pos, best_val)]
+
+    def save(self, path: str) -> None:
+        live = np.flatnonzero(self._alive[: self._size])
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                model=active_embedding_model(),
+                projection=self.projection,
+                target_dim=self.target_dim,
+                input_dim=self._input_dim,
+                basis=np.empty((0, 0), dtype=np.float32) if self._basis is None else self._basis,
+                scale=self._scale,
+                ids=self._ids[live],
+                codes=self._codes[live],
+            )
+
+    def load(self, path: str, dim: int) -> bool:
+        with np.load(path) as data:
+            if (
+                str(data["model"]) != active_embedding_model()
+                or str(data["projection"]) != self.projection
+                or int(data["target_dim"]) != self.target_dim
+                or int(data["input_dim"]) != dim
+            ):
+                return False
+            basis, scale, ids, codes = data["basis"], data["scale"], data["ids"], data["codes"]
+        self._input_dim = dim
+        self._basis = basis.astype(np.float32) if basis.size else None
+        self._scale = scale.astype(np.float32)
+        self._reset(len(self._scale))
+        self._codes, self._ids = codes.astype(np.int8), ids.astype(np.int64)
+        self._alive = np.ones(len(ids), dtype=bool)
+        self._positions = {ident: pos for pos, ident in enumerate(self._ids.tolist())}
+        self._size = len(ids)
+        return True
+
+    def _reset(self, code_dim: int) -> None:
+        self._size = 0
+        self._codes = np.zeros((0, code_dim), dtype=np.int8)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._positions: dict[int, int] = {}
+
+    def _fit_basis(self, matrix: np.ndarray) -> np.ndarray | None:
+        if not self.target_dim or self.target_dim >= matrix.shape[1]:
+            return None
+        rng = np.random.default_rng(self.seed)
+        if self.projection == "random":
+            basis, _ = np.linalg.qr(rng.normal(size=(matrix.shape[1], self.target_dim)))
+            return basis.astype(np.float32)
+        sample = matrix
+        if len(matrix) > _PCA_SAMPLE:
+            sample = matrix[rng.choice(len(matrix), _PCA_SAMPLE, replace=False)]
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        return np.ascontiguousarray(vt[: self.target_dim].T, dtype=np.float32)
+
+    def _project(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors if self._basis is None else vectors @ self._basis
+
+    def _quantize(self, projected: np.ndarray) -> np.ndarray:
+        # Rows added after the build may exceed the fitted range; they are clipped, and the exact
+        # re-score makes up for it.
+        return np.clip(np.rint(projected / self._scale), -127, 127).astype(np.int8)
+
+
+def build_vector_index() -> VectorIndex | None:
+    """Backend selected by ``settings.vector_index`` (None for exact scans)."""
+    if settings.vector_index == "ivf":
+        return IVFIndex(nlist=settings.ivf_nlist, nprobe=settings.ivf_nprobe)
+    if settings.vector_index == "hnsw":
+        return HNSWIndex(m=settings.hnsw_m, ef_construction=settings.hnsw_ef_construction, ef_search=settings.hnsw_ef_search)
+    if settings.vector_index == "compressed":
+        return CompressedIndex(
+            dim=settings.vector_compression_dim,
+            projection=settings.vector_compression_projection,
+            candidates=settings.vector_compression_candidates,
+        )
+    return None
+
+
+def index_path_for(bind, name: str) -> str | None:
+    """``<db file stem>.<name>`` next to a SQLite database (or in ``settings.vector_index_dir``)."""
+    database = bind.url.database if bind.dialect.name == "sqlite" else None
+    if database and database != ":memory:" and not database.startswith("file:"):
+        stem = os.path.splitext(os.path.abspath(database))[0]
+        if settings.vector_index_dir:
+            stem = os.path.join(settings.vector_index_dir, os.path.basename(stem))
+        return f"{stem}.{name}"
+    if settings.vector_index_dir:
+        return os.path.join(settings.vector_index_dir, name)
+    return None
@@ -0,0 +1,4 @@
+"""Offline benchmark harness: a fake Ollama server, a dataset generator and timed scenarios.
+
+Run ``python -m benchmarks.run --help``.
+"""
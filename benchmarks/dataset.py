@@ -0,0 +1,119 @@
+"""Synthetic labels and entries with real cluster structure, written straight to a database.
+
+Label ``k`` is described by eight topic words; its entries use five of them plus one filler
+word, so they embed (with ``FakeEmbedder``) well above the default similarity threshold to
+their own label and near zero to the others.
+"""
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.label_utils import definition_hash
+from app.models.label import Label
+from app.models.text_entry import TextEntry
+from app.repositories.stats_repository import StatsRepository
+from app.services.label_embedding_service import LabelEmbeddingService
+from benchmarks.fake_ollama import FakeEmbedder
+
+_TOPIC_WORDS = 8
+_ENTRY_TOPIC_WORDS = 5
+_FILLER_WORDS = 1000
+
+
+class EmbedderClient:
+    """``EmbeddingClient`` over a ``FakeEmbedder``, without the HTTP round-trip."""
+
+    provider_name = "fake"
+
+    def __init__(self, embedder: FakeEmbedder):
+        self.embedder = embedder
+
+    def get_embedding(self, text: str) -> list[float]:
+        return self.embedder.embed([text])[0].tolist()
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self.embedder.embed(texts).tolist()
+
+
+class BenchmarkDataset:
+    def __init__(self, labels: int, entries: int, seed: int = 0):
+        self.labels = labels
+        self.entries = entries
+        self.rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def label_name(k: int) -> str:
+        return f"topic_{k:06d}"
+
+    @staticmethod
+    def definition(k: int) -> str:
+        return f"texts about topic {k} " + " ".join(f"t{k}w{j}" for j in range(_TOPIC_WORDS))
+
+    def random_label(self) -> int:
+        return int(self.rng.integers(self.labels))
+
+    def entry_text(self, k: int) -> str:
+        words = [f"t{k}w{j}" for j in self.rng.choice(_TOPIC_WORDS, _ENTRY_TOPIC_WORDS, replace=False)]
+        return " ".join(words) + f" w{self.rng.integers(_FILLER_WORDS)}"
+
+    def populate(self, engine: Engine, embedder: FakeEmbedder, chunk_size: int = 10000) -> None:
+        """Insert the labels, then the entries in committed chunks, then each label's centroid
+        and the /stats counters, in the same state the app would have built incrementally."""
+        definitions = np.zeros((self.labels, embedder.dim), dtype=np.float32)
+        with Session(engine) as db:
+            label_ids = []
+            for start in range(0, self.labels, chunk_size):
+                ks = range(start, min(start + chunk_size, self.labels))
+                vectors = embedder.embed([self.definition(k) for k in ks])
+                definitions[start : start + len(vectors)] = vectors
+                rows = [
+                    dict(
+                        name=self.label_name(k),
+                        definition=self.definition(k),
+                        centroid_vec=vector,
+                        definition_embedding_vec=vector,
+                        definition_model=settings.ollama_embedding_model,
+                        definition_hash=definition_hash(self.definition(k)),
+                        usage_count=0,
+                    )
+                    for k, vector in zip(ks, vectors)
+                ]
+                label_ids.extend(
+                    db.execute(insert(Label).returning(Label.id, sort_by_parameter_order=True), rows).scalars().all()
+                )
+            db.commit()
+
+            sums = np.zeros((self.labels, embedder.dim), dtype=np.float64)
+            counts = np.zeros(self.labels, dtype=np.int64)
+            for start in range(0, self.entries, chunk_size):
+                ks = self.rng.integers(self.labels, size=min(chunk_size, self.entries - start))
+                texts = [self.entry_text(int(k)) for k in ks]
+                vectors = embedder.embed(texts)
+                scores = np.einsum("ij,ij->i", vectors, definitions[ks])
+                db.execute(
+                    insert(TextEntry),
+                    [
+                        dict(
+                            text=text,
+                            label_id=label_ids[k],
+                            similarity_score=float(score),
+                            confidence="high",
+                            embedding_vec=vector,
+                        )
+                        for text, k, score, vector in zip(texts, ks.tolist(), scores, vectors)
+                    ],
+                )
+                db.commit()
+                np.add.at(sums, ks, vectors)
+                counts += np.bincount(ks, minlength=self.labels)
+
+            service = LabelEmbeddingService(db, EmbedderClient(embedder))
+            position = {label_id: k for k, label_id in enumerate(label_ids)}
+            for label in db.scalars(select(Label)):
+                k = position[label.id]
+                if counts[k]:
+                    service.add_sum(label, sums[k], int(counts[k]))
+            StatsRepository(db).reconcile()
+            db.commit()
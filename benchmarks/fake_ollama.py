@@ -0,0 +1,125 @@
+"""Local stand-in for the Ollama embedding API, with configurable latency and dimension.
+
+Usage: python -m benchmarks.fake_ollama [--port 11435] [--dim 768] [--latency-ms 20]
+
+Serves ``/api/embed`` (batch) and the legacy ``/api/embeddings``. Embeddings are deterministic:
+a text is the normalized sum of its tokens' vectors, so texts sharing words are similar, which
+lets generated datasets have real label structure.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Each token is the signed sum of two rows of a fixed random table: ~2^30 distinct, nearly
+# orthogonal token vectors from a table small enough for any dimension.
+_TABLE_ROWS = 1 << 14
+
+
+class FakeEmbedder:
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.table = np.random.default_rng(seed).standard_normal((_TABLE_ROWS, dim)).astype(np.float32)
+
+    def _token(self, token: str) -> np.ndarray:
+        h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        first, second = h % _TABLE_ROWS, (h >> 16) % _TABLE_ROWS
+        sign = 1.0 if (h >> 32) & 1 else -1.0
+        return self.table[first] + sign * self.table[second]
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """``(len(texts), dim)`` float32 rows of unit norm (zero rows for empty texts)."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                out[i] += self._token(token)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+class FakeOllamaServer:
+    """Threaded HTTP server on ``host:port`` (port 0 picks a free one); use as a context manager."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0, host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.embedder = FakeEmbedder(dim, seed)
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; with Nagle on, the body would wait for
+            # the client's delayed ACK (~40 ms) and swamp every measurement.
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if self.path == "/api/embed":
+                    texts = payload.get("input", [])
+                    texts = [texts] if isinstance(texts, str) else texts
+                    body = {"model": payload.get("model"), "embeddings": server.embedder.embed(texts).tolist()}
+                elif self.path == "/api/embeddings":
+                    body = {"embedding": server.embedder.embed([payload.get("prompt", "")])[0].tolist()}
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(dim=args.dim, latency_ms=args.latency_ms, host=args.host, port=args.port)
+    print(f"Fake Ollama on {server.url} (dim={args.dim}, latency={args.latency_ms} ms); Ctrl+C to stop")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Time the hot paths against a generated dataset and a fake Ollama server.
+
+Usage:
+    python -m benchmarks.run [--labels 10,1000] [--entries 1000] [--dim 64] [--latency-ms 0]
+                             [--repeat 20] [--out results.json] [--compare baseline.json]
+
+Every (labels, entries) combination gets a fresh SQLite database in a temporary directory.
+Results are written as JSON; ``--compare`` exits with status 1 when a scenario's median is
+more than ``--tolerance`` slower than in the baseline file.
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.entries import delete_entry, reclasify_entry
+from app.api.routes.labels import create_label
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import build_engine
+from app.schemas.classification import CreateLabelRequest, ReclassifiedItemRequest
+from app.services.classification_service import BatchItem, ClassificationService
+from app.services.embedding_service import OllamaEmbeddingClient
+from app.services.reclassify_job_service import ReclassifyJobRunner, start_reclassify_job
+from benchmarks.dataset import BenchmarkDataset
+from benchmarks.fake_ollama import FakeOllamaServer
+
+RESULTS_VERSION = 1
+PRESETS = {
+    "quick": ([10, 1000], [1000]),
+    "full": ([10, 1000, 100000], [1000, 1000000]),
+}
+
+
+@dataclass
+class Context:
+    dataset: BenchmarkDataset
+    session_factory: sessionmaker
+    client: OllamaEmbeddingClient
+    mode: str
+    batch_size: int
+    # Entry ids not yet deleted, split so scenarios never touch the same entry twice.
+    free_ids: list[int] = field(default_factory=list)
+    created_labels: int = 0
+
+    def take_entry_id(self) -> int:
+        return self.free_ids.pop()
+
+
+def classify_single(ctx: Context) -> None:
+    text = ctx.dataset.entry_text(ctx.dataset.random_label())
+    with ctx.session_factory() as db:
+        try:
+            ClassificationService(db, ctx.client).classify(text, mode=ctx.mode)
+        except ValueError:
+            pass  # no_label_fit is a normal outcome, timed like the others
+
+
+def classify_batch(ctx: Context) -> None:
+    dataset = ctx.dataset
+    items = [BatchItem(text=dataset.entry_text(dataset.random_label()), mode=ctx.mode) for _ in range(ctx.batch_size)]
+    with ctx.session_factory() as db:
+        ClassificationService(db, ctx.client).classify_batch(items)
+
+
+def reclassify_entry(ctx: Context) -> None:
+    with ctx.session_factory() as db:
+        reclasify_entry(ctx.take_entry_id(), ReclassifiedItemRequest(), db=db, embedding_client=ctx.client)
+
+
+def delete_entry_with_recompute(ctx: Context) -> None:
+    with ctx.session_factory() as db:
+        delete_entry(ctx.take_entry_id(), db=db, embedding_client=ctx.client)
+
+
+def create_new_label(ctx: Context) -> None:
+    k = ctx.dataset.labels + ctx.created_labels
+    ctx.created_labels += 1
+    with ctx.session_factory() as db:
+        create_label(
+            CreateLabelRequest(name=ctx.dataset.label_name(k), definition=ctx.dataset.definition(k)),
+            db=db,
+            embedding_client=ctx.client,
+        )
+
+
+def reclassify_all(ctx: Context) -> None:
+    with ctx.session_factory() as db:
+        job_id = start_reclassify_job(db).id
+    ReclassifyJobRunner(ctx.session_factory, ctx.client).run(job_id)
+
+
+@dataclass
+class Scenario:
+    run: Callable[[Context], None]
+    # Items handled per call, for ops_per_second.
+    ops: Callable[[Context], int] = lambda ctx: 1
+    max_iterations: int | None = None
+    warmup: bool = True
+    # Consumes one entry id per call.
+    uses_entry: bool = False
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "classify_single": Scenario(classify_single),
+    "classify_batch": Scenario(classify_batch, ops=lambda ctx: ctx.batch_size),
+    "reclassify_entry": Scenario(reclassify_entry, uses_entry=True),
+    "delete_entry": Scenario(delete_entry_with_recompute, uses_entry=True),
+    "create_label": Scenario(create_new_label),
+    # A full pass over the corpus: few iterations and no warm-up.
+    "reclassify_all": Scenario(reclassify_all, ops=lambda ctx: ctx.dataset.entries, max_iterations=3, warmup=False),
+}
+
+
+def summarize(timings: list[float], ops: int) -> dict:
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    return {
+        "iterations": len(ordered),
+        "min_s": ordered[0],
+        "median_s": median,
+        "mean_s": statistics.fmean(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "max_s": ordered[-1],
+        "stdev_s": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "ops_per_second": ops / median if median > 0 else None,
+    }
+
+
+def run_scale(
+    labels: int,
+    entries: int,
+    dim: int = 64,
+    latency_ms: float = 0.0,
+    repeat: int = 20,
+    batch_size: int = 100,
+    mode: str = "centroid",
+    scenarios: list[str] | None = None,
+    seed: int = 0,
+    log: Callable[[str], None] = lambda message: None,
+) -> list[dict]:
+    """Run ``scenarios`` (default: all) against one generated dataset; one result dict each."""
+    scenarios = scenarios or list(SCENARIOS)
+    with tempfile.TemporaryDirectory() as tmp, FakeOllamaServer(dim=dim, latency_ms=latency_ms, seed=seed) as server:
+        engine = build_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(bind=engine)
+        dataset = BenchmarkDataset(labels, entries, seed=seed)
+        started = time.perf_counter()
+        dataset.populate(engine, server.embedder)
+        log(f"labels={labels} entries={entries}: dataset built in {time.perf_counter() - started:.1f}s")
+
+        ctx = Context(
+            dataset=dataset,
+            session_factory=sessionmaker(bind=engine, autocommit=False, autoflush=False),
+            client=OllamaEmbeddingClient(host=server.url, batch_size=max(batch_size, 1)),
+            mode=mode,
+            batch_size=batch_size,
+            free_ids=np.random.default_rng(seed).permutation(np.arange(1, entries + 1)).tolist(),
+        )
+        results = []
+        try:
+            for name in scenarios:
+                scenario = SCENARIOS[name]
+                iterations = min(repeat, scenario.max_iterations or repeat)
+                if scenario.uses_entry:
+                    iterations = min(iterations, len(ctx.free_ids) - scenario.warmup)
+                if iterations <= 0:
+                    continue
+                if scenario.warmup:
+                    scenario.run(ctx)  # index loads, connection pool, first-call costs
+                timings = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    scenario.run(ctx)
+                    timings.append(time.perf_counter() - start)
+                result = {"scenario": name, "labels": labels, "entries": entries, "dim": dim, "mode": mode}
+                result.update(summarize(timings, scenario.ops(ctx)))
+                results.append(result)
+                log(f"  {name:<18} median {result['median_s'] * 1000:9.2f} ms  p95 {result['p95_s'] * 1000:9.2f} ms")
+        finally:
+            ctx.client.close()
+            engine.dispose()
+    return results
+
+
+def result_key(result: dict) -> tuple:
+    return (result["scenario"], result["labels"], result["entries"], result["dim"], result.get("mode", "centroid"))
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """Results whose median is more than ``tolerance`` (a fraction) slower than the baseline's."""
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None or before["median_s"] <= 0:
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        if ratio > 1.0 + tolerance:
+            regressions.append({**result, "baseline_median_s": before["median_s"], "ratio": ratio})
+    return regressions
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), help="Label/entry counts (overridden by --labels/--entries)")
+    parser.add_argument("--labels", type=_int_list, help="Comma-separated label counts")
+    parser.add_argument("--entries", type=_int_list, help="Comma-separated entry counts")
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake Ollama latency per request")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=100, help="Texts per classify_batch call")
+    parser.add_argument("--mode", choices=["centroid", "knn"], default="centroid")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Repeatable; default all")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results JSON here (default stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed median slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    preset_labels, preset_entries = PRESETS[args.preset or "quick"]
+    labels_list = args.labels or preset_labels
+    entries_list = args.entries or preset_entries
+
+    # Benchmarks measure the database path only; keep side stores out of the way.
+    settings.entry_store_enabled = False
+
+    def log(message: str) -> None:
+        print(message, file=sys.stderr, flush=True)
+
+    results = []
+    for labels, entries in itertools.product(labels_list, entries_list):
+        results.extend(
+            run_scale(
+                labels,
+                entries,
+                dim=args.dim,
+                latency_ms=args.latency_ms,
+                repeat=args.repeat,
+                batch_size=args.batch_size,
+                mode=args.mode,
+                scenarios=args.scenario,
+                seed=args.seed,
+                log=log,
+            )
+        )
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            log(
+                f"REGRESSION {regression['scenario']} labels={regression['labels']} entries={regression['entries']}: "
+                f"{regression['baseline_median_s'] * 1000:.2f} ms -> {regression['median_s'] * 1000:.2f} ms "
+                f"(x{regression['ratio']:.2f})"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Compact (or rebuild) the memory-mapped entry embedding store.
+
+Usage: python -m scripts.compact_embeddings [--rebuild]
+
+Compaction drops superseded rows and tombstones; --rebuild rewrites the store from the database,
+e.g. after changing OLLAMA_EMBEDDING_MODEL. Run it while the API is stopped: running workers keep
+serving the old mapping until they notice the replaced file.
+"""
+import argparse
+
+from app.core.config import settings
+from app.db.session import SessionLocal, engine
+from app.services.embedding_store import EmbeddingStore
+from app.services.vector_index import index_path_for
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", help="Rewrite the store from the database")
+    args = parser.parse_args()
+
+    path = settings.entry_store_path or index_path_for(engine, "embeddings")
+    if path is None:
+        raise SystemExit("No store path: set ENTRY_STORE_PATH (the database is not a SQLite file)")
+    store = EmbeddingStore(path, model=settings.ollama_embedding_model, dtype=settings.vector_storage_dtype)
+
+    if args.rebuild:
+        with SessionLocal() as db:
+            written = store.rebuild(db)
+        print(f"Rebuilt {path}: {written} entries")
+        return
+
+    before, after = store.compact()
+    print(f"Compacted {path}: {before} rows -> {after}")
+
+
+if __name__ == "__main__":
+    main()
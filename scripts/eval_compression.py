@@ -0,0 +1,187 @@
+"""Measure the compressed vector index against exact scans on the current database.
+
+Usage: python -m scripts.eval_compression [--dim 256] [--projection pca|random] [--candidates 64]
+                                          [--k 10] [--queries 1000] [--page-size 5000]
+
+Queries are a random sample of stored entry embeddings. They are searched against the label
+centroids and against the remaining entries (held out, so a query never finds itself). For
+each table it reports recall@1 / recall@k of the compressed search relative to an exact scan,
+the top-1 score lost on misses, the bytes a query scans, and query time. Like the app, the
+compressed search keeps only the int8 codes and re-scores its candidates from rows read back
+from the database, so the compressed query time includes those reads. Vectors are read
+``--page-size`` rows at a time; only the queries and the codes are held in memory. Defaults
+come from the VECTOR_COMPRESSION_* settings.
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model
+from app.db.session import SessionLocal
+from app.models import Label, TextEntry
+from app.services.vector_index import CompressedIndex, normalize_rows, top_k_rows
+
+_IN_CHUNK = 500
+
+
+def _entry_columns() -> tuple:
+    return TextEntry.id, TextEntry.embedding_for(active_embedding_model()), TextEntry.embedding_json
+
+
+def _label_columns() -> tuple:
+    return Label.id, Label.centroid_vec, Label.centroid_json
+
+
+def _vector(vector, raw) -> np.ndarray | None:
+    if vector is None and raw is not None:
+        vector = json.loads(raw)
+    return None if vector is None else np.asarray(vector, dtype=np.float32)
+
+
+def _pages(db: Session, columns: tuple, page_size: int) -> Iterator[list[tuple[int, np.ndarray]]]:
+    """``(id, vector)`` pages of a table in id order, skipping rows without a vector."""
+    id_column = columns[0]
+    last_id = 0
+    while True:
+        rows = db.execute(select(*columns).where(id_column > last_id).order_by(id_column).limit(page_size)).all()
+        if not rows:
+            return
+        page = [(row_id, _vector(vector, raw)) for row_id, vector, raw in rows]
+        yield [(row_id, vector) for row_id, vector in page if vector is not None]
+        last_id = rows[-1][0]
+
+
+def _read(db: Session, columns: tuple, ids: list[int], dim: int) -> dict[int, np.ndarray]:
+    """Normalized vectors of ``ids`` that have ``dim`` dimensions."""
+    rows = {}
+    for start in range(0, len(ids), _IN_CHUNK):
+        for row_id, vector, raw in db.execute(select(*columns).where(columns[0].in_(ids[start : start + _IN_CHUNK]))).all():
+            vector = _vector(vector, raw)
+            if vector is not None and len(vector) == dim:
+                rows[row_id] = normalize_rows(vector)
+    return rows
+
+
+def evaluate(
+    db: Session,
+    columns: tuple,
+    queries: np.ndarray,
+    exclude: set[int],
+    k: int,
+    backend: CompressedIndex,
+    page_size: int,
+) -> dict | None:
+    """Compressed search (re-scored from the database) of normalized ``queries`` vs an exact
+    scan over the rows of ``columns`` with the queries' dimension, minus ``exclude``."""
+    dim = queries.shape[1]
+    n_rows = 0
+    build_s = exact_s = 0.0
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_val = np.empty((len(queries), 0), dtype=np.float32)
+    for page in _pages(db, columns, page_size):
+        page = [(row_id, vector) for row_id, vector in page if len(vector) == dim and row_id not in exclude]
+        if not page:
+            continue
+        ids = np.asarray([row_id for row_id, _ in page], dtype=np.int64)
+        matrix = normalize_rows(np.stack([vector for _, vector in page]))
+        start = time.perf_counter()
+        if n_rows:
+            backend.upsert(ids, matrix)
+        else:
+            backend.build(ids, matrix)
+        build_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pos, val = top_k_rows(queries @ matrix.T, k)
+        merged_ids = np.concatenate([best_ids, ids[pos]], axis=1)
+        merged_val = np.concatenate([best_val, val], axis=1)
+        order, best_val = top_k_rows(merged_val, k)
+        best_ids = np.take_along_axis(merged_ids, order, axis=1)
+        exact_s += time.perf_counter() - start
+        n_rows += len(ids)
+    if not n_rows:
+        return None
+    k = min(k, n_rows)
+
+    start = time.perf_counter()
+    candidates = backend.candidates(queries, k)
+    rows = _read(db, columns, sorted({int(c) for row in candidates for c in row.tolist()}), dim)
+    found_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    found_val = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    for i, row_ids in enumerate(candidates):
+        present = [row_id for row_id in row_ids.tolist() if row_id in rows]
+        if not present:
+            continue
+        top, values = top_k_rows((np.asarray([rows[row_id] for row_id in present]) @ queries[i])[None, :], k)
+        found_ids[i, : top.shape[1]] = np.asarray(present, dtype=np.int64)[top[0]]
+        found_val[i, : values.shape[1]] = values[0]
+    compressed_s = time.perf_counter() - start
+
+    float32_bytes = n_rows * dim * 4
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(found_ids.tolist(), best_ids.tolist())]
+    return {
+        "rows": n_rows,
+        "dim": dim,
+        "recall_at_1": float(np.mean(found_ids[:, 0] == best_ids[:, 0])),
+        f"recall_at_{k}": float(np.mean(overlap)),
+        "mean_top1_score_loss": float(np.mean(np.maximum(best_val[:, 0] - found_val[:, 0], 0.0))),
+        "float32_bytes": float32_bytes,
+        "compressed_bytes": backend.nbytes,
+        "scan_bytes_ratio": round(float32_bytes / max(backend.nbytes, 1), 2),
+        "build_s": round(build_s, 4),
+        "exact_query_ms": round(1000 * exact_s / len(queries), 4),
+        "compressed_query_ms": round(1000 * compressed_s / len(queries), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dim", type=int, default=settings.vector_compression_dim, help="Projected dimensions (0 = none)")
+    parser.add_argument("--projection", choices=["pca", "random"], default=settings.vector_compression_projection)
+    parser.add_argument("--candidates", type=int, default=settings.vector_compression_candidates)
+    parser.add_argument("--k", type=int, default=settings.knn_k)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def backend() -> CompressedIndex:
+        return CompressedIndex(dim=args.dim, projection=args.projection, candidates=args.candidates, seed=args.seed)
+
+    with SessionLocal() as db:
+        entry_columns = _entry_columns()
+        # First pass: only ids and dimensions, to pick the most common dimension as the indexes do.
+        dims, ids_by_dim = Counter(), {}
+        for page in _pages(db, entry_columns, args.page_size):
+            for entry_id, vector in page:
+                dims[len(vector)] += 1
+                ids_by_dim.setdefault(len(vector), []).append(entry_id)
+        if sum(dims.values()) < 2:
+            raise SystemExit("Need at least two entries with embeddings")
+        dim = dims.most_common(1)[0][0]
+        candidates = ids_by_dim[dim]
+        del ids_by_dim
+
+        rng = np.random.default_rng(args.seed)
+        n_queries = min(args.queries, len(candidates) // 2)
+        query_ids = sorted(int(i) for i in rng.choice(candidates, size=n_queries, replace=False))
+        query_rows = _read(db, entry_columns, query_ids, dim)
+        queries = np.stack([query_rows[entry_id] for entry_id in query_ids])
+
+        report = {"params": vars(args), "queries": n_queries}
+        labels = evaluate(db, _label_columns(), queries, set(), args.k, backend(), args.page_size)
+        if labels is not None:
+            report["labels"] = labels
+        report["entries"] = evaluate(db, entry_columns, queries, set(query_ids), args.k, backend(), args.page_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
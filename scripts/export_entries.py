@@ -0,0 +1,47 @@
+"""Export entries as NDJSON, optionally with their embeddings in a .npy sidecar.
+
+Usage: python -m scripts.export_entries entries.ndjson [--embeddings entries.npy] [--label NAME] [--after-id N]
+
+Entries are read in keyset pages, each in its own short read transaction, so the export can
+run against a live database. With --embeddings, each record's ``embedding_row`` is its row in
+the .npy file (null for entries without an embedding of the exported dimension).
+"""
+import argparse
+import sys
+
+from app.core.label_utils import normalize_label_name
+from app.db.session import SessionLocal, engine
+from app.repositories.label_repository import LabelRepository
+from app.services.export_service import export_entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="NDJSON output file, or - for stdout")
+    parser.add_argument("--embeddings", help="Write embeddings to this .npy file")
+    parser.add_argument("--label", help="Only export entries of this label")
+    parser.add_argument("--after-id", type=int, default=0)
+    args = parser.parse_args()
+
+    label_id = None
+    if args.label:
+        with SessionLocal() as db:
+            label = LabelRepository(db).get_by_name(normalize_label_name(args.label))
+        if label is None:
+            raise SystemExit(f"Label not found: {args.label}")
+        label_id = label.id
+
+    out = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8")
+    embeddings = open(args.embeddings, "wb") if args.embeddings else None
+    try:
+        written = export_entries(engine, out, embeddings=embeddings, label_id=label_id, after_id=args.after_id)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if embeddings is not None:
+            embeddings.close()
+    print(f"Exported {written} entries", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Bulk-import entries from an NDJSON or CSV file of ``{text, label?}`` rows.
+
+Usage: python -m scripts.import_entries data.ndjson [--format csv] [--batch-size 500]
+
+The file is read as a stream (``-`` reads stdin). Rows with a label are force-assigned to that
+existing label; the others are matched against the label centroids and rejected when nothing
+reaches SIMILARITY_THRESHOLD. Every batch is committed on its own.
+"""
+import argparse
+import sys
+
+from app.db.session import SessionLocal
+from app.services.import_service import IMPORT_FORMATS, EntryImporter, iter_import_rows
+from app.services.service_factory import build_embedding_client
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="NDJSON/CSV file, or - for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to csv for *.csv files, else ndjson")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    try:
+        with SessionLocal() as db:
+            result = EntryImporter(db, build_embedding_client(), batch_size=args.batch_size).run(iter_import_rows(source, fmt))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(
+        f"Read {result.read_count} rows: imported {result.imported_count} "
+        f"({result.matched_count} matched, {result.forced_count} forced), rejected {result.failed_count}"
+    )
+    for error in result.errors:
+        print(f"  line {error.line}: {error.reason}")
+
+
+if __name__ == "__main__":
+    main()
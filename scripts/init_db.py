@@ -1,8 +1,14 @@
 from app.db.base import Base
+from app.db.schema import ensure_vector_indexes, prepare_database, upgrade_schema
 from app.db.session import engine
-from app.models import Label, TextEntry  # noqa: F401
+from app.models import CentroidDelta, EntryCounter, Label, ReclassifyJob, TextEntry  # noqa: F401
+from app.services.stats_service import ensure_stats
 
 
 if __name__ == "__main__":
+    prepare_database(engine)
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    ensure_vector_indexes(engine)
+    ensure_stats(engine)
     print("Database initialized")
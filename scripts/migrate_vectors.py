@@ -0,0 +1,59 @@
+"""Convert JSON-text vectors to binary blobs in chunks.
+
+Usage: python -m scripts.migrate_vectors [--chunk-size 500] [--vacuum]
+
+Each chunk is converted and committed on its own, so the script can be stopped and re-run at
+any time; already converted rows are skipped.
+"""
+import argparse
+import json
+
+from sqlalchemy import select, update
+
+from app.db.base import Base
+from app.db.schema import upgrade_schema
+from app.db.session import SessionLocal, engine
+from app.models import Label, TextEntry
+
+
+def migrate_column(model, vec_column, json_column, chunk_size: int) -> int:
+    converted = 0
+    last_id = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(model.id, json_column)
+                .where(model.id > last_id, json_column.is_not(None))
+                .order_by(model.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return converted
+            for row_id, raw in rows:
+                db.execute(update(model).where(model.id == row_id).values({vec_column: json.loads(raw), json_column: None}))
+            db.commit()
+        converted += len(rows)
+        last_id = rows[-1][0]
+        print(f"{model.__tablename__}.{json_column.key}: {converted} rows converted")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="Reclaim the freed space afterwards (SQLite)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    migrate_column(Label, Label.centroid_vec, Label.centroid_json, args.chunk_size)
+    migrate_column(TextEntry, TextEntry.embedding_vec, TextEntry.embedding_json, args.chunk_size)
+
+    if args.vacuum and engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    print("Vector migration complete")
+
+
+if __name__ == "__main__":
+    main()
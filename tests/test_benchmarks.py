@@ -0,0 +1,36 @@
+import json
+import urllib.request
+
+import numpy as np
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.run import SCENARIOS, compare, run_scale
+
+
+def test_fake_ollama_serves_batch_and_legacy_embeddings() -> None:
+    with FakeOllamaServer(dim=16) as server:
+        request = urllib.request.Request(
+            server.url + "/api/embed",
+            data=json.dumps({"model": "m", "input": ["a b", "a b", "c"]}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        embeddings = np.asarray(json.loads(urllib.request.urlopen(request).read())["embeddings"])
+        legacy = urllib.request.Request(
+            server.url + "/api/embeddings", data=json.dumps({"model": "m", "prompt": "a b"}).encode()
+        )
+        single = np.asarray(json.loads(urllib.request.urlopen(legacy).read())["embedding"])
+
+    assert embeddings.shape == (3, 16)
+    assert np.allclose(embeddings[0], embeddings[1]) and np.allclose(embeddings[0], single)
+    assert abs(np.linalg.norm(embeddings[2]) - 1.0) < 1e-5
+
+
+def test_run_scale_reports_every_scenario_and_compare_flags_slowdowns() -> None:
+    results = run_scale(labels=3, entries=40, dim=16, repeat=2, batch_size=5)
+
+    assert [result["scenario"] for result in results] == list(SCENARIOS)
+    assert all(result["iterations"] >= 1 and result["median_s"] > 0 for result in results)
+
+    baseline = [dict(result, median_s=result["median_s"] / 2) for result in results]
+    assert len(compare(results, baseline, tolerance=0.5)) == len(results)
+    assert compare(results, results, tolerance=0.0) == []
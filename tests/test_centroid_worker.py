@@ -0,0 +1,99 @@
+import hashlib
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api.routes.entries import delete_entry
+from app.api.routes.labels import create_label
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import build_engine
+from app.models.text_entry import TextEntry
+from app.repositories.label_repository import LabelRepository
+from app.schemas.classification import CreateLabelRequest
+from app.services.centroid_worker import flush_centroid_deltas
+from app.services.classification_service import ClassificationService
+from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.stats_service import get_stats
+
+
+class FakeEmbeddingClient:
+    provider_name = "fake"
+
+    def get_embedding(self, text: str) -> list[float]:
+        vals = np.zeros(16)
+        for token in text.lower().split():
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            vals += np.array([(digest[i] / 255.0) - 0.5 for i in range(16)])
+        return (vals / np.linalg.norm(vals)).tolist()
+
+
+def _new_db() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    return TestingSessionLocal()
+
+
+def test_deferred_deltas_are_coalesced_into_the_immediate_result() -> None:
+    db = _new_db()
+    client = FakeEmbeddingClient()
+    create_label(CreateLabelRequest(name="printing", definition="printer paper jam toner"), db=db, embedding_client=client)
+    label = LabelRepository(db).get_by_name("printing")
+    before = np.asarray(label.centroid).copy()
+
+    old_mode = settings.centroid_update_mode
+    settings.centroid_update_mode = "deferred"
+    try:
+        service = ClassificationService(db, client)
+        for text in ["printer jam", "toner empty", "paper tray stuck", "jam again"]:
+            service.classify(text, label_id=label.id)
+        last = db.scalars(select(TextEntry).order_by(TextEntry.id.desc()).limit(1)).one()
+        delete_entry(last.id, db=db, embedding_client=client)
+        db.refresh(label)
+        assert label.usage_count == 0
+        assert np.allclose(label.centroid, before)
+        centroids = get_stats(db)["centroids"]
+        assert centroids["mode"] == "deferred"
+        assert (centroids["pending_updates"], centroids["pending_labels"]) == (5, 1)
+
+        assert flush_centroid_deltas(db, client) == 5
+    finally:
+        settings.centroid_update_mode = old_mode
+
+    db.refresh(label)
+    deferred = np.asarray(label.centroid).copy()
+    assert label.usage_count == 3
+    assert get_stats(db)["centroids"]["pending_updates"] == 0
+    LabelEmbeddingService(db, client).recompute_for_label(label)
+    assert label.usage_count == 3
+    assert np.allclose(deferred, label.centroid)
+    db.close()
+
+
+def test_apply_delta_rereads_the_label_before_updating_it(tmp_path) -> None:
+    file_engine = build_engine(f"sqlite:///{tmp_path / 'classifier.db'}")
+    Base.metadata.create_all(bind=file_engine)
+    session_factory = sessionmaker(bind=file_engine, autocommit=False, autoflush=False)
+    client = FakeEmbeddingClient()
+    with session_factory() as db:
+        create_label(CreateLabelRequest(name="printing", definition="printer paper jam toner"), db=db, embedding_client=client)
+    first = np.asarray(client.get_embedding("printer jam"))
+    second = np.asarray(client.get_embedding("toner empty"))
+
+    # Two workers load the label; the second applies its delta while the first still holds the
+    # stale row, as when two workers take different deltas of one label.
+    with session_factory() as stale, session_factory() as other:
+        label = LabelRepository(stale).get_by_name("printing")
+        assert label.usage_count == 0
+        LabelEmbeddingService(other, client, deferred=False).apply_delta(LabelRepository(other).get_by_name("printing"), first, 1)
+        other.commit()
+        LabelEmbeddingService(stale, client, deferred=False).apply_delta(label, second, 1)
+        stale.commit()
+
+    with session_factory() as db:
+        label = LabelRepository(db).get_by_name("printing")
+        assert label.usage_count == 2
+        assert np.allclose(label.entries_sum, first + second)
+    file_engine.dispose()
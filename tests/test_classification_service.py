@@ -1,15 +1,24 @@
 import hashlib
+import threading
 
+import numpy as np
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.db.base import Base
+from app.db.session import build_engine
 from app.core.config import settings
+from app.core.errors import NoLabelFitError
+from app.core.label_utils import definition_hash
 from app.api.routes.labels import create_label
 from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
 from app.schemas.classification import ClassifyRequest, CreateLabelRequest
-from app.services.classification_service import ClassificationService
+from app.services.classification_service import BatchItem, ClassificationService
+from app.services.export_service import iter_export_records
+from app.services.label_embedding_service import LabelEmbeddingService
+from app.services.stats_service import get_stats
 
 
 class FakeEmbeddingClient:
@@ -160,3 +169,231 @@ def test_forced_label_by_id_works() -> None:
 def test_empty_label_is_treated_as_missing() -> None:
     payload = ClassifyRequest(text="Buy bananas", label="")
     assert payload.label is None
+
+
+def test_incremental_centroid_matches_full_recompute() -> None:
+    db: Session = TestingSessionLocal()
+    embedding = FakeEmbeddingClient(dim=16)
+    create_label(
+        CreateLabelRequest(name="incremental", definition="printer paper jam toner"),
+        db=db,
+        embedding_client=embedding,
+    )
+    label = LabelRepository(db).get_by_name("incremental")
+    assert label is not None
+
+    calls: list[str] = []
+    original = embedding.get_embedding
+    embedding.get_embedding = lambda text: calls.append(text) or original(text)  # type: ignore[method-assign]
+
+    service = ClassificationService(db, embedding_client=embedding)
+    for text in ["printer jam", "toner empty", "paper tray stuck"]:
+        service.classify(text, label_id=label.id)
+    assert calls == ["printer jam", "toner empty", "paper tray stuck"]
+
+    db.refresh(label)
+    incremental = label.centroid
+    LabelEmbeddingService(db, embedding).recompute_for_label(label)
+
+    assert label.usage_count == 3
+    assert all(abs(a - b) < 1e-6 for a, b in zip(incremental, label.centroid))
+    db.close()
+
+
+def test_classify_batch_reports_per_item_outcomes() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.2
+
+    db: Session = TestingSessionLocal()
+    embedding = FakeEmbeddingClient(dim=16)
+    create_label(
+        CreateLabelRequest(name="batch_network", definition="network outage router down"),
+        db=db,
+        embedding_client=embedding,
+    )
+    label = LabelRepository(db).get_by_name("batch_network")
+    assert label is not None
+    before_count = db.query(TextEntry).count()
+
+    service = ClassificationService(db, embedding_client=embedding)
+    outcomes = service.classify_batch(
+        [
+            BatchItem(text="router down network outage"),
+            BatchItem(text="anything", label="does_not_exist"),
+            BatchItem(text="forced text", label_id=label.id),
+        ]
+    )
+
+    assert [o.index for o in outcomes] == [0, 1, 2]
+    assert outcomes[0].result is not None and outcomes[0].result.assigned_label == "batch_network"
+    assert outcomes[1].error == "label_not_found"
+    assert outcomes[2].result is not None and outcomes[2].result.reason == "forced_label_assigned"
+    assert db.query(TextEntry).count() == before_count + 2
+
+    db.refresh(label)
+    assert label.usage_count == 2
+    db.close()
+
+    settings.similarity_threshold = old_threshold
+
+
+def test_knn_mode_votes_with_neighbouring_entries() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.5
+
+    knn_engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=knn_engine)
+    db = sessionmaker(bind=knn_engine, autocommit=False, autoflush=False)()
+    labels = LabelRepository(db)
+    billing = labels.create(name="billing", definition="billing", centroid=[1.0, 0.0, 0.0])
+    labels.create(name="other", definition="other", centroid=[0.6, 0.0, 0.8])
+    entries = TextEntryRepository(db)
+    # A second "billing" mode far away from its centroid.
+    for vector in ([0.0, 0.1, 1.0], [0.0, -0.1, 1.0], [0.1, 0.0, 1.0]):
+        entries.create(text="refund", label_id=billing.id, similarity_score=None, confidence="forced", embedding=vector)
+    db.commit()
+
+    service = ClassificationService(db, embedding_client=FakeEmbeddingClient(dim=3))
+    query = [0.0, 0.05, 1.0]
+    by_centroid = service.classify_vector("refund please", query, mode="centroid")
+    by_vote = service.classify_vector("refund again", query, mode="knn")
+
+    assert by_centroid.assigned_label == "other"
+    assert by_vote.assigned_label == "billing"
+    assert by_vote.reason == "matched_by_entry_vote"
+    # Three of four neighbours vote "billing" (~0.99 each); the text stored above votes "other".
+    assert 0.7 < by_vote.similarity_score < 0.76
+    db.close()
+
+    settings.similarity_threshold = old_threshold
+
+
+def test_knn_ranks_and_thresholds_on_the_same_score() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.25
+
+    knn_engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=knn_engine)
+    db = sessionmaker(bind=knn_engine, autocommit=False, autoflush=False)()
+    labels = LabelRepository(db)
+    many = labels.create(name="many", definition="many", centroid=[0.0, 1.0])
+    one = labels.create(name="one", definition="one", centroid=[0.0, -1.0])
+    entries = TextEntryRepository(db)
+    # Three weak neighbours (similarity 0.4) against one strong one (0.95).
+    for y in (0.9, 0.92, 0.91):
+        entries.create(text="weak", label_id=many.id, similarity_score=None, confidence="forced", embedding=[0.4, y])
+    entries.create(text="strong", label_id=one.id, similarity_score=None, confidence="forced", embedding=[0.95, -0.31])
+    db.commit()
+
+    service = ClassificationService(db, embedding_client=FakeEmbeddingClient(dim=2))
+    result = service.classify_vector("query", [1.0, 0.0], mode="knn", top_k=2)
+    assert [name for name, _ in result.top_labels] == ["many", "one"]
+    scores = [score for _, score in result.top_labels]
+    assert scores[0] > scores[1]
+    assert result.assigned_label == "many"
+    assert result.similarity_score == scores[0]
+    db.close()
+
+    settings.similarity_threshold = old_threshold
+
+
+def test_top_k_and_multi_label_matching() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.5
+
+    topk_engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=topk_engine)
+    db = sessionmaker(bind=topk_engine, autocommit=False, autoflush=False)()
+    labels = LabelRepository(db)
+    for name, centroid in (("a", [1.0, 0.0, 0.0]), ("b", [0.8, 0.6, 0.0]), ("c", [0.0, 0.0, 1.0])):
+        label = labels.create(name=name, definition=name, centroid=centroid)
+        label.definition_embedding = centroid
+        label.definition_model = settings.ollama_embedding_model
+        label.definition_hash = definition_hash(name)
+    db.commit()
+    service = ClassificationService(db, embedding_client=FakeEmbeddingClient(dim=3))
+
+    with pytest.raises(NoLabelFitError) as exc:
+        service.classify_vector("zero", [0.0, -1.0, 0.1], top_k=2)
+    assert [name for name, _ in exc.value.top_labels] == ["c", "a"]
+
+    single = service.classify_vector("one", [1.0, 0.1, 0.0], top_k=3)
+    assert single.assigned_label == "a"
+    assert [name for name, _ in single.top_labels] == ["a", "b", "c"]
+    assert single.assigned_labels is None
+    assert db.query(TextEntry).count() == 1
+
+    multi = service.classify_vector("two", [1.0, 0.1, 0.0], multi_label=True)
+    assert multi.assigned_labels == ["a", "b"]
+    assert multi.top_labels is None
+    assert db.query(TextEntry).count() == 3
+
+    outcomes = service.classify_batch_vectors(
+        [BatchItem(text="four", top_k=2), BatchItem(text="five", multi_label=True)],
+        [[0.0, 0.1, 1.0], [0.9, 0.2, 0.0]],
+    )
+    assert outcomes[0].result.top_labels[0][0] == "c" and len(outcomes[0].result.top_labels) == 2
+    assert sorted(outcomes[1].result.assigned_labels) == ["a", "b"]
+    assert db.query(TextEntry).count() == 6
+    db.close()
+
+    settings.similarity_threshold = old_threshold
+
+
+def test_multi_label_text_counts_once_per_label() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.5
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    try:
+        labels = LabelRepository(db)
+        for name, centroid in (("a", [1.0, 0.0, 0.0]), ("b", [0.8, 0.6, 0.0])):
+            label = labels.create(name=name, definition=name, centroid=centroid)
+            label.definition_embedding = centroid
+            label.definition_model = settings.ollama_embedding_model
+            label.definition_hash = definition_hash(name)
+        db.commit()
+
+        service = ClassificationService(db, embedding_client=FakeEmbeddingClient(dim=3))
+        assert service.classify_vector("shared", [1.0, 0.1, 0.0], multi_label=True).assigned_labels == ["a", "b"]
+
+        # One text matched under two labels is two entries everywhere entries are counted.
+        stats = get_stats(db)
+        assert stats["classified_entries_count"] == 2
+        assert {row["name"]: row["entries_count"] for row in stats["labels"]} == {"a": 1, "b": 1}
+        assert {label.name: label.usage_count for label in labels.list_labels()} == {"a": 1, "b": 1}
+        exported = [record for record, _ in iter_export_records(engine)]
+        assert [(record["text"], record["label"]) for record in exported] == [("shared", "a"), ("shared", "b")]
+    finally:
+        db.close()
+        settings.similarity_threshold = old_threshold
+
+
+def test_concurrent_classifies_do_not_lose_label_updates(tmp_path) -> None:
+    file_engine = build_engine(f"sqlite:///{tmp_path / 'classifier.db'}")
+    Base.metadata.create_all(bind=file_engine)
+    session_factory = sessionmaker(bind=file_engine, autocommit=False, autoflush=False)
+    client = FakeEmbeddingClient(dim=8)
+    with session_factory() as db:
+        create_label(CreateLabelRequest(name="billing", definition="invoice payment"), db=db, embedding_client=client)
+
+    def classify_many(worker: int) -> None:
+        with session_factory() as db:
+            service = ClassificationService(db, embedding_client=client)
+            for i in range(20):
+                service.classify(f"worker {worker} text {i}", label="billing")
+
+    threads = [threading.Thread(target=classify_many, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with session_factory() as db:
+        label = LabelRepository(db).get_by_name("billing")
+        entries = TextEntryRepository(db).list_by_label(label.id)
+        assert len(entries) == 160
+        assert label.usage_count == 160
+        assert np.allclose(label.entries_sum, np.sum([entry.embedding for entry in entries], axis=0), atol=1e-4)
+    file_engine.dispose()
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.db.schema import upgrade_schema
+from app.db.session import build_engine
+from app.models import TextEntry  # noqa: F401
+
+
+def test_sqlite_connections_get_tuning_pragmas_and_read_pool_is_read_only(tmp_path) -> None:
+    url = f"sqlite:///{tmp_path / 'classifier.db'}"
+    write_engine = build_engine(url)
+    read_engine = build_engine(url, read_only=True)
+
+    with write_engine.begin() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    with read_engine.connect() as conn:
+        assert conn.execute(text("SELECT x FROM t")).scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (2)"))
+    write_engine.dispose()
+    read_engine.dispose()
+
+
+def test_upgrade_rebuilds_text_entries_without_autoincrement(tmp_path) -> None:
+    engine = build_engine(f"sqlite:///{tmp_path / 'classifier.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text("CREATE TABLE text_entries (id INTEGER NOT NULL PRIMARY KEY, text TEXT, created_at DATETIME NOT NULL)")
+        )
+        conn.execute(
+            text("INSERT INTO text_entries (id, text, created_at) VALUES (1, 'a', '2024-01-01'), (2, 'b', '2024-01-01')")
+        )
+        conn.execute(text("DELETE FROM text_entries WHERE id = 2"))
+
+    upgrade_schema(engine)
+
+    with engine.begin() as conn:
+        create_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'text_entries'")).scalar()
+        assert "AUTOINCREMENT" in create_sql
+        conn.execute(text("INSERT INTO text_entries (text, created_at) VALUES ('c', '2024-01-02')"))
+        conn.execute(text("DELETE FROM text_entries WHERE text = 'c'"))
+        conn.execute(text("INSERT INTO text_entries (text, created_at) VALUES ('d', '2024-01-02')"))
+        assert conn.execute(text("SELECT id, text FROM text_entries ORDER BY id")).all() == [(1, "a"), (3, "d")]
+    engine.dispose()
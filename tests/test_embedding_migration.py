@@ -0,0 +1,275 @@
+import hashlib
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+from app.api.routes.entries import delete_entry
+from app.api.routes.labels import create_label
+from app.api.routes.embeddings import get_embedding_model
+from app.core.config import settings
+from app.core.embedding_model import active_embedding_model, set_active_embedding_model
+from app.db.base import Base
+from app.models.text_entry import TextEntry
+from app.repositories.embedding_migration_repository import EmbeddingMigrationRepository
+from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.schemas.classification import CreateLabelRequest
+from app.services import embedding_migration_service
+from app.services.classification_service import BatchItem, ClassificationService
+from app.services.embedding_migration_service import (
+    EmbeddingMigrationRunner,
+    follow_active_model,
+    migration_target,
+    start_embedding_migration,
+)
+from app.services.entry_index import get_entry_index
+
+
+class FakeEmbeddingClient:
+    provider_name = "fake"
+
+    def __init__(self, model: str, dim: int):
+        self.model = model
+        self.dim = dim
+        self.calls = 0
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+    def get_embedding(self, text: str) -> list[float]:
+        self.calls += 1
+        vals = [0.0] * self.dim
+        for token in text.lower().split():
+            digest = hashlib.sha256(f"{self.model}:{token}".encode("utf-8")).digest()
+            for i in range(self.dim):
+                vals[i] += (digest[i % len(digest)] / 255.0) - 0.5
+        norm = sum(v * v for v in vals) ** 0.5
+        return vals if norm == 0 else [v / norm for v in vals]
+
+
+def test_migration_moves_entries_and_labels_to_the_new_model() -> None:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    clients = {"model-a": FakeEmbeddingClient("model-a", 16), "model-b": FakeEmbeddingClient("model-b", 24)}
+
+    old_threshold = settings.similarity_threshold
+    set_active_embedding_model("model-a")
+    settings.similarity_threshold = 0.0
+    try:
+        with session_factory() as db:
+            create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=clients["model-a"])
+            create_label(CreateLabelRequest(name="network", definition="network wifi router outage"), db=db, embedding_client=clients["model-a"])
+            service = ClassificationService(db, clients["model-a"])
+            for text in ["printer toner empty", "paper jam again", "wifi router outage", "network down"]:
+                service.classify(text)
+
+            with pytest.raises(ValueError, match="model_already_active"):
+                start_embedding_migration(db, "model-a")
+            job = start_embedding_migration(db, "model-b", chunk_size=3)
+            with pytest.raises(ValueError, match="migration_running"):
+                start_embedding_migration(db, "model-c")
+            job_id = job.id
+            assert db.scalars(select(TextEntry.embedding_model).distinct()).all() == ["model-a"]
+
+        built: list[str] = []
+
+        def client_for_model(model: str) -> FakeEmbeddingClient:
+            built.append(model)
+            return clients[model]
+
+        runner = EmbeddingMigrationRunner(session_factory, client_for_model)
+        runner.sweep_delay_seconds = 0
+        runner.run(job_id)
+        # Two chunks, the cutover and the sweep share one client, closed when the run ends.
+        assert built == ["model-b"] and clients["model-b"].closed
+
+        with session_factory() as db:
+            job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+            assert (job.status, job.source_model, job.embedded_count) == ("completed", "model-a", 4)
+            assert active_embedding_model() == "model-b"
+            entries = db.scalars(select(TextEntry)).all()
+            assert {(entry.embedding_model, len(entry.embedding)) for entry in entries} == {("model-b", 24)}
+            assert all(entry.next_embedding_vec is None for entry in entries)
+            labels = LabelRepository(db).list_labels()
+            assert {(label.definition_model, len(label.centroid)) for label in labels} == {("model-b", 24)}
+            assert sum(label.usage_count for label in labels) == 4
+
+            before = clients["model-b"].calls
+            result = ClassificationService(db, clients["model-b"]).classify("printer toner low")
+            assert result.assigned_label == "printers"
+            # Only the text itself was embedded: definitions and entries were already migrated.
+            assert clients["model-b"].calls == before + 1
+
+            # Another process still on the old model reports the new one from a read-only route
+            # without switching, and follows it on the next write path.
+            set_active_embedding_model("model-a")
+            assert get_embedding_model(db=db).active_model == "model-b"
+            assert active_embedding_model() == "model-a"
+            assert follow_active_model(db, 0) == "model-b"
+            assert active_embedding_model() == "model-b"
+    finally:
+        set_active_embedding_model(None)
+        settings.similarity_threshold = old_threshold
+
+
+def test_cutover_embeds_before_it_switches_and_rebuilds_labels_changed_meanwhile() -> None:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    clients = {"model-a": FakeEmbeddingClient("model-a", 16), "model-b": FakeEmbeddingClient("model-b", 24)}
+    log: list[str] = []
+    embed_b = clients["model-b"].get_embedding
+    clients["model-b"].get_embedding = lambda text: log.append(f"embed {text}") or embed_b(text)
+
+    old_threshold = settings.similarity_threshold
+    set_active_embedding_model("model-a")
+    settings.similarity_threshold = 0.0
+    try:
+        with session_factory() as db:
+            create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=clients["model-a"])
+            service = ClassificationService(db, clients["model-a"])
+            for text in ["printer toner empty", "paper jam again", "toner low"]:
+                service.classify(text)
+            job_id = start_embedding_migration(db, "model-b", chunk_size=10).id
+
+        runner = EmbeddingMigrationRunner(session_factory, clients.get)
+        runner.sweep_delay_seconds = 0
+        run_chunk, update_job = runner._run_chunk, runner._update_job
+
+        def run_chunk_then_reembed_behind_the_cursor(db, job):
+            embedded = run_chunk(db, job)
+            if embedded == 0 and "straggler" not in log:
+                # Re-embedded with the source model after the chunks passed it: a straggler.
+                entry = db.scalars(select(TextEntry).where(TextEntry.text == "paper jam again")).one()
+                entry.set_embedding(clients["model-a"].get_embedding(entry.text), "model-a")
+                db.commit()
+                log.append("straggler")
+            return embedded
+
+        def update_job_after_a_concurrent_delete(db, job_id, **values):
+            if values.get("status") == "switching":
+                # Another process deletes an entry after the label sums were taken.
+                with session_factory() as other:
+                    entry = other.scalars(select(TextEntry).where(TextEntry.text == "toner low")).one()
+                    delete_entry(entry.id, db=other, embedding_client=clients["model-a"])
+            if "status" in values:
+                log.append(values["status"])
+            return update_job(db, job_id, **values)
+
+        runner._run_chunk = run_chunk_then_reembed_behind_the_cursor
+        runner._update_job = update_job_after_a_concurrent_delete
+        runner.run(job_id)
+
+        switching, completed = log.index("switching"), log.index("completed")
+        assert "embed paper jam again" in log[log.index("straggler") : switching]
+        # Nothing is embedded while the switching transaction holds the lock.
+        assert not [event for event in log[switching:completed] if event.startswith("embed")]
+
+        with session_factory() as db:
+            assert EmbeddingMigrationRepository(db).get_by_id(job_id).status == "completed"
+            entries = db.scalars(select(TextEntry)).all()
+            assert {(entry.embedding_model, len(entry.embedding)) for entry in entries} == {("model-b", 24)}
+            # The label's sums were taken before the delete; the sweep rebuilt it from its entries.
+            label = LabelRepository(db).get_by_name("printers")
+            assert label.usage_count == len(entries) == 2
+            assert np.allclose(label.entries_sum, np.sum([entry.embedding for entry in entries], axis=0), atol=1e-5)
+    finally:
+        set_active_embedding_model(None)
+        settings.similarity_threshold = old_threshold
+
+
+def test_vectors_are_tagged_with_the_model_of_the_client_that_embedded_them() -> None:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    client = FakeEmbeddingClient("model-b", 24)
+    old_threshold = settings.similarity_threshold
+    # The process is on another model than the client, e.g. mid-switch.
+    set_active_embedding_model("model-a")
+    settings.similarity_threshold = 0.0
+    try:
+        with sessionmaker(bind=engine, autocommit=False, autoflush=False)() as db:
+            create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=client)
+            service = ClassificationService(db, client)
+            service.classify("printer toner empty")
+            service.classify_batch([BatchItem(text="paper jam again")])
+            assert db.scalars(select(TextEntry.embedding_model).distinct()).all() == ["model-b"]
+            assert LabelRepository(db).get_by_name("printers").definition_model == "model-b"
+    finally:
+        set_active_embedding_model(None)
+        settings.similarity_threshold = old_threshold
+
+
+def test_cutover_only_flips_metadata_and_writes_meanwhile_use_both_models() -> None:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    clients = {"model-a": FakeEmbeddingClient("model-a", 16), "model-b": FakeEmbeddingClient("model-b", 24)}
+    statements: list[str] = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    event.listen(engine, "commit", lambda conn: statements.append("COMMIT"))
+
+    old_threshold, old_build = settings.similarity_threshold, embedding_migration_service.build_model_client
+    set_active_embedding_model("model-a")
+    settings.similarity_threshold = 0.0
+    embedding_migration_service.build_model_client = clients.get
+    try:
+        with session_factory() as db:
+            create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=clients["model-a"])
+            service = ClassificationService(db, clients["model-a"])
+            for text in ["printer toner empty", "paper jam again", "toner low"]:
+                service.classify(text)
+            job_id = start_embedding_migration(db, "model-b", chunk_size=10).id
+
+            # Written while the migration runs: embedded with both models.
+            assert migration_target(db, 0) == "model-b"
+            service.classify("printer jam")
+            entry = db.scalars(select(TextEntry).where(TextEntry.text == "printer jam")).one()
+            assert (entry.embedding_model, entry.next_embedding_model, len(entry.next_embedding_vec)) == ("model-a", "model-b", 24)
+
+        runner = EmbeddingMigrationRunner(session_factory, clients.get)
+        runner.sweep_delay_seconds = 0
+        update_job, sweep = runner._update_job, runner._sweep
+        switch: dict[str, object] = {}
+
+        def update_job_recording_the_switch(db, job_id, **values):
+            if values.get("status") == "switching":
+                switch["start"] = len(statements)
+            if values.get("status") == "completed":
+                switch["model"] = active_embedding_model()
+            return update_job(db, job_id, **values)
+
+        def sweep_after_checking_readers(db, job, label_ids):
+            # Switched, but no vector has moved yet: readers take the target vectors as they are.
+            entries = db.scalars(select(TextEntry)).all()
+            assert {entry.next_embedding_model for entry in entries} == {"model-b"}
+            assert {len(entry.embedding) for entry in entries} == {24}
+            assert {model for _, _, model in TextEntryRepository(db).iter_label_embeddings()} == {"model-b"}
+            assert get_entry_index(db).sync(db).dim == 24
+            sweep(db, job, label_ids)
+
+        runner._update_job = update_job_recording_the_switch
+        runner._sweep = sweep_after_checking_readers
+        runner.run(job_id)
+
+        switched = statements[switch["start"] : statements.index("COMMIT", switch["start"])]
+        assert not [statement for statement in switched if "text_entries" in statement and "UPDATE" in statement]
+        # The process switches once the transaction has committed.
+        assert switch["model"] == "model-a" and active_embedding_model() == "model-b"
+
+        with session_factory() as db:
+            job = EmbeddingMigrationRepository(db).get_by_id(job_id)
+            # The entry written meanwhile was not embedded again.
+            assert (job.status, job.embedded_count) == ("completed", 3)
+            entries = db.scalars(select(TextEntry)).all()
+            assert {(entry.embedding_model, entry.next_embedding_model, len(entry.embedding)) for entry in entries} == {
+                ("model-b", None, 24)
+            }
+    finally:
+        set_active_embedding_model(None)
+        settings.similarity_threshold = old_threshold
+        embedding_migration_service.build_model_client = old_build
+        embedding_migration_service._target_clients.clear()
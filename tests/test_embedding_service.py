@@ -0,0 +1,92 @@
+import asyncio
+import urllib.error
+
+from app.services.embedding_cache import CachingEmbeddingClient, SqliteEmbeddingStore
+from app.services.embedding_coalescer import CoalescingEmbeddingClient
+from app.services.embedding_service import OllamaEmbeddingClient
+
+
+class ScriptedOllamaClient(OllamaEmbeddingClient):
+    """Ollama client whose HTTP layer is replaced by an in-process fake."""
+
+    def __init__(self, batch_size: int = 2, has_embed_endpoint: bool = True):
+        super().__init__(host="http://ollama.test", model="fake-model", timeout_seconds=1.0, batch_size=batch_size)
+        self.has_embed_endpoint = has_embed_endpoint
+        self.requests: list[tuple[str, dict]] = []
+
+    def _post_json(self, path: str, payload: dict) -> dict:
+        self.requests.append((path, payload))
+        if path == "/api/embed":
+            if not self.has_embed_endpoint:
+                raise urllib.error.HTTPError(self.host + path, 404, "not found", None, None)  # type: ignore[arg-type]
+            return {"embeddings": [[float(len(text)), 1.0] for text in payload["input"]]}
+        return {"embedding": [float(len(payload["prompt"])), 1.0]}
+
+
+def test_get_embeddings_chunks_requests() -> None:
+    client = ScriptedOllamaClient(batch_size=2)
+
+    vectors = client.get_embeddings(["a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [4.0, 1.0], [5.0, 1.0]]
+    assert [len(payload["input"]) for _, payload in client.requests] == [2, 2, 1]
+
+
+def test_get_embeddings_falls_back_to_single_requests() -> None:
+    client = ScriptedOllamaClient(batch_size=8, has_embed_endpoint=False)
+
+    vectors = client.get_embeddings(["a", "bb", "ccc"])
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert [path for path, _ in client.requests] == ["/api/embed", "/api/embeddings", "/api/embeddings", "/api/embeddings"]
+    assert client.supports_batch is False
+
+
+def test_caching_client_dedupes_and_evicts(tmp_path) -> None:
+    inner = ScriptedOllamaClient(batch_size=8)
+    store = SqliteEmbeddingStore(str(tmp_path / "cache.db"), model="fake-model")
+    client = CachingEmbeddingClient(inner, model="fake-model", max_entries=2, store=store)
+
+    first = client.get_embeddings(["a", "bb", " a ", "ccc"])
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert len(inner.requests) == 1
+    assert client.stats()["misses"] == 3
+    assert client.stats()["evictions"] == 1
+
+    # "a" was evicted from memory but is served by the persistent tier.
+    assert client.get_embedding("a") == [1.0, 1.0]
+    assert client.stats()["disk_hits"] == 1
+    assert len(inner.requests) == 1
+
+    # A different model sees an empty cache.
+    other = CachingEmbeddingClient(inner, model="other-model", max_entries=2, store=SqliteEmbeddingStore(str(tmp_path / "cache.db"), model="other-model"))
+    other.get_embedding("a")
+    assert len(inner.requests) == 2
+
+
+class FakeAsyncEmbeddingClient:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    async def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(list(texts))
+        await asyncio.sleep(0)
+        return [[float(len(text))] for text in texts]
+
+    async def aclose(self) -> None:
+        pass
+
+
+def test_coalescer_merges_concurrent_requests() -> None:
+    inner = FakeAsyncEmbeddingClient()
+
+    async def run() -> list[list[float]]:
+        client = CoalescingEmbeddingClient(inner, window_ms=5, max_batch=4)
+        results = await asyncio.gather(*(client.get_embedding("x" * n) for n in range(1, 7)))
+        await client.aclose()
+        return list(results)
+
+    results = asyncio.run(run())
+
+    assert results == [[float(n)] for n in range(1, 7)]
+    assert [len(call) for call in inner.calls] == [4, 2]
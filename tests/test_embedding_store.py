@@ -0,0 +1,52 @@
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.services.embedding_store import EmbeddingStore, get_embedding_store
+from app.services.entry_index import get_entry_index
+
+
+def test_store_follows_commits_and_compacts(tmp_path) -> None:
+    old_enabled = settings.entry_store_enabled
+    settings.entry_store_enabled = True
+    engine = create_engine(f"sqlite:///{tmp_path / 'classifier.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    entries = TextEntryRepository(db)
+
+    a = entries.create(text="a", label_id=None, similarity_score=None, embedding=[1.0, 0.0, 0.0])
+    b = entries.create(text="b", label_id=None, similarity_score=None, embedding=[0.0, 1.0, 0.0])
+    db.rollback()
+    assert not (tmp_path / "classifier.embeddings").exists()
+
+    a = entries.create(text="a", label_id=None, similarity_score=None, embedding=[1.0, 0.0, 0.0])
+    b = entries.create(text="b", label_id=None, similarity_score=None, embedding=[0.0, 1.0, 0.0])
+    c = entries.create(text="c", label_id=None, similarity_score=None, embedding=[0.0, 0.0, 2.0])
+    db.commit()
+    b.set_embedding([0.0, 0.0, -1.0], settings.ollama_embedding_model)
+    entries.delete(c)
+    db.commit()
+
+    store = get_embedding_store(engine)
+    assert store.refresh() == 5
+    # Another process maps the same files read-only and sees the same live rows.
+    reader = EmbeddingStore(str(tmp_path / "classifier.embeddings"), model="ignored")
+    live_ids, rows = reader.live_rows()
+    assert live_ids.tolist() == [a.id, b.id]
+    assert reader.model == settings.ollama_embedding_model
+    assert np.array_equal(reader.vectors[rows[1]], [0.0, 0.0, -1.0])
+
+    index = get_entry_index(db).sync(db)
+    ids, scores = index.search(np.array([[0.0, 0.0, -3.0], [0.0, 0.0, 1.0]]), 2)
+    assert ids[0].tolist() == [b.id, a.id]
+    assert abs(scores[0, 0] - 1.0) < 1e-6
+    assert c.id not in ids[1].tolist()
+
+    assert store.compact() == (5, 2)
+    assert index.sync(db).search(np.array([[1.0, 0.0, 0.0]]), 1)[0][0, 0] == a.id
+    assert len(index) == 2
+    db.close()
+    settings.entry_store_enabled = old_enabled
@@ -1,6 +1,7 @@
 import hashlib
 import math
 
+import numpy as np
 import pytest
 from fastapi import HTTPException
 from sqlalchemy import create_engine
@@ -12,6 +13,7 @@ from app.db.base import Base
 from app.repositories.label_repository import LabelRepository
 from app.repositories.text_entry_repository import TextEntryRepository
 from app.schemas.classification import CreateLabelRequest
+from app.services.entry_index import get_entry_index
 
 
 class FakeEmbeddingClient:
@@ -123,3 +125,23 @@ def test_delete_label_detaches_entries_before_delete() -> None:
     gone_label = LabelRepository(db).get_by_name("to_remove")
     assert gone_label is None
     db.close()
+
+
+def test_entry_inserted_after_deleting_the_newest_reaches_the_knn_index() -> None:
+    db = _new_db()
+    entries = TextEntryRepository(db)
+    fake_embedding = FakeEmbeddingClient()
+    entries.create(text="old", label_id=None, similarity_score=None, embedding=[1.0, 0.0])
+    newest = entries.create(text="newest", label_id=None, similarity_score=None, embedding=[0.0, 1.0])
+    db.commit()
+    index = get_entry_index(db).sync(db)
+    assert len(index) == 2
+
+    delete_entry(newest.id, db=db, embedding_client=fake_embedding)
+    replacement = entries.create(text="new", label_id=None, similarity_score=None, embedding=[0.0, 1.0])
+    db.commit()
+
+    assert replacement.id > newest.id
+    ids, _ = index.sync(db).search(np.array([[0.0, 1.0]]), 1)
+    assert ids[0, 0] == replacement.id
+    db.close()
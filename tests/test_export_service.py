@@ -0,0 +1,44 @@
+import io
+import json
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base
+from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.services.export_service import export_entries, iter_export_ndjson
+
+
+def test_export_pages_entries_and_writes_npy_sidecar() -> None:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        label = LabelRepository(db).create(name="network", definition="wifi", centroid=[1.0, 0.0, 0.0])
+        entries = TextEntryRepository(db)
+        entries.create(text="a", label_id=label.id, similarity_score=0.9, confidence="high", embedding=[1.0, 0.0, 0.0])
+        entries.create(text="b", label_id=None, similarity_score=None)
+        entries.create(text="c", label_id=label.id, similarity_score=0.5, embedding=[0.0, 1.0, 0.0])
+        entries.create(text="d", label_id=label.id, similarity_score=0.5, embedding=[0.0, 1.0])
+        db.commit()
+        label_id = label.id
+
+    out, sidecar = io.StringIO(), io.BytesIO()
+    assert export_entries(engine, out, embeddings=sidecar) == 4
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(r["text"], r["label"], r["embedding_row"]) for r in records] == [
+        ("a", "network", 0),
+        ("b", None, None),
+        ("c", "network", 1),
+        ("d", "network", None),
+    ]
+    sidecar.seek(0)
+    assert np.array_equal(np.load(sidecar), [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+    old_chunk = settings.export_chunk_size
+    settings.export_chunk_size = 1
+    lines = b"".join(iter_export_ndjson(engine, label_id=label_id, after_id=1)).decode().splitlines()
+    settings.export_chunk_size = old_chunk
+    assert [json.loads(line)["text"] for line in lines] == ["c", "d"]
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import io
+import re
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import Request
+
+from app.api.routes.entries import import_entries
+from app.api.routes.labels import create_label
+from app.core.config import settings
+from app.db.base import Base
+from app.db.session import build_engine
+from app.models.text_entry import TextEntry
+from app.repositories.label_repository import LabelRepository
+from app.schemas.classification import CreateLabelRequest
+from app.services.import_service import EntryImporter, iter_import_rows
+from app.services.label_embedding_service import LabelEmbeddingService
+
+
+class FakeEmbeddingClient:
+    provider_name = "fake"
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.batches: list[int] = []
+
+    def get_embedding(self, text: str) -> list[float]:
+        vals = [0.0] * self.dim
+        for token in text.lower().split():
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            for i in range(self.dim):
+                vals[i] += (digest[i % len(digest)] / 255.0) - 0.5
+        norm = sum(v * v for v in vals) ** 0.5
+        return vals if norm == 0 else [v / norm for v in vals]
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(len(texts))
+        return [self.get_embedding(text) for text in texts]
+
+
+def _new_session() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+
+
+def test_import_classifies_in_batches_and_updates_centroids_per_batch() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.3
+
+    db = _new_session()
+    embedding = FakeEmbeddingClient()
+    create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=embedding)
+    create_label(CreateLabelRequest(name="network", definition="network wifi router outage"), db=db, embedding_client=embedding)
+
+    ndjson = io.StringIO(
+        '{"text": "printer toner paper"}\n'
+        '{"text": "wifi router outage"}\n'
+        "\n"
+        '{"text": "totally unrelated words", "label": "Network"}\n'
+        "not json\n"
+        '{"text": "quarterly budget spreadsheet"}\n'
+        '{"text": "paper jam", "label": "missing"}\n'
+        '{"label": "printers"}\n'
+    )
+    embedding.batches.clear()
+    result = EntryImporter(db, embedding, batch_size=2).run(iter_import_rows(ndjson, "ndjson"))
+
+    assert (result.read_count, result.imported_count, result.failed_count) == (7, 3, 4)
+    assert (result.matched_count, result.forced_count) == (2, 1)
+    assert sorted((error.line, error.reason) for error in result.errors) == [
+        (5, "invalid_row"),
+        (6, "no_label_fit"),
+        (7, "label_not_found"),
+        (8, "invalid_row"),
+    ]
+    assert embedding.batches == [2, 2, 1]
+
+    labels = {label.name: label for label in LabelRepository(db).list_labels()}
+    by_text = {entry.text: entry for entry in db.query(TextEntry).all()}
+    assert by_text["wifi router outage"].label_id == labels["network"].id
+    assert by_text["totally unrelated words"].confidence == "forced"
+    assert (labels["network"].usage_count, labels["printers"].usage_count) == (2, 1)
+
+    # The per-batch updates match a full rebuild from the stored embeddings.
+    centroid = labels["network"].centroid.copy()
+    LabelEmbeddingService(db, embedding).rebuild_from_stored([labels["network"]])
+    assert np.allclose(labels["network"].centroid, centroid)
+
+    settings.similarity_threshold = old_threshold
+    db.close()
+
+
+class FailingEmbeddingClient(FakeEmbeddingClient):
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        if self.batches:
+            raise RuntimeError("embedding backend went away")
+        return super().get_embeddings(texts)
+
+
+def test_failed_import_keeps_committed_batches_in_the_centroids() -> None:
+    db = _new_session()
+    embedding = FailingEmbeddingClient()
+    create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=embedding)
+
+    rows = "".join(f'{{"text": "printer {word}", "label": "printers"}}\n' for word in ["one", "two", "three", "four"])
+    with pytest.raises(RuntimeError):
+        EntryImporter(db, embedding, batch_size=2).run(iter_import_rows(io.StringIO(rows), "ndjson"))
+
+    label = LabelRepository(db).get_by_name("printers")
+    assert db.query(TextEntry).count() == 2
+    assert label.usage_count == 2
+    centroid = label.centroid.copy()
+    LabelEmbeddingService(db, embedding).rebuild_from_stored([label])
+    assert np.allclose(label.centroid, centroid)
+    db.close()
+
+
+def test_forced_rows_outside_the_index_matrix_are_scored_against_the_centroid() -> None:
+    db = _new_session()
+    labels = LabelRepository(db)
+    labels.create(name="x", definition="x", centroid=[1.0, 0.0, 0.0])
+    labels.create(name="y", definition="y", centroid=[0.0, 1.0, 0.0])
+    # Another dimension than the matrix (e.g. mid model change): score_label has no score for it.
+    labels.create(name="z", definition="z", centroid=[1.0, 0.0])
+    db.commit()
+
+    embedding = FakeEmbeddingClient(dim=2)
+    result = EntryImporter(db, embedding).run(iter_import_rows(io.StringIO('{"text": "printer", "label": "z"}\n'), "ndjson"))
+
+    assert result.forced_count == 1
+    entry = db.query(TextEntry).one()
+    expected = embedding.get_embedding("printer")[0] / np.linalg.norm(embedding.get_embedding("printer"))
+    assert entry.similarity_score == pytest.approx(expected)
+    db.close()
+
+
+def test_csv_rows_may_span_lines() -> None:
+    rows = list(iter_import_rows(io.StringIO('text,label\n"line one\nline two",printers\nplain,\n,x\n'), "csv"))
+    assert [(row.line, getattr(row, "text", None), getattr(row, "label", None)) for row in rows] == [
+        (3, "line one\nline two", "printers"),
+        (4, "plain", None),
+        (5, None, None),
+    ]
+    assert rows[2].reason == "invalid_row"
+
+
+def test_import_route_streams_the_body_into_batches(tmp_path) -> None:
+    engine = build_engine(f"sqlite:///{tmp_path / 'classifier.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    embedding = FakeEmbeddingClient()
+    create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=embedding)
+
+    body = "".join(f'{{"text": "printer {word}", "label": "printers"}}\n' for word in ["one", "two", "three", "four", "five"])
+    chunks = [chunk.encode("utf-8") for chunk in re.findall(".{1,7}", body, re.S)]
+    received: list[int] = []
+    embedded_after: list[int] = []
+
+    async def receive() -> dict:
+        received.append(1)
+        chunk = chunks[len(received) - 1] if len(received) <= len(chunks) else b""
+        return {"type": "http.request", "body": chunk, "more_body": len(received) < len(chunks)}
+
+    get_embeddings = embedding.get_embeddings
+
+    def record_progress(texts: list[str]) -> list[list[float]]:
+        embedded_after.append(len(received))
+        return get_embeddings(texts)
+
+    embedding.get_embeddings = record_progress
+    request = Request({"type": "http", "method": "POST", "headers": [(b"content-type", b"application/x-ndjson")]}, receive)
+    result = asyncio.run(import_entries(request, format=None, batch_size=2, db=db, embedding_client=embedding))
+
+    assert (result.imported_count, result.forced_count) == (5, 5)
+    assert embedding.batches == [2, 2, 1]
+    # The first batch was imported while most of the body had not been received yet.
+    assert embedded_after[0] < len(chunks) // 2
+    assert db.query(TextEntry).count() == 5
+    db.close()
+    engine.dispose()
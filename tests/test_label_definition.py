@@ -0,0 +1,75 @@
+import hashlib
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api.routes.labels import create_label, update_label
+from app.core.config import settings
+from app.db.base import Base
+from app.repositories.label_repository import LabelRepository
+from app.schemas.classification import CreateLabelRequest, UpdateLabelRequest
+from app.services.classification_service import ClassificationService
+from app.services.label_embedding_service import LabelEmbeddingService
+
+
+class CountingEmbeddingClient:
+    provider_name = "fake"
+
+    def __init__(self, dim: int = 8):
+        self.dim = dim
+        self.texts: list[str] = []
+
+    def get_embedding(self, text: str) -> list[float]:
+        self.texts.append(text)
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        vals = np.array([(digest[i] / 255.0) - 0.5 for i in range(self.dim)])
+        return (vals / np.linalg.norm(vals)).tolist()
+
+
+def _new_db() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    return TestingSessionLocal()
+
+
+def test_definition_is_embedded_once_until_it_or_the_model_changes() -> None:
+    db = _new_db()
+    client = CountingEmbeddingClient()
+    create_label(CreateLabelRequest(name="billing", definition="Invoices and payments"), db=db, embedding_client=client)
+    label = LabelRepository(db).get_by_name("billing")
+    assert client.texts == ["Invoices and payments"]
+    assert label.definition_model == settings.ollama_embedding_model
+
+    service = ClassificationService(db, client)
+    service.classify_vector("refund please", client.get_embedding("refund please"), label="billing")
+    labels = LabelEmbeddingService(db, client)
+    labels.recompute_for_label(label)
+    entry_vector = client.get_embedding("refund please")
+    labels.remove_entry(label, entry_vector)
+    assert "Invoices and payments" not in client.texts[1:]
+
+    unchanged = update_label("billing", UpdateLabelRequest(definition="Invoices and payments"), db=db, embedding_client=client)
+    assert unchanged.updated is False
+    before = np.asarray(label.centroid).copy()
+    updated = update_label("billing", UpdateLabelRequest(definition="Refunds and chargebacks"), db=db, embedding_client=client)
+    assert updated.updated is True
+    assert client.texts.count("Refunds and chargebacks") == 1
+    assert not np.allclose(LabelRepository(db).get_by_name("billing").centroid, before)
+
+    old_model = settings.ollama_embedding_model
+    settings.ollama_embedding_model = "another-model"
+    try:
+        labels.recompute_for_label(label)
+    finally:
+        settings.ollama_embedding_model = old_model
+    assert client.texts.count("Refunds and chargebacks") == 2
+    assert label.definition_model == "another-model"
+
+    with pytest.raises(HTTPException) as exc:
+        update_label("missing", UpdateLabelRequest(definition="x"), db=db, embedding_client=client)
+    assert exc.value.status_code == 404
+    db.close()
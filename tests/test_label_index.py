@@ -0,0 +1,213 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.embedding_model import set_active_embedding_model
+from app.core.metrics import LABEL_LOAD_SECONDS
+from app.db.base import Base
+from app.models.label import Label
+from app.models.text_entry import TextEntry
+from app.repositories.label_repository import LabelRepository
+from app.services.embedding_service import cosine_similarity
+from app.services.entry_index import EntryIndex
+from app.services.label_index import LabelIndex, get_label_index
+from app.services.vector_index import CompressedIndex, HNSWIndex, IVFIndex
+
+
+def _new_db() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    return TestingSessionLocal()
+
+
+def test_index_matches_pure_python_cosine() -> None:
+    db = _new_db()
+    repo = LabelRepository(db)
+    repo.create(name="a", definition="a", centroid=[1.0, 0.0, 0.0])
+    repo.create(name="b", definition="b", centroid=[0.0, 2.0, 0.0])
+    repo.create(name="c", definition="c", centroid=[1.0, 1.0, 1.0])
+    db.commit()
+
+    vector = [0.2, 0.9, 0.1]
+    label_id, name, score = get_label_index(db).sync(db).best_match(vector)
+
+    assert name == "b"
+    assert label_id == repo.get_by_name("b").id
+    assert abs(score - cosine_similarity(vector, [0.0, 2.0, 0.0])) < 1e-6
+
+    top = get_label_index(db).top_k(vector, 2)
+    assert [row[1] for row in top] == ["b", "c"]
+    db.close()
+
+
+def test_index_picks_up_updates_and_deletes() -> None:
+    db = _new_db()
+    repo = LabelRepository(db)
+    a = repo.create(name="a", definition="a", centroid=[1.0, 0.0])
+    b = repo.create(name="b", definition="b", centroid=[0.0, 1.0])
+    db.commit()
+
+    index = get_label_index(db).sync(db)
+    assert index.best_match([1.0, 0.1])[1] == "a"
+
+    a.centroid = [0.0, -1.0]
+    db.commit()
+    assert index.sync(db).best_match([1.0, 0.1])[1] == "b"
+
+    repo.delete(b)
+    db.commit()
+    index.sync(db)
+    assert len(index) == 1
+    assert index.best_match([1.0, 0.1]) == (None, None, 0.0)
+    db.close()
+
+
+def test_index_picks_up_an_update_committed_with_an_older_timestamp() -> None:
+    db = _new_db()
+    repo = LabelRepository(db)
+    a = repo.create(name="a", definition="a", centroid=[1.0, 0.0])
+    b = repo.create(name="b", definition="b", centroid=[0.0, 1.0])
+    db.commit()
+    index = get_label_index(db).sync(db)
+    assert index.best_match([1.0, 0.1])[1] == "a"
+
+    # Another worker's update that started earlier commits last: max(updated_at) does not move.
+    a.centroid = [0.0, -1.0]
+    a.updated_at = b.updated_at - timedelta(seconds=1)
+    db.commit()
+    assert index.sync(db).best_match([1.0, 0.1])[1] == "b"
+    db.close()
+
+
+def test_reload_observes_its_own_duration() -> None:
+    db = _new_db()
+    LabelRepository(db).create(name="a", definition="a", centroid=[1.0, 0.0])
+    db.commit()
+
+    before = LABEL_LOAD_SECONDS.total("reloaded")
+    start = time.perf_counter()
+    LabelIndex().sync(db)
+    elapsed = time.perf_counter() - start
+    assert 0.0 <= LABEL_LOAD_SECONDS.total("reloaded") - before <= elapsed
+    db.close()
+
+
+@pytest.mark.parametrize("kind", ["ivf", "hnsw", "compressed"])
+def test_approximate_backend_agrees_with_exact_scan_and_persists(kind: str, tmp_path) -> None:
+    if kind == "hnsw":
+        pytest.importorskip("hnswlib")
+    make_backend = {
+        "ivf": lambda: IVFIndex(nprobe=4),
+        "hnsw": lambda: HNSWIndex(ef_search=50),
+        "compressed": lambda: CompressedIndex(dim=8, candidates=20),
+    }[kind]
+
+    db = _new_db()
+    rng = np.random.default_rng(0)
+    centroids = rng.normal(size=(400, 16)).astype(np.float32)
+    db.add_all(Label(name=f"l{i}", definition="d", centroid=vector) for i, vector in enumerate(centroids))
+    db.commit()
+
+    exact = LabelIndex().sync(db)
+    index = LabelIndex(backend=make_backend(), path=str(tmp_path / "classifier.labels"), min_size=100).sync(db)
+    queries = centroids[:50] + rng.normal(scale=0.3, size=(50, 16)).astype(np.float32)
+    hits = sum(index.best_match(query, db=db)[0] == exact.best_match(query)[0] for query in queries)
+    assert hits >= 45
+    # Scores are exact even when the candidate set is approximate.
+    label_id, _, score = index.best_match(queries[0], db=db)
+    assert abs(score - exact.score_label(queries[0], label_id)) < 1e-6
+
+    moved = db.get(Label, 1)
+    moved.centroid = -centroids[0]
+    db.commit()
+    assert index.sync(db).best_match(-centroids[0], db=db)[0] == 1
+    index.save()
+
+    backend = make_backend()
+    backend.build = None  # a reload must not rebuild
+    reloaded = LabelIndex(backend=backend, path=str(tmp_path / "classifier.labels"), min_size=100).sync(db)
+    assert reloaded.best_match(-centroids[0], db=db)[0] == 1
+    db.close()
+
+
+@pytest.mark.parametrize(("projection", "dim"), [("pca", 16), ("random", 32)])
+def test_compressed_backend_scans_fewer_bytes_and_is_tied_to_the_active_model(projection: str, dim: int, tmp_path) -> None:
+    rng = np.random.default_rng(1)
+    # Most of the variance in a few directions, as with real embeddings.
+    matrix = (rng.normal(size=(2000, 8)) @ rng.normal(size=(8, 64)) + 0.1 * rng.normal(size=(2000, 64))).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    ids = np.arange(1, 2001)
+    backend = CompressedIndex(dim=dim, projection=projection, candidates=32)
+    backend.build(ids, matrix)
+    # The codes a query scans; the float32 rows stay with the owning index for the re-score.
+    assert backend.nbytes * 6 < matrix.nbytes
+
+    queries = matrix[:100] + 0.05 * rng.normal(size=(100, 64)).astype(np.float32)
+    exact = np.argmax(queries @ matrix.T, axis=1) + 1
+    hits = sum(int(best) in candidates.tolist() for best, candidates in zip(exact, backend.candidates(queries, 1)))
+    assert hits >= 95
+
+    try:
+        # The model is read when saving and loading, so a model switched after construction counts.
+        set_active_embedding_model("m")
+        backend.remove([1, 2])
+        backend.save(str(tmp_path / "labels.compressed"))
+        reloaded = CompressedIndex(dim=dim, projection=projection)
+        assert reloaded.load(str(tmp_path / "labels.compressed"), 64)
+        assert reloaded.ids == set(range(3, 2001))
+        set_active_embedding_model("other")
+        assert not reloaded.load(str(tmp_path / "labels.compressed"), 64)
+    finally:
+        set_active_embedding_model(None)
+
+
+def _resident_bytes(build) -> tuple[object, int]:
+    """What ``build()`` returns and the bytes it still holds once it has returned."""
+    tracemalloc.start()
+    try:
+        built = build()
+        return built, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def test_compressed_indexes_keep_codes_instead_of_float32_rows() -> None:
+    db = _new_db()
+    rng = np.random.default_rng(2)
+    entries = (rng.normal(size=(10000, 8)) @ rng.normal(size=(8, 256)) + 0.1 * rng.normal(size=(10000, 256))).astype(np.float32)
+    # Labels carry names and stamps too; real centroids have several hundred dimensions.
+    centroids = (rng.normal(size=(2000, 8)) @ rng.normal(size=(8, 768)) + 0.1 * rng.normal(size=(2000, 768))).astype(np.float32)
+    db.execute(insert(TextEntry), [dict(text=f"t{i}", label_id=None, embedding_vec=vector) for i, vector in enumerate(entries)])
+    db.add_all(Label(name=f"l{i}", definition="d", centroid=vector) for i, vector in enumerate(centroids))
+    db.commit()
+
+    exact_entries, exact_bytes = _resident_bytes(lambda: EntryIndex().sync(db))
+    assert exact_bytes > entries.nbytes
+    coded_entries, coded_bytes = _resident_bytes(lambda: EntryIndex(backend=CompressedIndex(dim=32, candidates=50)).sync(db))
+    assert coded_bytes * 3 < entries.nbytes
+    exact_labels = LabelIndex().sync(db)
+    coded_labels, label_bytes = _resident_bytes(
+        lambda: LabelIndex(backend=CompressedIndex(dim=32, candidates=50), min_size=100).sync(db)
+    )
+    assert label_bytes * 3 < centroids.nbytes
+
+    # The candidates are re-scored exactly from the database rows.
+    queries = entries[:20] + 0.05 * rng.normal(size=(20, 256)).astype(np.float32)
+    ids, scores = coded_entries.search(queries, 5, db=db)
+    exact_ids, exact_scores = exact_entries.search(queries, 5)
+    assert (ids[:, 0] == exact_ids[:, 0]).sum() >= 18
+    assert np.allclose(scores[ids[:, 0] == exact_ids[:, 0], 0], exact_scores[ids[:, 0] == exact_ids[:, 0], 0], atol=1e-5)
+    with pytest.raises(ValueError, match="entry_index_needs_db"):
+        coded_entries.search(queries, 5)
+
+    queries = centroids[:20] + 0.05 * rng.normal(size=(20, 768)).astype(np.float32)
+    hits = [coded_labels.best_match(query, db=db) for query in queries]
+    assert sum(hit[0] == exact_labels.best_match(query)[0] for hit, query in zip(hits, queries)) >= 18
+    assert coded_labels.score_label(queries[0], hits[0][0]) is None
+    db.close()
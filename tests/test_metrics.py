@@ -0,0 +1,47 @@
+import pytest
+
+from app.core.errors import OllamaUnavailableError
+from app.core.metrics import EMBEDDING_CACHE_LOOKUPS, OLLAMA_ERRORS, Counter, Histogram, render
+from app.services.embedding_cache import CachingEmbeddingClient
+from app.services.embedding_service import OllamaEmbeddingClient
+
+
+class FakeEmbeddingClient:
+    provider_name = "fake"
+
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_histogram_and_counter_render_prometheus_text() -> None:
+    latency = Histogram("test_latency_seconds", "Test latency.", ("phase",), buckets=(0.1, 1.0))
+    errors = Counter("test_errors_total", "Test errors.", ("kind",))
+    latency.observe(0.05, "match")
+    latency.observe(0.1, "match")
+    latency.observe(3.0, "match")
+    errors.inc("timeout")
+    errors.inc("timeout", amount=2)
+
+    text = render()
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert 'test_latency_seconds_bucket{phase="match",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{phase="match",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{phase="match",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{phase="match"} 3' in text
+    assert 'test_errors_total{kind="timeout"} 3' in text
+
+
+def test_ollama_errors_and_cache_lookups_are_counted() -> None:
+    # Nothing listens on port 9: the batch call and its fallbacks fail, but count once.
+    client = OllamaEmbeddingClient(host="http://127.0.0.1:9", timeout_seconds=1)
+    before = OLLAMA_ERRORS.value("OllamaUnavailableError")
+    with pytest.raises(OllamaUnavailableError):
+        client.get_embeddings(["a", "b"])
+    assert OLLAMA_ERRORS.value("OllamaUnavailableError") == before + 1
+
+    cached = CachingEmbeddingClient(FakeEmbeddingClient(), model="fake", max_entries=10)
+    hits, misses = EMBEDDING_CACHE_LOOKUPS.value("hit"), EMBEDDING_CACHE_LOOKUPS.value("miss")
+    cached.get_embeddings(["x", "yy"])
+    cached.get_embeddings(["x", "zzz"])
+    assert EMBEDDING_CACHE_LOOKUPS.value("hit") == hits + 1
+    assert EMBEDDING_CACHE_LOOKUPS.value("miss") == misses + 3
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db.types import VectorType, from_pgvector, query_vectors_sql
+from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+
+# Integration tests run against a throwaway PostgreSQL with pgvector, e.g.
+#   docker run -e POSTGRES_PASSWORD=pg -p 5432:5432 pgvector/pgvector:pg16
+#   TEST_POSTGRES_URL=postgresql://postgres:pg@localhost/postgres pytest tests/test_pgvector.py
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+def test_vector_type_uses_pgvector_text_on_postgres_and_blobs_elsewhere() -> None:
+    vector = np.array([0.5, -1.0, 0.25], dtype=np.float32)
+    pg_value = VectorType().process_bind_param(vector, postgresql.dialect())
+    assert pg_value == "[0.5,-1.0,0.25]"
+    assert np.array_equal(VectorType().process_result_value(pg_value, postgresql.dialect()), vector)
+    assert from_pgvector("[]").shape == (0,)
+
+    # Running sums keep float64 blobs even on PostgreSQL.
+    assert isinstance(VectorType("float64").process_bind_param(vector, postgresql.dialect()), bytes)
+    assert isinstance(VectorType().process_bind_param(vector, sqlite.dialect()), bytes)
+
+
+def _compile(statement) -> str:
+    return " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+
+
+def test_nearest_searches_batch_every_query_vector_into_one_statement() -> None:
+    vectors = [[1.0, 0.0, 0.0], [0.0, 1.0], [0.0, 0.0, 1.0]]
+    batches = query_vectors_sql(vectors)
+    assert [dim for dim, _ in batches] == [3, 2]
+    dim, queries = batches[0]
+
+    sql = _compile(LabelRepository.nearest_by_centroid_sql(queries, dim, 5))
+    assert "FROM (VALUES" in sql and "JOIN LATERAL" in sql
+    assert "WHERE vector_dims(labels.centroid_vec) = 3" in sql
+    assert "CAST(labels.centroid_vec AS VECTOR(3)) <=> queries.vec AS distance" in sql
+    # The per-query ORDER BY is the indexed expression itself, so the partial index serves it.
+    assert "ORDER BY CAST(labels.centroid_vec AS VECTOR(3)) <=> queries.vec LIMIT" in sql
+    assert sql.endswith("ORDER BY queries.n, hits.distance")
+    # Both query vectors of dimension 3 are bound in the VALUES list.
+    assert sql.count("AS VECTOR(3)))") == 2
+
+    sql = _compile(TextEntryRepository.nearest_labelled_sql(queries, dim, 5, "model-b"))
+    assert "JOIN LATERAL" in sql and "JOIN labels ON text_entries.label_id = labels.id" in sql
+    assert "AND vector_dims(text_entries.embedding_vec) = 3" in sql
+    assert "ORDER BY CAST(text_entries.embedding_vec AS VECTOR(3)) <=> query_vectors.vec LIMIT" in sql
+    # Vectors of a completed migration not moved into embedding_vec yet are searched alongside.
+    assert "WHERE text_entries.next_embedding_model IS DISTINCT FROM" in sql
+    assert "ORDER BY CAST(text_entries.next_embedding_vec AS VECTOR(3)) <=> query_vectors.vec LIMIT" in sql
+    assert sql.count("AS VECTOR(3)))") == 2
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_matching_runs_in_postgres() -> None:
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.config import settings
+    from app.db.base import Base
+    from app.db.schema import ensure_vector_indexes, prepare_database
+    from app.db.session import build_engine
+    from app.services.classification_service import ClassificationService
+
+    engine = build_engine(POSTGRES_URL)
+    prepare_database(engine)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    try:
+        labels = LabelRepository(db)
+        network = labels.create(name="network", definition="wifi", centroid=[1.0, 0.0, 0.0])
+        printers = labels.create(name="printers", definition="toner", centroid=[0.0, 1.0, 0.0])
+        entries = TextEntryRepository(db)
+        entries.create(text="a", label_id=printers.id, similarity_score=1.0, embedding=[0.9, 0.1, 0.0])
+        entries.create(text="b", label_id=printers.id, similarity_score=1.0, embedding=[0.8, 0.2, 0.0])
+        entries.create(text="c", label_id=network.id, similarity_score=1.0, embedding=[0.0, 0.0, 1.0])
+        db.commit()
+        assert ensure_vector_indexes(engine) == [
+            f"ix_labels_centroid_vec_{settings.pgvector_index}_3",
+            f"ix_text_entries_embedding_vec_{settings.pgvector_index}_3",
+        ]
+
+        assert [hits[0][:2] for hits in labels.nearest_by_centroid([[2.0, 0.1, 0.0], [0.1, 2.0, 0.0]], 1)] == [
+            (network.id, "network"),
+            (printers.id, "printers"),
+        ]
+        service = ClassificationService(db, embedding_client=None)
+        label_id, name, score, reason = service._best_matches([[1.0, 0.0, 0.0]], mode="knn")[0]
+        assert (label_id, name, reason) == (printers.id, "printers", "matched_by_entry_vote")
+        assert db.execute(text("SELECT vector_dims(centroid_vec) FROM labels LIMIT 1")).scalar() == 3
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
@@ -0,0 +1,163 @@
+import hashlib
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api.routes.entries import reclasify_entry
+from app.api.routes.labels import create_label
+from app.core.config import settings
+from app.db.base import Base
+from app.models.reclassify_job import ReclassifyJob
+from app.models.text_entry import TextEntry
+from app.repositories.label_repository import LabelRepository
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.schemas.classification import CreateLabelRequest, ReclassifiedItemRequest
+from app.services.reclassify_job_service import ReclassifyJobRunner, cancel_reclassify_job, start_reclassify_job
+
+
+class FakeEmbeddingClient:
+    provider_name = "fake"
+
+    def __init__(self, dim: int = 16):
+        self.dim = dim
+        self.calls: list[str] = []
+
+    def get_embedding(self, text: str) -> list[float]:
+        self.calls.append(text)
+        vals = [0.0] * self.dim
+        for token in text.lower().split():
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            for i in range(self.dim):
+                vals[i] += (digest[i % len(digest)] / 255.0) - 0.5
+        norm = sum(v * v for v in vals) ** 0.5
+        return vals if norm == 0 else [v / norm for v in vals]
+
+
+def _new_session_factory() -> sessionmaker:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+def _seed(db: Session, embedding: FakeEmbeddingClient) -> None:
+    create_label(CreateLabelRequest(name="printers", definition="printer toner paper jam"), db=db, embedding_client=embedding)
+    create_label(CreateLabelRequest(name="network", definition="network wifi router outage"), db=db, embedding_client=embedding)
+    printers = LabelRepository(db).get_by_name("printers")
+    entries = TextEntryRepository(db)
+    # Everything starts in "printers"; only the network texts should move.
+    for text in ["printer toner empty", "paper jam again", "wifi router outage", "network outage wifi"]:
+        entries.create(text=text, label_id=printers.id, similarity_score=None, confidence="high", embedding=embedding.get_embedding(text))
+    entries.create(text="wifi router forced", label_id=printers.id, similarity_score=None, confidence="forced", embedding=embedding.get_embedding("wifi router forced"))
+    db.commit()
+
+
+def test_reclassify_job_moves_entries_and_rebuilds_centroids() -> None:
+    old_threshold = settings.similarity_threshold
+    settings.similarity_threshold = 0.1
+
+    session_factory = _new_session_factory()
+    embedding = FakeEmbeddingClient()
+    with session_factory() as db:
+        _seed(db, embedding)
+        job = start_reclassify_job(db, chunk_size=2)
+        job_id = job.id
+
+    embedding.calls.clear()
+    ReclassifyJobRunner(session_factory, embedding).run(job_id)
+
+    with session_factory() as db:
+        job = db.get(ReclassifyJob, job_id)
+        assert job.status == "completed"
+        assert (job.scanned_count, job.reclassified_count, job.skipped_count) == (5, 2, 1)
+        assert job.last_entry_id == 5
+
+        labels = {label.name: label for label in LabelRepository(db).list_labels()}
+        by_text = {entry.text: entry.label_id for entry in db.query(TextEntry).all()}
+        assert by_text["wifi router outage"] == labels["network"].id
+        assert by_text["wifi router forced"] == labels["printers"].id
+        assert labels["network"].usage_count == 2
+        assert labels["printers"].usage_count == 3
+
+    # Stored embeddings and definition embeddings were reused.
+    assert embedding.calls == []
+    settings.similarity_threshold = old_threshold
+
+
+def test_reclassify_job_resumes_from_cursor_and_honours_cancel() -> None:
+    session_factory = _new_session_factory()
+    embedding = FakeEmbeddingClient()
+    with session_factory() as db:
+        _seed(db, embedding)
+        job = start_reclassify_job(db, chunk_size=2)
+        # Simulate a crashed worker that committed the first chunk.
+        job.status, job.owner, job.last_entry_id, job.scanned_count = "running", "dead-worker", 2, 2
+        db.commit()
+        job_id = job.id
+
+    ReclassifyJobRunner(session_factory, embedding).run(job_id)
+    with session_factory() as db:
+        job = db.get(ReclassifyJob, job_id)
+        assert job.status == "completed"
+        assert job.scanned_count == 5
+
+        second = start_reclassify_job(db)
+        cancel_reclassify_job(db, second.id)
+        second_id = second.id
+
+    ReclassifyJobRunner(session_factory, embedding).run(second_id)
+    with session_factory() as db:
+        second = db.get(ReclassifyJob, second_id)
+        assert second.status == "cancelled"
+        assert second.scanned_count == 0
+
+
+def test_reclassify_honours_knn_mode_and_multi_label_copies() -> None:
+    saved = (settings.similarity_threshold, settings.knn_k, settings.multi_label_max_labels)
+    settings.similarity_threshold, settings.knn_k, settings.multi_label_max_labels = 0.1, 1, 2
+    try:
+        session_factory = _new_session_factory()
+        embedding = FakeEmbeddingClient()
+        with session_factory() as db:
+            for name, definition in [
+                ("printers", "printer toner paper jam"),
+                ("network", "network wifi router outage"),
+                ("kitchen", "coffee machine lunch fridge"),
+            ]:
+                create_label(CreateLabelRequest(name=name, definition=definition), db=db, embedding_client=embedding)
+            labels = {label.name: label.id for label in LabelRepository(db).list_labels()}
+            entries = TextEntryRepository(db)
+            rows = [
+                # Votes for kitchen; forced entries are not rescored.
+                ("wifi router outage today", "kitchen", "forced"),
+                ("paper jam again", "printers", "high"),
+                ("wifi router outage", "printers", "high"),
+                ("printer toner empty", "printers", "high"),
+                # Stored in multi-label mode: one copy per label.
+                ("printer wifi router", "printers", "high"),
+                ("printer wifi router", "network", "high"),
+            ]
+            ids = [
+                entries.create(
+                    text=text, label_id=labels[label], similarity_score=None, confidence=confidence, embedding=embedding.get_embedding(text)
+                ).id
+                for text, label, confidence in rows
+            ]
+            db.commit()
+            job_id = start_reclassify_job(db, mode="knn").id
+
+        ReclassifyJobRunner(session_factory, embedding).run(job_id)
+        with session_factory() as db:
+            job = db.get(ReclassifyJob, job_id)
+            assert (job.status, job.mode) == ("completed", "knn")
+            by_id = {entry.id: entry.label_id for entry in db.query(TextEntry).all()}
+            # The entry's own vote is left out, so its nearest other entry decides.
+            assert by_id[ids[2]] == labels["kitchen"]
+            # The copies are spread over the labels that fit instead of collapsing onto the best one.
+            assert by_id[ids[4]] != by_id[ids[5]]
+
+            for entry_id in ids[4:]:
+                reclasify_entry(entry_id, ReclassifiedItemRequest(mode="centroid"), db=db, embedding_client=embedding)
+            by_id = {entry.id: entry.label_id for entry in db.query(TextEntry).all()}
+            assert by_id[ids[4]] != by_id[ids[5]]
+    finally:
+        settings.similarity_threshold, settings.knn_k, settings.multi_label_max_labels = saved
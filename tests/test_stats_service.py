@@ -0,0 +1,63 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api.routes.labels import delete_label
+from app.db.base import Base
+from app.repositories.label_repository import LabelRepository
+from app.repositories.stats_repository import StatsRepository, score_bucket
+from app.repositories.text_entry_repository import TextEntryRepository
+from app.services.stats_service import get_stats
+
+
+def _new_db() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    TestingSessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    Base.metadata.create_all(bind=engine)
+    return TestingSessionLocal()
+
+
+def test_counters_follow_entry_changes_and_match_reconcile() -> None:
+    db = _new_db()
+    labels = LabelRepository(db)
+    entries = TextEntryRepository(db)
+    food = labels.create(name="food", definition="Food", centroid=[0.0] * 8)
+    travel = labels.create(name="travel", definition="Travel", centroid=[0.0] * 8)
+    food.usage_count = 1
+    a = entries.create(text="a", label_id=food.id, similarity_score=0.9, confidence="high")
+    b = entries.create(text="b", label_id=food.id, similarity_score=0.55, confidence="low")
+    c = entries.create(text="c", label_id=None, similarity_score=0.2, confidence="low")
+    entries.create(text="d", label_id=None, similarity_score=None)
+    db.commit()
+
+    stats = get_stats(db)
+    assert stats["labels_count"] == 2
+    assert stats["classified_entries_count"] == 2
+    assert stats["unclassified_entries_count"] == 2
+    assert stats["confidence_counts"] == {"high": 1, "low": 2, "none": 1}
+    assert stats["score_histogram"][score_bucket(0.9)]["count"] == 1
+    assert sum(bucket["count"] for bucket in stats["score_histogram"]) == 3
+
+    # Reclassify, delete, and a rolled-back change.
+    b.label_id = travel.id
+    b.similarity_score = 0.7
+    db.delete(c)
+    db.commit()
+    a.label_id = travel.id
+    db.flush()
+    db.rollback()
+
+    stats = get_stats(db)
+    per_label = {row["name"]: row for row in stats["labels"]}
+    assert per_label["food"]["entries_count"] == 1
+    assert per_label["travel"]["entries_count"] == 1
+    assert per_label["travel"]["score_histogram"][score_bucket(0.7)] == 1
+    assert stats["unclassified_entries_count"] == 1
+
+    delete_label("food", force=True, db=db)
+    incremental = get_stats(db)
+    assert incremental["unclassified_entries_count"] == 2
+
+    StatsRepository(db).reconcile()
+    db.commit()
+    assert get_stats(db) == incremental
+    db.close()